@@ -1,2 +1,3 @@
-from .main import main
+# 不在这里导入界面，再次启动时只需要很少的导入就可以把请求交给已经打开的窗口
+from .startup import main
 from . import settings
@@ -1,5 +1,12 @@
-from .main import main
+import sys
 
 
 if __name__ == '__main__':
+    # 第一个参数是子命令时使用命令行工具，否则打开窗口。子命令直接取自
+    # cli.build_parser，新加的子命令不需要在这里再登记一次
+    if len(sys.argv) > 1:
+        from .cli import build_parser, main
+        if sys.argv[1] in build_parser().commands + ('-h', '--help'):
+            sys.exit(main())
+    from .startup import main
     main()
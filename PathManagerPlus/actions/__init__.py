@@ -1,2 +1,48 @@
-from . import linux_actions
-from . import windows_actions
+"""
+和系统相关的操作：打开文件、文件夹、终端等。
+
+只导入当前系统对应的模块，界面和命令行都通过 system_actions 调用。
+不支持的系统上 system_actions 为 None。启动了子进程的函数返回
+subprocess.Popen，由调用方回收(见 launcher)。
+"""
+import os
+import sys
+import subprocess
+
+from ..search import get_path_scheme
+
+# 和 platform.system() 的返回值相同，不需要导入 platform
+system = {
+    'win32': 'Windows',
+    'linux': 'Linux',
+    'darwin': 'Darwin'
+}.get(sys.platform, sys.platform)
+
+if system == "Windows":
+    from . import windows_actions as system_actions
+elif system == "Linux":
+    from . import linux_actions as system_actions
+elif system == "Darwin":
+    from . import mac_actions as system_actions
+else:
+    system_actions = None
+
+
+def open_path(path):
+    """
+    按路径的类型打开：网址用浏览器，ftp 和网络路径交给系统，本地路径用
+    默认程序。返回 False 表示本地路径不存在，无法识别的路径返回 None。
+    启动了子进程时返回这个 Popen，否则返回 True。
+    """
+    scheme = get_path_scheme(path)
+    if scheme is None:
+        return None
+    if scheme == 'http':
+        result = system_actions.open_url(path)
+    elif scheme in ('ftp', 'unc'):
+        result = system_actions.open_ftp(path)
+    elif os.path.exists(path):
+        result = system_actions.open_file(path)
+    else:
+        return False
+    return result if isinstance(result, subprocess.Popen) else True
@@ -3,8 +3,7 @@ import os
 import subprocess
 import shutil
 
-from pathlib import Path
-from ..settings import PROJECT_PATH
+from .probe_cache import cached_probe
 
 
 def check_terminal():
@@ -24,7 +23,19 @@ def check_terminal():
             return terminal_name, terminal_path
     return None, None
 
-terminal_name, terminal_path = check_terminal()
+
+def get_terminal():
+    """
+    第一次用到的时候才检测，不在导入时检测，结果缓存在磁盘上。
+    """
+    terminal_name, terminal_path = cached_probe(
+        'linux_terminal',
+        lambda: list(check_terminal()),
+        lambda value: isinstance(value, list) and len(value) == 2 and (
+            value[1] is None or os.path.exists(value[1]))
+    )
+    return terminal_name, terminal_path
+
 
 def open_url(url):
     return webbrowser.open(url)
@@ -32,21 +43,22 @@ def open_url(url):
 
 def open_file(file):
     """
-    切换到文件所在路径下去执行程序。
+    在文件所在路径下去执行程序。
     因为有的程序读取配置文件或者数据时，不是以绝对路径读取的，
     而是直接读取一个文件名。这样默认的话，是需要在文件所在路径
     去执行程序的，否则就会出现路径错误。感觉这有点难以说明到底
     是程序的读取方式不严谨还是当前这个软件就得适配这种情形。
+    工作路径通过 cwd 传给子进程，不修改本进程的当前路径，后台线程
+    中也可以安全地调用。
     """
-    path = os.path.dirname(file)
-    os.chdir(path)
-    subprocess.Popen(['xdg-open', file])
-    os.chdir(PROJECT_PATH)
+    return subprocess.Popen(
+        ['xdg-open', file], cwd=os.path.dirname(file) or None)
 
 
 def locate_file(file):
     """定位文件
     """
+    terminal_name, _ = get_terminal()
     if terminal_name in (
         None, 'qterminal', 'lxterminal',
         'xfce4-terminal', 'xterm', 'tilix'
@@ -58,13 +70,14 @@ def locate_file(file):
 
 
 def open_directory(directory):
-    subprocess.Popen(['xdg-open', directory])
+    return subprocess.Popen(['xdg-open', directory])
 
 
 def open_console(directory):
+    _, terminal_path = get_terminal()
     if not terminal_path:
         return
-    subprocess.Popen(
+    return subprocess.Popen(
         [terminal_path],
         cwd=directory,
         start_new_session=True
@@ -72,7 +85,7 @@ def open_console(directory):
 
 
 def open_ftp(ftp_url):
-    subprocess.Popen(['xdg-open', ftp_url])
+    return subprocess.Popen(['xdg-open', ftp_url])
 
 def use_editor_open_path(editor, path):
-    subprocess.Popen([editor, path])
+    return subprocess.Popen([editor, path])
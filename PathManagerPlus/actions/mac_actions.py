@@ -2,7 +2,6 @@ import webbrowser
 import os
 import subprocess
 from pathlib import Path
-from ..settings import PROJECT_PATH
 
 
 def open_url(url):
@@ -11,38 +10,38 @@ def open_url(url):
 
 def open_file(file):
     """
-    切换到文件所在路径下去执行程序。
+    在文件所在路径下去执行程序。
     因为有的程序读取配置文件或者数据时，不是以绝对路径读取的，
     而是直接读取一个文件名。这样默认的话，是需要在文件所在路径
     去执行程序的，否则就会出现路径错误。感觉这有点难以说明到底
     是程序的读取方式不严谨还是当前这个软件就得适配这种情形。
+    工作路径通过 cwd 传给子进程，不修改本进程的当前路径，后台线程
+    中也可以安全地调用。
     """
-    path = os.path.dirname(file)
-    os.chdir(path)
-    subprocess.run(['open', file])
-    os.chdir(PROJECT_PATH)
+    return subprocess.Popen(
+        ['open', file], cwd=os.path.dirname(file) or None)
 
 
 def locate_file(file):
     """定位文件
+    成功时返回启动的 Popen 和空的消息，和其他操作一样由调用方回收。
     """
     file = Path(file)
-    subprocess.run(["open", "-R", file])
-    return True, ''
+    return subprocess.Popen(["open", "-R", file]), ''
 
 
 def open_directory(directory):
-    subprocess.run(['open', directory])
+    return subprocess.Popen(['open', directory])
 
 
 def open_console(directory):
-    subprocess.run(
+    return subprocess.Popen(
         ["open", "-a", "Terminal", directory]
     )
 
 
 def open_ftp(ftp_url):
-    subprocess.run(["open", ftp_url])
+    return subprocess.Popen(["open", ftp_url])
 
 def use_editor_open_path(editor, path):
-    subprocess.Popen(['open', '-a', editor, path])
+    return subprocess.Popen(['open', '-a', editor, path])
@@ -0,0 +1,46 @@
+"""
+系统环境检测结果的缓存。
+
+检测(比如在 PATH 中查找终端程序)要访问很多文件，每次启动都做一遍没有
+必要。结果保存在 PROBE_CACHE 中，和当时的 PATH 一起保存，PATH 改变以后
+重新检测。
+"""
+import os
+import json
+import hashlib
+
+from ..settings import PROBE_CACHE
+
+
+def path_key():
+    return hashlib.sha1(
+        os.environ.get('PATH', '').encode('utf-8', 'replace')).hexdigest()
+
+
+def cached_probe(name, probe, valid=None, cache_file=PROBE_CACHE):
+    """
+    返回 probe() 的结果，结果需要能够保存为 JSON。
+    valid(value) 返回 False 时不使用缓存的结果(比如程序已经被卸载)。
+    缓存文件读写失败时直接检测，不影响使用。
+    """
+    key = path_key()
+    try:
+        with open(cache_file, 'r', encoding='utf-8')as fl:
+            cache = json.load(fl)
+        if not isinstance(cache, dict):
+            cache = {}
+    except (OSError, ValueError):
+        cache = {}
+    entry = cache.get(name)
+    if isinstance(entry, dict) and entry.get('path_key') == key:
+        value = entry.get('value')
+        if valid is None or valid(value):
+            return value
+    value = probe()
+    cache[name] = {'path_key': key, 'value': value}
+    try:
+        with open(cache_file, 'w', encoding='utf-8')as fl:
+            json.dump(cache, fl, ensure_ascii=False)
+    except OSError:
+        pass
+    return value
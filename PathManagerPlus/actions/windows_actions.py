@@ -2,7 +2,6 @@ import webbrowser
 import os
 import subprocess
 from pathlib import Path
-from ..settings import PROJECT_PATH
 
 
 def open_url(url):
@@ -11,16 +10,26 @@ def open_url(url):
 
 def open_file(file):
     """
-    切换到文件所在路径下去执行程序。
+    在文件所在路径下去执行程序。
     因为有的程序读取配置文件或者数据时，不是以绝对路径读取的，
     而是直接读取一个文件名。这样默认的话，是需要在文件所在路径
     去执行程序的，否则就会出现路径错误。感觉这有点难以说明到底
     是程序的读取方式不严谨还是当前这个软件就得适配这种情形。
+    工作路径通过 cwd 传给子进程，不修改本进程的当前路径，后台线程
+    中也可以安全地调用。
     """
     path = os.path.dirname(file)
-    os.chdir(path)
-    os.startfile(file)
-    os.chdir(PROJECT_PATH)
+    try:
+        os.startfile(file, cwd=path)
+    except TypeError:
+        # Python 3.10 以前的 startfile 没有 cwd 参数，直接调用
+        # ShellExecuteW，不经过 cmd，文件名中的特殊字符不会被 cmd 解释
+        import ctypes
+        result = ctypes.windll.shell32.ShellExecuteW(
+            None, None, file, None, path, 1)
+        # 返回值不大于 32 表示出错
+        if result <= 32:
+            raise OSError(0, f'无法打开，错误代码 {result}', file)
 
 
 def locate_file(file):
@@ -41,7 +50,7 @@ def open_console(directory):
 
 
 def open_ftp(ftp_url):
-    subprocess.Popen(['explorer.exe', ftp_url])
+    return subprocess.Popen(['explorer.exe', ftp_url])
 
 def use_editor_open_path(editor, path):
-    subprocess.Popen([editor, path])
+    return subprocess.Popen([editor, path])
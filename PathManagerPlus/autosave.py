@@ -0,0 +1,238 @@
+"""
+空闲时自动保存。
+
+每次修改只是记录一下，不马上写文件：等到一段时间没有新的修改(空闲)
+才保存，这样连续的很多次修改只需要写一次。连续快速修改时空闲的判断
+会放宽一些，但是从第一次未保存的修改开始，最多等待 max_delay 秒，
+保证崩溃时最多丢失这么长时间的修改。
+写文件的频率还受写入带宽限制：写了 N 字节以后，至少要过
+N / budget 秒才会再次写入(不超过 max_delay 的限制)。
+
+保存时先在主线程中拍一个快照(DataStorage.snapshot，不复制数据)，
+然后作为后台任务(见 scheduler.py)编码、写入。写入通过
+file_sync.DataFile 进行，数据文件被其他程序修改过时不会覆盖，而是通知
+主线程合并后再保存。
+"""
+import time
+import threading
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+from .file_sync import FileChangedError, encode_data
+from .qt_scheduler import QtScheduler
+from .scheduler import CANCELLED, FAILED, NORMAL
+
+
+class JsonWriter:
+
+    """
+    data_file: file_sync.DataFile
+
+    写入带有 generation，比已经写入的 generation 旧的数据会被丢弃，
+    手动保存和后台保存同时进行时不会用旧数据覆盖新数据。
+    """
+
+    def __init__(self, data_file):
+        self.data_file = data_file
+        self.lock = threading.Lock()
+        self.written_generation = None
+
+    def write(self, data, generation, check=True):
+        """
+        写入成功返回写入的字节数，数据已经过时返回 0。
+        文件被其他程序修改过时抛出 FileChangedError。
+        """
+        with self.lock:
+            if self._outdated(generation):
+                return 0
+        # 编码不需要拿锁，数据文件只在比较、写入临时文件和替换的时候
+        # 锁住，其他程序不用等待编码
+        content = encode_data(data, self.data_file.format)
+        # 先拿数据文件的锁再拿自己的锁，和 MainWindow.save(先拿数据文件
+        # 的锁再调用 write)的顺序一致，手动保存和自动保存同时进行时不会
+        # 互相等待
+        with self.data_file.lock(), self.lock:
+            # 编码期间可能已经写入了更新的数据
+            if self._outdated(generation):
+                return 0
+            size = self.data_file.write(content, check)
+            self.written_generation = generation
+        return size
+
+    def _outdated(self, generation):
+        # 调用时要拿着 self.lock
+        return self.written_generation is not None \
+            and generation < self.written_generation
+
+
+class AutosavePolicy:
+
+    """
+    决定什么时候保存，时间由调用方传入，方便测试。
+    所有时间的单位都是秒。
+    """
+
+    IDLE = 2.0
+    MAX_IDLE = 10.0
+    MAX_DELAY = 60.0
+    # 每秒允许写入的字节数
+    BUDGET = 1 << 20
+
+    def __init__(self, idle=None, max_delay=None, budget=None):
+        self.idle = idle or self.IDLE
+        self.max_delay = max_delay or self.MAX_DELAY
+        self.budget = budget or self.BUDGET
+        # 第一次未保存的修改的时间，没有未保存的修改时为 None
+        self.dirty_since = None
+        self.last_edit = None
+        # 修改之间的平均间隔
+        self.interval = None
+        # 受带宽限制，下一次写入最早的时间
+        self.next_allowed = 0.0
+
+    def mark_dirty(self, now):
+        if self.dirty_since is None:
+            self.dirty_since = now
+        elif self.last_edit is not None:
+            gap = now - self.last_edit
+            if self.interval is None:
+                self.interval = gap
+            else:
+                self.interval = self.interval * 0.7 + gap * 0.3
+        self.last_edit = now
+
+    def idle_window(self):
+        """连续快速修改时多等一会儿，把它们合并到一次写入。
+        """
+        if self.interval is None:
+            return self.idle
+        return min(max(self.idle, self.interval * 2), self.MAX_IDLE)
+
+    def save_time(self):
+        """应该保存的时间，没有未保存的修改时返回 None。
+        """
+        if self.dirty_since is None:
+            return None
+        idle_at = self.last_edit + self.idle_window()
+        deadline = self.dirty_since + self.max_delay
+        return min(max(idle_at, self.next_allowed), deadline)
+
+    def started(self):
+        """开始保存，返回当时的 dirty_since，保存失败时交给 failed。
+        """
+        dirty_since = self.dirty_since
+        self.dirty_since = None
+        self.last_edit = None
+        self.interval = None
+        return dirty_since
+
+    def finished(self, now, size):
+        self.next_allowed = now + size / self.budget
+
+    def failed(self, now, dirty_since):
+        """保存失败，恢复未保存的状态，稍后再试。
+        """
+        if dirty_since is not None:
+            if self.dirty_since is None or dirty_since < self.dirty_since:
+                self.dirty_since = dirty_since
+        if self.last_edit is None:
+            self.last_edit = now
+        self.next_allowed = now + self.idle
+
+
+class AutoSaver(QObject):
+
+    """
+    data: DataStorage
+    writer: JsonWriter
+    scheduler: qt_scheduler.QtScheduler，没有给出时自己建一个
+
+    修改数据后调用 mark_dirty。保存完成后发出 saved(generation)，
+    generation 等于当前 data.generation 时说明数据已经全部保存。
+    数据文件被其他程序修改过时发出 conflict，由主线程合并后保存。
+    """
+
+    saved = Signal(int)
+    failed = Signal(str)
+    conflict = Signal()
+
+    def __init__(self, data, writer, policy=None, parent=None,
+                 scheduler=None):
+        super().__init__(parent)
+        self.data = data
+        self.writer = writer
+        self.policy = policy or AutosavePolicy()
+        self.scheduler = scheduler or QtScheduler(1, parent=self)
+        self.saving = False
+        self._dirty_since = None
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self._on_timer)
+
+    def mark_dirty(self):
+        self.policy.mark_dirty(time.monotonic())
+        self._arm()
+
+    def _arm(self):
+        if self.saving:
+            # 保存完成后会重新安排
+            return
+        save_time = self.policy.save_time()
+        if save_time is None:
+            self.timer.stop()
+            return
+        delay = max(0.0, save_time - time.monotonic())
+        self.timer.start(int(delay * 1000))
+
+    def _on_timer(self):
+        if self.saving:
+            return
+        save_time = self.policy.save_time()
+        if save_time is None:
+            return
+        if save_time > time.monotonic() + 0.01:
+            self._arm()
+            return
+        self.save_async()
+
+    def save_async(self):
+        generation = self.data.generation
+        snapshot = self.data.snapshot()
+        self._dirty_since = self.policy.started()
+        self.saving = True
+
+        def write(task):
+            with snapshot:
+                return self.writer.write(snapshot, generation)
+
+        self.scheduler.submit(
+            write, name='自动保存', priority=NORMAL,
+            on_done=lambda task: self._on_write_finished(generation, task)
+        )
+
+    def _on_write_finished(self, generation, task):
+        self.saving = False
+        now = time.monotonic()
+        if task.state == CANCELLED:
+            # 程序退出时被取消
+            return
+        if task.state == FAILED:
+            self.policy.failed(now, self._dirty_since)
+            if isinstance(task.error, FileChangedError):
+                self.conflict.emit()
+            else:
+                self.failed.emit(str(task.error))
+        else:
+            self.policy.finished(now, task.result)
+            self.saved.emit(generation)
+        self._arm()
+
+    def saved_elsewhere(self, size):
+        """数据已经由主线程保存(手动保存或者合并后保存)。
+        """
+        self.timer.stop()
+        self.policy.started()
+        self.policy.finished(time.monotonic(), size)
+
+    def stop(self):
+        self.timer.stop()
@@ -0,0 +1,443 @@
+"""
+命令行工具，不导入 PySide6，适合在脚本或者 rofi、dmenu 之类的启动器中
+查询和添加记录：
+
+    python -m PathManagerPlus search 报告 ext:pdf
+    python -m PathManagerPlus add ~/a.txt --node 常规/其他
+    python -m PathManagerPlus ls 常规 -r
+    python -m PathManagerPlus open 报告
+    python -m PathManagerPlus export 常规 -o out.tsv
+    python -m PathManagerPlus import out.csv --node 常规
+    python -m PathManagerPlus check
+    python -m PathManagerPlus convert compact-gz
+    python -m PathManagerPlus daemon
+
+搜索使用和界面相同的 DataStorage.search，结果也相同。节点可以写成 id，
+也可以写成用 / 分隔的名称路径。修改数据时和界面一样通过 file_sync
+加锁写入，已经打开的窗口在下次保存或者切换回来时会合并这些修改。
+后台服务(daemon)在运行时，search、open 和 add 交给服务处理，不需要
+每次都读取数据文件。
+"""
+import os
+import sys
+import json
+import argparse
+
+from .settings import DATABASE
+from .handle_data import DataStorage, path_to_item
+from .search import get_path_scheme
+from .file_sync import DataFile
+from .storage_format import FORMATS as STORAGE_FORMATS
+from .actions import open_path, system_actions
+from .daemon import DaemonClient, DaemonError, daemon_address, run_daemon
+from . import exchange
+
+
+class CliError(Exception):
+
+    """命令执行失败，消息会输出到 stderr。
+    """
+
+
+def find_node(data, spec):
+    node_id = data.find_node(spec)
+    if node_id is None:
+        raise CliError(f'找不到节点：{spec}')
+    return node_id
+
+
+def format_record(record, fmt):
+    """record: DataStorage.describe_item 的返回值。
+    """
+    if fmt == 'paths':
+        return record['path'] or ''
+    if fmt == 'json':
+        return json.dumps(record, ensure_ascii=False)
+    return f'{record["name"]}\t{record["path"] or ""}'
+
+
+def load(args):
+    if not os.path.exists(args.data):
+        raise CliError(f'找不到数据文件：{args.data}')
+    data_file = DataFile(args.data)
+    return data_file, DataStorage(data_file.read())
+
+
+class LocalSource:
+
+    """直接读取数据文件。
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.data_file, self.data = load(args)
+
+    def search(self, query, node=None, limit=0):
+        data = self.data
+        scope = find_node(data, node) if node else None
+        # 只查询一次，不需要建立索引
+        result = data.search(query, use_index=False, scope=scope)
+        items = result[:limit] if limit else result
+        return [data.describe_item(_id) for _id in items], len(result)
+
+    def lookup(self, target):
+        """按 id 或者完整的路径查找。
+        """
+        data = self.data
+        if target in data['items']:
+            return [data.describe_item(target)]
+        return [
+            data.describe_item(_id) for _id, item in data['items'].items()
+            if item['path'] == target
+        ]
+
+    def add(self, paths, node, name=None, comment=None):
+        with self.data_file.lock():
+            # 加锁以后重新读取，期间其他程序保存的修改不会丢失
+            data = DataStorage(self.data_file.read())
+            node_id = find_node(data, node)
+            if node_id == 'root':
+                raise CliError('不能添加到根节点，请用 --node 指定节点')
+            item_ids = data.add_items(
+                [path_to_item(path, name, comment) for path in paths],
+                node_id
+            )
+            self.data_file.write_data(data, check=False)
+        return item_ids
+
+
+class DaemonSource:
+
+    """通过后台服务查询，见 daemon.py。
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def _request(self, op, **params):
+        try:
+            return self.client.request(op, **params)
+        except DaemonError as e:
+            raise CliError(str(e))
+
+    def search(self, query, node=None, limit=0):
+        response = self._request('search', query=query, node=node,
+                                 limit=limit)
+        return response['items'], response['total']
+
+    def lookup(self, target):
+        try:
+            return self.client.request('lookup', id=target)['items']
+        except DaemonError:
+            return self._request('lookup', path=target)['items']
+
+    def add(self, paths, node, name=None, comment=None):
+        return self._request('add', paths=paths, node=node, name=name,
+                             comment=comment)['ids']
+
+
+def open_source(args):
+    """后台服务在运行时使用服务，否则直接读取数据文件。
+    """
+    if not args.no_daemon:
+        try:
+            address = daemon_address(args.data)
+        except OSError:
+            # 没有安全的地方放套接字，服务也不会在运行
+            address = None
+        client = DaemonClient.connect(address) if address else None
+        if client is not None:
+            return DaemonSource(client)
+    return LocalSource(args)
+
+
+def cmd_search(args, out):
+    source = open_source(args)
+    records, total = source.search(
+        ' '.join(args.query), args.node, args.limit)
+    for record in records:
+        print(format_record(record, args.format), file=out)
+    return 0 if records else 1
+
+
+def cmd_add(args, out):
+    paths = []
+    for path in args.paths:
+        if get_path_scheme(path) == 'local':
+            path = os.path.abspath(os.path.expanduser(path))
+        paths.append(path)
+    source = open_source(args)
+    for item_id in source.add(paths, args.node, args.name, args.comment):
+        print(item_id, file=out)
+    return 0
+
+
+def cmd_ls(args, out):
+    _, data = load(args)
+    node_id = find_node(data, args.node)
+
+    def show(node_id, depth):
+        indent = '    ' * depth
+        node = data['nodes'][node_id]
+        for sub_node_id in node['sub_nodes']:
+            sub_node = data['nodes'][sub_node_id]
+            print(f'{indent}{sub_node["name"]}/', file=out)
+            if args.recursive:
+                show(sub_node_id, depth + 1)
+        for item_id in node['items']:
+            print(indent + format_record(data.describe_item(item_id),
+                                         'plain'), file=out)
+
+    show(node_id, 0)
+    return 0
+
+
+def cmd_open(args, out):
+    source = open_source(args)
+    target = ' '.join(args.target)
+    # id 或者完整的路径优先，方便接在 search --format paths 后面
+    records = source.lookup(target)
+    total = len(records)
+    if not records:
+        records, total = source.search(target, limit=10)
+    if not records:
+        raise CliError(f'没有找到：{target}')
+    if total > 1 and not args.first:
+        for record in records[:10]:
+            print(format_record(record, 'plain'), file=sys.stderr)
+        if total > 10:
+            print('...', file=sys.stderr)
+        raise CliError(f'找到 {total} 项，请缩小范围或者加上 --first')
+    path = records[0]['path']
+    # 在命令行所在的环境中打开，而不是交给后台服务
+    if system_actions is None:
+        raise CliError('不支持这个系统。')
+    status = open_path(path)
+    if status is None:
+        raise CliError('这一项没有路径')
+    if status is False:
+        raise CliError(f'找不到目标路径：{path}')
+    print(path, file=out)
+    return 0
+
+
+def cmd_export(args, out):
+    _, data = load(args)
+    node_id = find_node(data, args.node)
+    fmt = args.format or (args.output and exchange.guess_format(args.output)) \
+        or 'tsv'
+    item_ids = None
+    if args.query:
+        item_ids = data.search(' '.join(args.query), use_index=False,
+                               scope=node_id)
+    fl = open(args.output, 'w', encoding='utf-8', newline='') \
+        if args.output else out
+    try:
+        if fmt in exchange.FORMATS:
+            exchange.export(data, fl, fmt, node_id, item_ids)
+        elif fmt == 'json':
+            nodes = list(data.iter_subtree(node_id))
+            items = [_id for n in nodes for _id in data['nodes'][n]['items']]
+            if item_ids is not None:
+                items = item_ids
+            json.dump({
+                'nodes': {_id: data['nodes'][_id] for _id in nodes},
+                'items': {_id: data['items'][_id] for _id in items}
+            }, fl, indent=4, ensure_ascii=False)
+            fl.write('\n')
+        else:
+            if item_ids is None:
+                item_ids = (
+                    item_id for current in data.iter_subtree(node_id)
+                    for item_id in data['nodes'][current]['items']
+                )
+            for item_id in item_ids:
+                item = data['items'][item_id]
+                fields = (
+                    data.get_item_node_path(item_id), item['name'],
+                    item['path'], item.get('comment')
+                )
+                fl.write('\t'.join(
+                    (value or '').replace('\t', ' ').replace('\n', ' ')
+                    for value in fields
+                ) + '\n')
+    finally:
+        if fl is not out:
+            fl.close()
+    return 0
+
+
+def cmd_import(args, out):
+    fmt = args.format or exchange.guess_format(args.file)
+    if fmt is None:
+        raise CliError('不能从扩展名判断格式，请用 --format 指定')
+    if args.file != '-' and not os.path.exists(args.file):
+        raise CliError(f'找不到文件：{args.file}')
+    if not os.path.exists(args.data):
+        raise CliError(f'找不到数据文件：{args.data}')
+    data_file = DataFile(args.data)
+    fl = open(args.file, encoding='utf-8', newline='') \
+        if args.file != '-' else sys.stdin
+    try:
+        with data_file.lock():
+            data = DataStorage(data_file.read())
+            node_id = find_node(data, args.node)
+            try:
+                added, created = exchange.import_file(data, fl, fmt, node_id)
+            except exchange.ExchangeError as e:
+                raise CliError(f'{args.file}：{e}')
+            data_file.write_data(data, check=False)
+    finally:
+        if fl is not sys.stdin:
+            fl.close()
+    print(f'导入 {added} 项，新建 {created} 个节点', file=out)
+    return 0
+
+
+def cmd_check(args, out):
+    data_file, data = load(args)
+    status = 0
+    if not data.check_data_integrity():
+        status = 1
+        if args.fix:
+            with data_file.lock():
+                data = DataStorage(data_file.read())
+                data.fix_data()
+                data_file.write_data(data, check=False)
+            print('数据结构有错误，已经修复', file=out)
+        else:
+            print('数据结构有错误，可以加上 --fix 修复', file=out)
+    missing = 0
+    for item_id, item in data['items'].items():
+        path = item['path']
+        if get_path_scheme(path) == 'local' and not os.path.exists(path):
+            missing += 1
+            print(f'找不到：{data.get_item_node_path(item_id)}\t{path}',
+                  file=out)
+    if missing:
+        status = 1
+    print(f'{data.node_count() - 1} 个节点，{data.item_count()} 项，'
+          f'{missing} 项的目标不存在', file=out)
+    return status
+
+
+def cmd_convert(args, out):
+    if not os.path.exists(args.data):
+        raise CliError(f'找不到数据文件：{args.data}')
+    data_file = DataFile(args.data)
+    with data_file.lock():
+        data = data_file.read()
+        old_format = data_file.format
+        old_size = os.path.getsize(args.data)
+        data_file.format = args.format
+        data_file.write_data(data, check=False)
+        # 数据结构不一致时紧凑格式会退回到 JSON
+        data_file.read()
+    print(f'{old_format} {old_size} 字节 -> {data_file.format} '
+          f'{os.path.getsize(args.data)} 字节', file=out)
+    if data_file.format != args.format:
+        raise CliError('数据结构有错误，只能保存为 json，请先运行 check --fix')
+    return 0
+
+
+def cmd_daemon(args, out):
+    if not os.path.exists(args.data):
+        raise CliError(f'找不到数据文件：{args.data}')
+    try:
+        run_daemon(args.data)
+    except DaemonError as e:
+        raise CliError(str(e))
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m PathManagerPlus',
+        description='不打开窗口，在命令行中查询和修改数据。'
+    )
+    # 每个子命令都可以指定数据文件
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        '--data', default=DATABASE, help='数据文件，默认是程序使用的文件')
+    common.add_argument(
+        '--no-daemon', action='store_true',
+        help='不使用后台服务，直接读取数据文件')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser(
+        'search', parents=[common], help='搜索，语法和界面上的搜索框相同')
+    p.add_argument('query', nargs='+')
+    p.add_argument('--node', help='只在这个节点及其子节点中搜索')
+    p.add_argument('--limit', type=int, default=0)
+    p.add_argument(
+        '--format', choices=('plain', 'paths', 'json'), default='plain')
+    p.set_defaults(func=cmd_search)
+
+    p = sub.add_parser(
+        'add', parents=[common], help='添加路径或者网址')
+    p.add_argument('paths', nargs='+')
+    p.add_argument('--node', required=True, help='添加到这个节点')
+    p.add_argument('--name', help='名称，默认取路径的最后一部分')
+    p.add_argument('--comment')
+    p.set_defaults(func=cmd_add)
+
+    p = sub.add_parser(
+        'ls', parents=[common], help='列出节点的子节点和项')
+    p.add_argument('node', nargs='?')
+    p.add_argument('-r', '--recursive', action='store_true')
+    p.set_defaults(func=cmd_ls)
+
+    p = sub.add_parser(
+        'open', parents=[common], help='打开一项：item id、路径或者搜索语句')
+    p.add_argument('target', nargs='+')
+    p.add_argument(
+        '--first', action='store_true', help='找到多项时打开第一项')
+    p.set_defaults(func=cmd_open)
+
+    p = sub.add_parser(
+        'export', parents=[common], help='导出节点及其子节点的项')
+    p.add_argument('node', nargs='?')
+    p.add_argument('-o', '--output')
+    p.add_argument(
+        '--format', choices=('tsv', 'json') + exchange.FORMATS,
+        help='默认按输出文件的扩展名，不认识时是 tsv')
+    p.add_argument(
+        '--query', nargs='+', help='只导出这个节点中的搜索结果')
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser(
+        'import', parents=[common],
+        help='导入 export 导出的 csv、jsonl 或者 md 文件，按节点路径重建节点')
+    p.add_argument('file', help='- 表示从标准输入读取')
+    p.add_argument('--node', help='导入到这个节点下面，默认是第一层')
+    p.add_argument('--format', choices=exchange.FORMATS,
+                   help='默认按文件的扩展名')
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser(
+        'check', parents=[common], help='检查数据结构和目标路径是否存在')
+    p.add_argument('--fix', action='store_true', help='修复数据结构')
+    p.set_defaults(func=cmd_check)
+
+    p = sub.add_parser(
+        'convert', parents=[common],
+        help='转换数据文件的格式，之后保存时一直使用这个格式')
+    p.add_argument('format', choices=STORAGE_FORMATS)
+    p.set_defaults(func=cmd_convert)
+
+    p = sub.add_parser(
+        'daemon', parents=[common],
+        help='在后台常驻，保持数据和索引在内存中，加快查询')
+    p.set_defaults(func=cmd_daemon)
+    # python -m PathManagerPlus 用来区分子命令和打开窗口的参数
+    parser.commands = tuple(sub.choices)
+    return parser
+
+
+def main(argv=None, out=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args, out or sys.stdout)
+    except CliError as e:
+        print(f'PathManagerPlus: {e}', file=sys.stderr)
+        return 2
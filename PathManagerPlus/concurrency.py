@@ -0,0 +1,160 @@
+"""
+DataStorage 的线程安全约定。
+
+- 只有一个线程修改数据(界面所在的主线程，或者命令行、后台服务中唯一
+  的线程)。所有修改数据的方法都持有写锁(DataStorage.lock.write)。
+- 其他线程读取数据有两种方式：
+  1. 快照(DataStorage.snapshot)：不加锁，读到的是拍快照时的数据，
+     适合保存、导出、扫描文件夹之类时间较长的任务，不会让主线程等待。
+  2. 读锁(DataStorage.lock.read)：读取最新的数据以及搜索索引，比如
+     在后台线程中搜索。持有读锁期间主线程的修改需要等待，所以只能用于
+     短时间的读取。DataStorage 的查询方法(search、get_item_counts、
+     filter_nodes、describe_item 等)自己会拿读锁，直接调用就可以；
+     直接遍历 data['items'] 之类的表时需要自己拿读锁。
+- 修改数据的线程自己读取时不需要加锁。
+
+读写锁可以重入，写优先：有线程在等写锁时，新的读请求要等写完成，
+修改不会因为读取一直不断而等不到锁。
+"""
+import functools
+import threading
+from contextlib import contextmanager
+
+
+class RWLock:
+
+    """
+    可重入、写优先的读写锁。
+
+    - 多个线程可以同时持有读锁，写锁是独占的；
+    - 同一个线程可以重复拿读锁或者写锁，持有写锁时也可以拿读锁；
+    - 持有读锁时不能再拿写锁(两个读线程同时升级会互相等待)，会抛出
+      RuntimeError。
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        # {线程 id: 重入次数}
+        self._readers = {}
+        self._writer = None
+        self._write_depth = 0
+        self._waiting_writers = 0
+
+    def acquire_read(self, timeout=None):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                # 持有写锁时读，算作写锁的重入
+                self._write_depth += 1
+                return True
+            if me in self._readers:
+                # 已经持有读锁时不能等待写锁，否则和等待的写线程互相等待
+                self._readers[me] += 1
+                return True
+            if (self._writer is not None or self._waiting_writers) \
+                    and not self._condition.wait_for(
+                        lambda: self._writer is None
+                        and not self._waiting_writers, timeout):
+                return False
+            self._readers[me] = 1
+            return True
+
+    def release_read(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._release_write()
+                return
+            depth = self._readers.get(me)
+            if not depth:
+                raise RuntimeError('没有持有读锁')
+            if depth == 1:
+                del self._readers[me]
+                if not self._readers:
+                    self._condition.notify_all()
+            else:
+                self._readers[me] = depth - 1
+
+    def acquire_write(self, timeout=None):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._write_depth += 1
+                return True
+            if me in self._readers:
+                raise RuntimeError('持有读锁时不能再拿写锁')
+            self._waiting_writers += 1
+            try:
+                if not self._condition.wait_for(
+                        lambda: self._writer is None and not self._readers,
+                        timeout):
+                    return False
+            finally:
+                self._waiting_writers -= 1
+                if not self._waiting_writers:
+                    # 等待超时的写线程可能挡住了读线程
+                    self._condition.notify_all()
+            self._writer = me
+            self._write_depth = 1
+            return True
+
+    def release_write(self):
+        with self._condition:
+            if self._writer != threading.get_ident():
+                raise RuntimeError('没有持有写锁')
+            self._release_write()
+
+    def _release_write(self):
+        self._write_depth -= 1
+        if self._write_depth == 0:
+            self._writer = None
+            self._condition.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+    def write_locked(self):
+        """当前线程是否持有写锁。
+        """
+        return self._writer == threading.get_ident()
+
+
+def reads(method):
+    """方法执行期间持有 self.lock 的读锁。
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        lock = self.lock
+        lock.acquire_read()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            lock.release_read()
+    return wrapper
+
+
+def writes(method):
+    """方法执行期间持有 self.lock 的写锁。
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        lock = self.lock
+        lock.acquire_write()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            lock.release_write()
+    return wrapper
@@ -0,0 +1,375 @@
+"""
+常驻后台的查询服务。
+
+命令行工具每次运行都要重新读取数据文件。服务模式下数据和搜索索引一直
+留在内存中，通过 Unix 套接字回答请求，适合绑定到快捷键的脚本频繁查询：
+
+    python -m PathManagerPlus daemon
+
+协议是一行一个 JSON，一个连接上可以连续发送多个请求：
+
+    请求：{"op": "search", "query": "报告", "node": "常规", "limit": 50}
+    回复：{"ok": true, "items": [...], "total": 3}
+    出错：{"ok": false, "error": "..."}
+
+支持的 op：ping、search、lookup、open、add、reload、stats。请求中的
+id 会原样放在回复中。每次请求前检查数据文件的修改时间，界面或者命令行
+保存过以后会重新读取；界面保存后也会发送 reload(不等待回复)，让服务
+在下一次查询之前就载入好。
+
+套接字和界面的一样放在只有当前用户可以访问的文件夹中(见
+single_instance.runtime_dir)，服务端还会检查连接的是不是同一个用户。
+
+事件循环只负责收发，请求交给一个后台线程依次处理：重新读取数据文件、
+加锁写入的时候也能接收其他连接，同一时间只处理一个请求，不需要给数据
+加锁。只支持有 Unix 套接字的系统。
+"""
+import os
+import json
+import time
+import socket
+
+from .settings import DATABASE
+from .handle_data import DataStorage, path_to_item
+from .file_sync import DataFile
+from .single_instance import (
+    check_socket,
+    instance_key,
+    is_running,
+    runtime_dir
+)
+from .actions import open_path
+
+# 一行请求的最大长度
+MAX_REQUEST = 1 << 20
+
+
+class DaemonError(Exception):
+
+    """服务返回的错误，或者连接不上服务。
+    """
+
+
+def daemon_address(database=DATABASE):
+    """放套接字的文件夹不安全时抛出 single_instance.UnsafeSocketError。
+    """
+    return os.path.join(
+        runtime_dir(),
+        f'PathManagerPlus-{instance_key(database)}-daemon.sock'
+    )
+
+
+class QueryService:
+
+    """
+    持有数据和索引，处理一个请求返回一个回复，和网络无关，方便测试。
+    """
+
+    LIMIT = 50
+
+    def __init__(self, database=DATABASE):
+        self.data_file = DataFile(database)
+        self.data = None
+        self.loaded_at = None
+        self.requests = 0
+        self.reload()
+
+    def reload(self):
+        self.data = DataStorage(self.data_file.read())
+        self.loaded_at = time.time()
+        # 提前建立索引，第一次查询也很快
+        self.data.build_indexes()
+
+    def refresh(self):
+        """数据文件被修改过时重新读取。先只比较修改时间，不需要加锁。
+        """
+        if self.data_file.might_have_changed() and self.data_file.changed():
+            self.reload()
+
+    def handle(self, request):
+        self.requests += 1
+        op = request.get('op')
+        handler = getattr(self, f'op_{op}', None) \
+            if isinstance(op, str) else None
+        if handler is None:
+            raise DaemonError(f'不支持的操作：{op}')
+        self.refresh()
+        response = handler(request)
+        response['ok'] = True
+        return response
+
+    def _node(self, spec):
+        node_id = self.data.find_node(spec)
+        if node_id is None:
+            raise DaemonError(f'找不到节点：{spec}')
+        return node_id
+
+    def op_ping(self, request):
+        return {}
+
+    def op_stats(self, request):
+        return {
+            'nodes': self.data.node_count() - 1,
+            'items': self.data.item_count(),
+            'requests': self.requests,
+            'loaded_at': self.loaded_at,
+            'cache': self.data.query_cache.info()
+        }
+
+    def op_reload(self, request):
+        # 数据文件有变化时已经在 handle 中重新读取了
+        return {}
+
+    def op_search(self, request):
+        node = request.get('node')
+        scope = self._node(node) if node else None
+        result = self.data.search(str(request.get('query', '')), scope=scope)
+        limit = request.get('limit', self.LIMIT)
+        items = result[:limit] if limit else result
+        return {
+            'items': [self.data.describe_item(_id) for _id in items],
+            'total': len(result)
+        }
+
+    def op_lookup(self, request):
+        """按 id 或者路径查找。
+        """
+        item_id = request.get('id')
+        if item_id is not None:
+            if item_id not in self.data['items']:
+                raise DaemonError(f'找不到：{item_id}')
+            return {'items': [self.data.describe_item(item_id)]}
+        path = request.get('path')
+        items = [
+            self.data.describe_item(_id)
+            for _id, item in self.data['items'].items()
+            if item['path'] == path
+        ]
+        return {'items': items}
+
+    def op_open(self, request):
+        item_id = request.get('id')
+        if item_id not in self.data['items']:
+            raise DaemonError(f'找不到：{item_id}')
+        path = self.data['items'][item_id]['path']
+        status = open_path(path)
+        if status is None:
+            raise DaemonError('这一项没有路径')
+        if status is False:
+            raise DaemonError(f'找不到目标路径：{path}')
+        return {'path': path}
+
+    def op_add(self, request):
+        """
+        paths 需要是绝对路径，相对路径由客户端按自己的当前文件夹转换。
+        和界面一样加锁写入数据文件。
+        """
+        paths = request.get('paths') or []
+        with self.data_file.lock():
+            self.refresh()
+            node_id = self._node(request.get('node'))
+            if node_id == 'root':
+                raise DaemonError('不能添加到根节点')
+            item_ids = self.data.add_items([
+                path_to_item(path, request.get('name'), request.get('comment'))
+                for path in paths
+            ], node_id)
+            self.data_file.write_data(self.data, check=False)
+            self.data.clear_dirty(self.data.generation)
+        return {'ids': item_ids}
+
+
+def _respond(service, request):
+    """在后台线程中处理一个请求，出错时也返回回复。
+    """
+    try:
+        return service.handle(request)
+    except DaemonError as e:
+        return {'ok': False, 'error': str(e)}
+    except Exception as e:
+        # 比如参数的类型不对，只影响这一个请求，不断开连接
+        return {
+            'ok': False,
+            'error': f'处理请求出错：{type(e).__name__}: {e}'
+        }
+
+
+def _same_user(sock):
+    """
+    连接的程序是不是同一个用户。没有 SO_PEERCRED 的系统(比如 macOS)
+    只靠文件夹的权限。
+    """
+    if sock is None or not hasattr(socket, 'SO_PEERCRED'):
+        return True
+    import struct
+    credentials = sock.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    _, uid, _ = struct.unpack('3i', credentials)
+    return uid == os.getuid()
+
+
+async def _serve_client(service, executor, reader, writer):
+    import asyncio
+    loop = asyncio.get_running_loop()
+    try:
+        if not _same_user(writer.get_extra_info('socket')):
+            return
+        while True:
+            try:
+                line = await reader.readline()
+            except (asyncio.LimitOverrunError, ValueError):
+                break
+            if not line:
+                break
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError
+            except ValueError:
+                response = {'ok': False, 'error': '请求格式不对'}
+            else:
+                response = await loop.run_in_executor(
+                    executor, _respond, service, request)
+                if 'id' in request:
+                    response['id'] = request['id']
+            writer.write(
+                json.dumps(response, ensure_ascii=False).encode('utf-8')
+                + b'\n'
+            )
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service, address, ready=None):
+    """
+    在 address 上监听，直到被取消。ready 是 asyncio.Event 或者
+    threading.Event，开始监听后设置。
+    """
+    # 只有服务端需要 asyncio，界面和命令行导入这个模块时不导入它，
+    # 启动更快
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    if os.path.lexists(address):
+        # 上次异常退出留下的套接字
+        if is_running(address):
+            raise DaemonError(f'服务已经在运行：{address}')
+        os.remove(address)
+    # 只有一个线程，请求依次处理
+    executor = ThreadPoolExecutor(1, thread_name_prefix='daemon')
+    # 套接字创建出来就只有当前用户可以访问，而不是创建以后再修改权限
+    umask = os.umask(0o177)
+    try:
+        server = await asyncio.start_unix_server(
+            lambda reader, writer:
+                _serve_client(service, executor, reader, writer),
+            address,
+            limit=MAX_REQUEST
+        )
+    finally:
+        os.umask(umask)
+    if ready is not None:
+        ready.set()
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        if os.path.lexists(address):
+            os.remove(address)
+
+
+def run_daemon(database=DATABASE, address=None):
+    if not hasattr(socket, 'AF_UNIX'):
+        raise DaemonError('这个系统不支持服务模式')
+    import asyncio
+    try:
+        address = address or daemon_address(database)
+    except OSError as e:
+        raise DaemonError(str(e))
+    service = QueryService(database)
+    try:
+        asyncio.run(serve(service, address))
+    except KeyboardInterrupt:
+        pass
+
+
+class DaemonClient:
+
+    """
+    同步的客户端，只用标准库。连接一直保持，可以连续发送请求。
+
+        client = DaemonClient.connect()
+        if client is not None:
+            items = client.request('search', query='报告')['items']
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.reader = sock.makefile('rb')
+
+    @classmethod
+    def connect(cls, address=None, timeout=2.0):
+        """服务没有运行，或者套接字不属于当前用户时返回 None。
+        """
+        if not hasattr(socket, 'AF_UNIX'):
+            return None
+        try:
+            address = address or daemon_address()
+            check_socket(address)
+        except OSError:
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(address)
+        except OSError:
+            sock.close()
+            return None
+        return cls(sock)
+
+    def request(self, op, **params):
+        params['op'] = op
+        try:
+            self.sock.sendall(
+                json.dumps(params, ensure_ascii=False).encode('utf-8') + b'\n')
+            line = self.reader.readline()
+        except OSError as e:
+            raise DaemonError(str(e))
+        if not line:
+            raise DaemonError('服务断开了连接')
+        response = json.loads(line)
+        if not response.get('ok'):
+            raise DaemonError(response.get('error'))
+        return response
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def notify_reload(database=DATABASE):
+    """
+    通知服务数据文件已经修改，服务没有运行时什么也不做。只发送不等待
+    回复，重新读取数据的时间不会让调用方(界面)等待。
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        return False
+    try:
+        address = daemon_address(database)
+        check_socket(address)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(0.2)
+            sock.connect(address)
+            sock.sendall(b'{"op": "reload"}\n')
+    except OSError:
+        return False
+    return True
@@ -0,0 +1,104 @@
+"""
+在后台线程中载入数据文件。
+
+数据很多时，读取、检查、修复和建立索引都要花时间，以前这些都在窗口
+显示之前完成。现在窗口先显示出来，数据作为后台任务(见 scheduler.py)
+载入：解析完 JSON 以后马上发出 topLevelReady，界面先显示第一层节点；
+检查、修复和建立索引都完成以后发出 loaded，界面再显示整棵树。任务被
+调度器取消时(比如关闭窗口)发出 cancelled。
+
+载入完成之前，数据对象只在后台线程中使用；通过 loaded 交给界面以后，
+后台线程不再碰它，所以不需要加锁。
+"""
+import os
+
+from PySide6.QtCore import QObject, Signal
+
+from .handle_data import DataStorage, gen_base_data
+from .qt_scheduler import QtScheduler
+from .scheduler import CANCELLED, INTERACTIVE
+
+
+def top_level_nodes(raw):
+    """
+    从刚解析出来、还没有检查过的数据中取出第一层节点 [(node_id, 名称)]，
+    数据有问题的部分直接跳过。
+    """
+    try:
+        nodes = raw['nodes']
+        sub_nodes = nodes['root']['sub_nodes']
+    except (KeyError, TypeError):
+        return []
+    result = []
+    for node_id in sub_nodes:
+        node = nodes.get(node_id)
+        if isinstance(node, dict):
+            result.append((node_id, str(node.get('name') or '')))
+    return result
+
+
+def load_data(data_file, writer, top_level_ready=None):
+    """
+    读取、检查并修复数据，建立索引。数据文件不存在时生成初始数据，
+    数据被修复过时写回数据文件。
+    top_level_ready([(node_id, 名称)]) 在解析完 JSON 后马上调用。
+    """
+    if not os.path.exists(data_file.path):
+        data = gen_base_data()
+        writer.write(data, data.generation, check=False)
+    else:
+        raw = data_file.read()
+        if top_level_ready is not None:
+            top_level_ready(top_level_nodes(raw))
+        data = DataStorage(raw)
+        status = data.check_data_integrity()
+        if not status:
+            # 修复数据的同时，将修复完的数据保存到数据库。
+            data.fix_data()
+            writer.write(data, data.generation)
+    data.clear_dirty(data.generation)
+    data.build_indexes()
+    return data
+
+
+class DataLoader(QObject):
+
+    """
+    topLevelReady([(node_id, 名称)])：第一层节点，数据还没有检查过。
+    loaded(DataStorage)：载入完成。
+    failed(错误信息)
+    cancelled()：任务被取消，不会再发出 loaded 或者 failed。
+    scheduler: qt_scheduler.QtScheduler，没有给出时自己建一个
+    """
+
+    topLevelReady = Signal(list)
+    loaded = Signal(object)
+    failed = Signal(str)
+    cancelled = Signal()
+
+    def __init__(self, data_file, writer, parent=None, scheduler=None):
+        super().__init__(parent)
+        self.data_file = data_file
+        self.writer = writer
+        self.scheduler = scheduler or QtScheduler(1, parent=self)
+        self.task = None
+
+    def start(self):
+        if self.task is not None:
+            return
+        # 界面在等着数据，排在其他后台任务前面
+        self.task = self.scheduler.submit(
+            self._run, name='载入数据', priority=INTERACTIVE,
+            on_done=self._on_done
+        )
+
+    def _run(self, task):
+        return load_data(self.data_file, self.writer, self.topLevelReady.emit)
+
+    def _on_done(self, task):
+        if task.state == CANCELLED:
+            self.cancelled.emit()
+        elif task.error is not None:
+            self.failed.emit(str(task.error))
+        elif task.result is not None:
+            self.loaded.emit(task.result)
@@ -0,0 +1,219 @@
+"""
+把磁盘上的文件夹导入成节点：子文件夹对应子节点，文件对应项。
+
+导入以后的节点会记住对应的文件夹和它的修改时间(mtime)，保存在节点的
+mirror 字段中。重新扫描时，修改时间没有变化的文件夹不需要重新列出内容，
+只对有变化的文件夹计算差异，增加新出现的、删除已经不存在的文件和文件夹。
+文件夹的修改时间只反映直接包含的内容，所以没有变化的文件夹仍然要继续
+检查它的子文件夹。
+
+扫描和数据修改分成两步：scan_directory 只读磁盘，可以放在后台线程里面
+运行；apply_scan 修改数据，需要在主线程中调用。
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from .handle_data import get_data_format
+
+
+def _scan_one(dirpath, known):
+    """
+    返回 (dirpath, entry, 子文件夹路径列表)。
+    entry 为 (mtime, 子文件夹名称, 文件名称)，文件夹没有变化时后面两项是
+    None；无法访问的文件夹 entry 为 None。
+    """
+    try:
+        mtime = os.stat(dirpath).st_mtime_ns
+    except OSError:
+        return dirpath, None, []
+    if known is not None and known[0] == mtime:
+        return dirpath, (mtime, None, None), known[1]
+    subdirs = []
+    files = []
+    try:
+        with os.scandir(dirpath) as entries:
+            for entry in entries:
+                try:
+                    # 不跟随链接，避免链接形成的循环
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    else:
+                        files.append(entry.name)
+                except OSError:
+                    continue
+    except OSError:
+        return dirpath, None, []
+    subdirs.sort()
+    files.sort()
+    return (
+        dirpath,
+        (mtime, subdirs, files),
+        [os.path.join(dirpath, name) for name in subdirs]
+    )
+
+
+def scan_directory(path, known=None, max_workers=None, task=None):
+    """
+    用线程池并行扫描 path 下面的所有文件夹，返回 {文件夹路径: entry}。
+
+    known: mirror_state 的返回值，修改时间相同的文件夹直接沿用记录的
+    子文件夹，不再列出内容。
+    task: 作为后台任务(scheduler.Task)运行时，报告已经扫描的文件夹数，
+    任务被取消时抛出 scheduler.Cancelled。
+    """
+    known = known or {}
+    result = {}
+    reported = 0
+    with ThreadPoolExecutor(max_workers) as pool:
+        pending = {pool.submit(_scan_one, path, known.get(path))}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            if task is not None and task.cancelled:
+                for future in pending:
+                    future.cancel()
+                task.check()
+            for future in done:
+                dirpath, entry, children = future.result()
+                if entry is None:
+                    continue
+                result[dirpath] = entry
+                for child in children:
+                    pending.add(
+                        pool.submit(_scan_one, child, known.get(child)))
+            # 每 100 个文件夹报告一次，不要太频繁
+            if task is not None and len(result) - reported >= 100:
+                reported = len(result)
+                task.progress(reported)
+    return result
+
+
+def get_mirror_path(data, node_id):
+    mirror = data['nodes'][node_id].get('mirror')
+    return mirror['path'] if mirror else None
+
+
+def _mirror_children(data, node_id):
+    """{文件夹路径: 子节点 id}，只包括由导入生成的子节点。
+    """
+    children = {}
+    for sub_node_id in data['nodes'][node_id]['sub_nodes']:
+        mirror = data['nodes'][sub_node_id].get('mirror')
+        if mirror:
+            children[mirror['path']] = sub_node_id
+    return children
+
+
+def mirror_state(data, node_id):
+    """
+    记录的扫描状态 {文件夹路径: (mtime, 子文件夹路径列表)}，
+    交给 scan_directory 判断哪些文件夹没有变化。在后台线程中调用时，
+    data 需要是快照(DataStorage.snapshot)。
+    """
+    state = {}
+    for current in data.iter_subtree(node_id):
+        mirror = data['nodes'][current].get('mirror')
+        if not mirror or mirror['mtime'] is None:
+            continue
+        state[mirror['path']] = (
+            mirror['mtime'], list(_mirror_children(data, current))
+        )
+    return state
+
+
+def create_mirror_node(data, path, parent_id='root'):
+    """新建一个空的导入节点，之后扫描的结果通过 apply_scan 写进去。
+    """
+    path = os.path.abspath(path)
+    name = os.path.basename(os.path.normpath(path)) or path
+    node_id = data.add_node(name, parent_id)
+    data.update_node(node_id, {'mirror': {'path': path, 'mtime': None}})
+    return node_id
+
+
+def apply_scan(data, node_id, scan):
+    """
+    把扫描结果和节点现有的内容比较，只应用差异，返回变化的统计。
+
+    只管理由导入生成的子节点，以及路径直接位于对应文件夹下面的项，
+    手动添加到这些节点中的其他节点和项不会被改动。
+    """
+    stats = {
+        'nodes_added': 0,
+        'nodes_removed': 0,
+        'items_added': 0,
+        'items_removed': 0,
+        'dirs_unchanged': 0,
+        'missing': False
+    }
+    root_path = get_mirror_path(data, node_id)
+    if root_path not in scan:
+        stats['missing'] = True
+        return stats
+    removed_items = []
+    stack = [(node_id, root_path)]
+    while stack:
+        current, dirpath = stack.pop()
+        entry = scan.get(dirpath)
+        if entry is None:
+            # 无法访问的文件夹保持原样
+            continue
+        mtime, subdirs, files = entry
+        children = _mirror_children(data, current)
+        if subdirs is None:
+            stats['dirs_unchanged'] += 1
+            stack.extend((child, path) for path, child in children.items())
+            continue
+
+        # 文件
+        existing = {}
+        for item_id in data['nodes'][current]['items']:
+            path = data['items'][item_id]['path']
+            if path and os.path.dirname(path) == dirpath:
+                existing[path] = item_id
+        paths = [os.path.join(dirpath, name) for name in files]
+        new_items = []
+        for name, path in zip(files, paths):
+            if path not in existing:
+                item_data = get_data_format('item')
+                item_data['name'] = name
+                item_data['path'] = path
+                new_items.append(item_data)
+        if new_items:
+            data.add_items(new_items, current)
+            stats['items_added'] += len(new_items)
+        paths = set(paths)
+        for path, item_id in existing.items():
+            if path not in paths:
+                removed_items.append(item_id)
+
+        # 子文件夹
+        subdir_paths = set()
+        for name in subdirs:
+            path = os.path.join(dirpath, name)
+            subdir_paths.add(path)
+            child = children.get(path)
+            if child is None:
+                child = data.add_node(name, current)
+                data.update_node(
+                    child, {'mirror': {'path': path, 'mtime': None}})
+                stats['nodes_added'] += 1
+            stack.append((child, path))
+        for path, child in children.items():
+            if path not in subdir_paths:
+                data.remove_node(child)
+                stats['nodes_removed'] += 1
+        data.update_node(
+            current, {'mirror': {'path': dirpath, 'mtime': mtime}})
+
+    if removed_items:
+        data.remove_items(removed_items)
+        stats['items_removed'] = len(removed_items)
+    return stats
+
+
+def describe_stats(stats):
+    return (
+        f'新增 {stats["nodes_added"]} 个节点、{stats["items_added"]} 项，'
+        f'删除 {stats["nodes_removed"]} 个节点、{stats["items_removed"]} 项，'
+        f'{stats["dirs_unchanged"]} 个文件夹没有变化'
+    )
@@ -0,0 +1,85 @@
+"""
+把拖进来的文件分批添加到数据中。
+
+一次拖进几千个文件时，如果在一个槽函数里面全部处理完，界面会卡住。
+这里每次只处理一批，批与批之间把控制权交还给事件循环，界面可以刷新
+进度，也可以中途取消。
+"""
+from PySide6.QtCore import QObject, QTimer, Signal
+
+from .handle_data import path_to_item
+
+
+class DropPipeline(QObject):
+
+    """
+    urls: QUrl 列表，全部添加到 node_id 节点。
+
+    每一批通过 DataStorage.add_items 一次写入，然后发出 chunkAdded，
+    由界面把这一批追加到列表中。取消时已经添加的项会被删除，数据恢复到
+    拖入之前的样子。添加期间节点被删除时，当作取消结束。
+    """
+
+    CHUNK_SIZE = 500
+
+    # 这一批新增的 item id
+    chunkAdded = Signal(list)
+    # 已处理数量, 总数
+    progressed = Signal(int, int)
+    # 全部新增的 item id, 是否被取消
+    finished = Signal(list, bool)
+
+    def __init__(self, data, urls, node_id, parent=None):
+        super().__init__(parent)
+        self.data = data
+        self.urls = urls
+        self.node_id = node_id
+        self.position = 0
+        self.item_ids = []
+        self.cancelled = False
+        self.done = False
+
+    def start(self):
+        QTimer.singleShot(0, self._tick)
+
+    def run(self):
+        """不经过事件循环，直接全部处理完，用于数量很少的情况。
+        """
+        while not self.done:
+            self._step()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _tick(self):
+        self._step()
+        if not self.done:
+            QTimer.singleShot(0, self._tick)
+
+    def _step(self):
+        if self.done:
+            return
+        if self.node_id not in self.data['nodes']:
+            # 节点连同已经添加的项一起被删除了
+            self.cancelled = True
+        if self.cancelled:
+            items = self.data['items']
+            self.data.remove_items(
+                [item_id for item_id in self.item_ids if item_id in items])
+            self._finish()
+            return
+        chunk = self.urls[self.position:self.position + self.CHUNK_SIZE]
+        self.position += len(chunk)
+        item_ids = self.data.add_items(
+            [path_to_item(url.toLocalFile()) for url in chunk],
+            self.node_id
+        )
+        self.item_ids.extend(item_ids)
+        self.chunkAdded.emit(item_ids)
+        self.progressed.emit(self.position, len(self.urls))
+        if self.position >= len(self.urls):
+            self._finish()
+
+    def _finish(self):
+        self.done = True
+        self.finished.emit(self.item_ids, self.cancelled)
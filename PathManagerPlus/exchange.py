@@ -0,0 +1,310 @@
+"""
+以 CSV、JSONL 和 Markdown 表格导出、导入项。
+
+导出时一次只生成一条记录、写一行，不会像 to_json 那样先在内存中生成
+整个文件；可以只导出一棵子树，或者一次搜索的结果。每条记录带有所在
+节点的路径(从第一层节点开始的名称列表)，导入时按路径找到或者新建节点，
+所以导出再导入可以重建整棵树。没有项的节点单独占一条只有节点路径的
+记录，空节点和节点的顺序也能保留下来。
+
+导入时一边读一边按节点分批交给 DataStorage.add_items，文件中的记录
+不会全部读到内存中。
+
+CSV 和 Markdown 中节点路径用“ / ”连接，和界面上显示的一样，因此名称
+中本身带有“ / ”的节点导入时会被拆开；JSONL 中是列表，没有这个问题。
+"""
+import os
+import csv
+import json
+
+from .handle_data import get_data_format
+
+
+class ExchangeError(Exception):
+
+    """导入的文件格式不对。
+    """
+
+
+FORMATS = ('csv', 'jsonl', 'md')
+EXTENSIONS = {
+    '.csv': 'csv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.md': 'md',
+    '.markdown': 'md',
+}
+COLUMNS = ('node', 'name', 'path', 'comment')
+# Markdown 表头，导入时按位置读取，不检查表头的文字
+MD_HEADER = ('节点', '名称', '路径', '备注')
+SEPARATOR = ' / '
+
+
+def guess_format(file_path):
+    """根据扩展名判断格式，不认识时返回 None。
+    """
+    return EXTENSIONS.get(os.path.splitext(file_path)[1].lower())
+
+
+def iter_records(data, node_id='root', item_ids=None):
+    """
+    按层次顺序生成 node_id 这棵子树中的记录；给出 item_ids(比如搜索
+    结果)时只生成这些项，不生成空节点的记录。
+
+    记录是 {'node': [节点名称, ...], 'name', 'path', 'comment', ...}，
+    项的其他字段也会带上。空节点的记录只有 node。
+    """
+    nodes = data['nodes']
+    breadcrumbs = {'root': ()}
+
+    def breadcrumb(node_id):
+        chain = []
+        current = node_id
+        while current not in breadcrumbs:
+            chain.append(current)
+            current = nodes[current]['parent_id']
+        names = breadcrumbs[current]
+        for current in reversed(chain):
+            names = names + (nodes[current]['name'] or '',)
+            breadcrumbs[current] = names
+        return names
+
+    def item_record(item_id):
+        item = data['items'][item_id]
+        record = {'node': list(breadcrumb(item['parent_id']))}
+        record.update(item)
+        del record['parent_id']
+        record.setdefault('comment', None)
+        return record
+
+    if item_ids is not None:
+        for item_id in item_ids:
+            yield item_record(item_id)
+        return
+    for current in data.iter_subtree(node_id):
+        item_ids = nodes[current]['items']
+        if not item_ids and current != 'root':
+            yield {'node': list(breadcrumb(current))}
+        for item_id in item_ids:
+            yield item_record(item_id)
+
+
+def is_node_record(record):
+    return not record.get('name') and not record.get('path')
+
+
+def _flat_fields(record):
+    """CSV 和 Markdown 的四列，空值写成空字符串。
+    """
+    return [SEPARATOR.join(record['node'])] + [
+        record.get(column) or '' for column in COLUMNS[1:]]
+
+
+def write_csv(records, fl):
+    """fl 需要用 newline='' 打开。返回写入的记录数。
+    """
+    writer = csv.writer(fl)
+    writer.writerow(COLUMNS)
+    count = 0
+    for record in records:
+        writer.writerow(_flat_fields(record))
+        count += 1
+    return count
+
+
+def write_jsonl(records, fl):
+    count = 0
+    for record in records:
+        fl.write(json.dumps(record, ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+def md_escape(text):
+    return text.replace('\\', '\\\\').replace('|', '\\|') \
+        .replace('\r\n', '\n').replace('\n', '<br>')
+
+
+def md_unescape(text):
+    result = []
+    chars = iter(text.replace('<br>', '\n'))
+    for char in chars:
+        if char == '\\':
+            char = next(chars, '\\')
+        result.append(char)
+    return ''.join(result)
+
+
+def write_markdown(records, fl):
+    fl.write('| ' + ' | '.join(MD_HEADER) + ' |\n')
+    fl.write('|' + ' --- |' * len(MD_HEADER) + '\n')
+    count = 0
+    for record in records:
+        fl.write('| ' + ' | '.join(
+            md_escape(value) for value in _flat_fields(record)) + ' |\n')
+        count += 1
+    return count
+
+
+WRITERS = {'csv': write_csv, 'jsonl': write_jsonl, 'md': write_markdown}
+
+
+def export(data, fl, fmt, node_id='root', item_ids=None):
+    """导出 node_id 这棵子树或者 item_ids 这些项，返回写入的记录数。
+    """
+    return WRITERS[fmt](iter_records(data, node_id, item_ids), fl)
+
+
+def _flat_record(fields, line_number):
+    fields = list(fields) + [''] * (len(COLUMNS) - len(fields))
+    node, name, path, comment = fields[:len(COLUMNS)]
+    node = [name.strip() for name in node.split(SEPARATOR)] \
+        if node.strip() else []
+    return {'node': node, 'name': name or None, 'path': path or None,
+            'comment': comment or None, 'line': line_number}
+
+
+def read_csv(fl):
+    """
+    生成记录，记录中的 line 是所在的行号，用于报告错误。第一行是表头，
+    列的顺序按表头，没有表头时按 node、name、path、comment。
+    """
+    reader = csv.reader(fl)
+    order = None
+    for fields in reader:
+        if order is None:
+            order = [COLUMNS.index(column) if column in COLUMNS else None
+                     for column in fields]
+            if any(index is not None for index in order):
+                continue
+            order = list(range(len(COLUMNS)))
+        values = [''] * len(COLUMNS)
+        for index, value in zip(order, fields):
+            if index is not None:
+                values[index] = value
+        yield _flat_record(values, reader.line_num)
+
+
+def read_jsonl(fl):
+    for line_number, line in enumerate(fl, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ExchangeError(f'第 {line_number} 行不是 JSON：{e}')
+        if not isinstance(record, dict):
+            raise ExchangeError(f'第 {line_number} 行不是 JSON 对象')
+        node = record.get('node') or []
+        if isinstance(node, str):
+            node = [name.strip() for name in node.split(SEPARATOR)]
+        if not isinstance(node, list):
+            raise ExchangeError(f'第 {line_number} 行的 node 不是列表')
+        record['node'] = [str(name) for name in node]
+        record['line'] = line_number
+        yield record
+
+
+def _md_cells(line):
+    """拆分表格的一行，“\\|” 不是分隔符。
+    """
+    line = line.strip()
+    if line.startswith('|'):
+        line = line[1:]
+    cells = []
+    current = []
+    chars = iter(line)
+    for char in chars:
+        if char == '\\':
+            current.append(char + next(chars, ''))
+        elif char == '|':
+            cells.append(''.join(current))
+            current = []
+        else:
+            current.append(char)
+    if ''.join(current).strip():
+        cells.append(''.join(current))
+    return [md_unescape(cell.strip()) for cell in cells]
+
+
+def read_markdown(fl):
+    """读取 write_markdown 写出的表格，表格以外的行跳过。
+    """
+    header = False
+    for line_number, line in enumerate(fl, 1):
+        if not line.lstrip().startswith('|'):
+            header = False
+            continue
+        cells = _md_cells(line)
+        if not header:
+            # 每个表格的第一行是表头，第二行是分隔行
+            header = True
+            continue
+        if all(set(cell) <= set('-: ') for cell in cells):
+            continue
+        yield _flat_record(cells, line_number)
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl, 'md': read_markdown}
+
+
+def import_records(data, records, parent_id='root', batch_size=1000):
+    """
+    把记录添加到 parent_id 下面，节点路径相对于 parent_id，同名的节点
+    直接使用，不存在时新建。连续的属于同一节点的项攒成一批添加。
+    返回 (添加的项数, 新建的节点数)。
+    """
+    nodes = data['nodes']
+    resolved = {(): parent_id}
+    created = 0
+    added = 0
+    batch = []
+    batch_node = None
+
+    def resolve(breadcrumb):
+        nonlocal created
+        node_id = resolved.get(breadcrumb)
+        if node_id is not None:
+            return node_id
+        parent = resolve(breadcrumb[:-1])
+        name = breadcrumb[-1]
+        for sub_node_id in nodes[parent]['sub_nodes']:
+            if nodes[sub_node_id]['name'] == name:
+                node_id = sub_node_id
+                break
+        else:
+            node_id = data.add_node(name, parent)
+            created += 1
+        resolved[breadcrumb] = node_id
+        return node_id
+
+    def flush():
+        nonlocal added
+        if batch:
+            data.add_items(batch, batch_node)
+            added += len(batch)
+            batch.clear()
+
+    for number, record in enumerate(records, 1):
+        line = record.get('line', number)
+        node_id = resolve(tuple(name for name in record['node'] if name))
+        if is_node_record(record):
+            continue
+        if node_id == 'root':
+            raise ExchangeError(f'第 {line} 行没有节点，不能添加到根节点')
+        item = get_data_format('item')
+        for key, value in record.items():
+            if key not in ('node', 'line', 'id', 'parent_id'):
+                item[key] = value
+        item['name'] = item['name'] or os.path.basename(
+            os.path.normpath(item['path'])) or item['path']
+        if node_id != batch_node or len(batch) >= batch_size:
+            flush()
+            batch_node = node_id
+        batch.append(item)
+    flush()
+    return added, created
+
+
+def import_file(data, fl, fmt, parent_id='root', batch_size=1000):
+    return import_records(data, READERS[fmt](fl), parent_id, batch_size)
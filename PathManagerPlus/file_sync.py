@@ -0,0 +1,308 @@
+"""
+多个程序同时打开同一个数据文件时的保护。
+
+读写数据文件时先拿到旁边的 .lock 文件的锁(建议锁，只对同样使用这个锁
+的程序有效)，保证读-合并-写的过程不会被其他程序打断。
+
+每次读写后记录文件的修改时间、大小和内容的哈希值，保存前先比较，
+发现文件被其他程序改过时，不直接覆盖，而是按记录合并：
+以文件中的数据为基础，只把本程序修改过的节点和项(DataStorage.dirty)
+写上去，其他记录保留文件中的版本，所以不需要比较整个数据库。
+"""
+import os
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from .handle_data import copy_record
+from .storage_format import decode, iter_encode
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+
+class FileChangedError(Exception):
+
+    """数据文件在上次读写之后被其他程序修改过。
+    """
+
+
+class DataFile:
+
+    """
+    format: 保存时使用的格式，见 storage_format.FORMATS。读取时改成文件
+    实际的格式，保存时保持不变。
+    """
+
+    def __init__(self, path, format='json'):
+        self.path = path
+        self.format = format
+        self.lock_path = path + '.lock'
+        # (mtime, 大小) 和内容的哈希值，文件不存在时为 None
+        self.signature = None
+        self.digest = None
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._lock_file = None
+
+    @contextmanager
+    def lock(self):
+        """可以重入，同一个程序的多个线程之间也会互斥。
+        """
+        with self._thread_lock:
+            if self._depth == 0:
+                self._lock_file = open(self.lock_path, 'a+b')
+                if os.name == 'nt':
+                    self._lock_file.seek(0)
+                    msvcrt.locking(
+                        self._lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                else:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    if os.name == 'nt':
+                        self._lock_file.seek(0)
+                        msvcrt.locking(
+                            self._lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+                    else:
+                        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+                    self._lock_file.close()
+                    self._lock_file = None
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _remember(self, digest):
+        self.signature = self._stat()
+        self.digest = digest
+
+    def read(self):
+        with self.lock():
+            with open(self.path, 'rb')as fl:
+                content = fl.read()
+            self._remember(hashlib.sha1(content).hexdigest())
+        data, self.format = decode(content)
+        return data
+
+    def might_have_changed(self):
+        """只比较修改时间和大小，不加锁也不读取内容，很快。
+        """
+        return self._stat() != self.signature
+
+    def changed(self):
+        """
+        文件在上次读写之后是否被其他程序修改过。修改时间和大小相同时认为
+        没有修改；不同时再比较内容，只是修改时间变了不算。
+        """
+        with self.lock():
+            signature = self._stat()
+            if signature == self.signature:
+                return False
+            if signature is None or self.digest is None:
+                return True
+            with open(self.path, 'rb')as fl:
+                digest = hashlib.sha1(fl.read()).hexdigest()
+            if digest == self.digest:
+                self.signature = signature
+                return False
+            return True
+
+    def write(self, content, check=True):
+        """
+        content: bytes 或者生成 bytes 的迭代器。先写入临时文件，再替换
+        原来的文件，返回写入的字节数。
+        check 为 True 时，文件被其他程序修改过会抛出 FileChangedError。
+        """
+        if isinstance(content, bytes):
+            content = [content]
+        with self.lock():
+            if check and self.signature is not None and self.changed():
+                raise FileChangedError(self.path)
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, temp_path = tempfile.mkstemp(
+                prefix='.data-', suffix='.tmp', dir=directory)
+            digest = hashlib.sha1()
+            size = 0
+            try:
+                with os.fdopen(fd, 'wb')as fl:
+                    for chunk in content:
+                        fl.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+                os.replace(temp_path, self.path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            self._remember(digest.hexdigest())
+        return size
+
+    def write_data(self, data, check=True):
+        """按 self.format 编码数据并写入，一边编码一边写。
+        """
+        return self.write(iter_encode(data, self.format), check)
+
+
+def encode_data(data, fmt='json'):
+    return b''.join(iter_encode(data, fmt))
+
+
+def merge_data(local, disk):
+    """
+    local: DataStorage，本程序的数据
+    disk: 文件中的数据(其他程序保存的)
+
+    返回合并后的数据。同一条记录两边都改过时以本程序的为准；节点的
+    items 和 sub_nodes 两边的内容都保留，再按记录中的 parent_id 过滤。
+    本程序新加的项挂在被其他程序删除的节点上时，把节点以及它被删除的
+    上级节点恢复回来；其他程序移到本程序删除的节点下面的记录，放回本
+    程序中的位置。
+    """
+    nodes = dict(disk['nodes'])
+    items = dict(disk['items'])
+    dirty_nodes = local.dirty['nodes']
+    dirty_items = local.dirty['items']
+    # 需要重新整理 items 和 sub_nodes 的节点
+    touched = set()
+    # 被删除的节点下面留下来的记录，最后放到别的节点下面
+    orphans = {'nodes': [], 'items': []}
+
+    def drop_node(node_id):
+        # 本程序删除的节点，其他程序在下面新加的内容也一起删除。
+        # 删除前移到别处的内容本程序还有，不能删
+        stack = [node_id]
+        while stack:
+            current = stack.pop()
+            node = nodes.pop(current, None)
+            if node is None:
+                continue
+            for item_id in node['items']:
+                if item_id in local['items']:
+                    orphans['items'].append(item_id)
+                else:
+                    items.pop(item_id, None)
+            for sub_node_id in node['sub_nodes']:
+                if sub_node_id in local['nodes']:
+                    orphans['nodes'].append(sub_node_id)
+                else:
+                    stack.append(sub_node_id)
+
+    for node_id in dirty_nodes:
+        if node_id not in local['nodes']:
+            drop_node(node_id)
+    for node_id in dirty_nodes:
+        node = local['nodes'].get(node_id)
+        if node is None:
+            continue
+        old = nodes.get(node_id)
+        nodes[node_id] = copy_record(node)
+        touched.add(node_id)
+        touched.add(node['parent_id'])
+        if old is not None:
+            touched.add(old['parent_id'])
+            # 两边的列表合并，本程序的顺序在前
+            for key in ('items', 'sub_nodes'):
+                current = set(node[key])
+                extra = [x for x in old[key] if x not in current]
+                nodes[node_id][key].extend(extra)
+    for item_id in dirty_items:
+        item = local['items'].get(item_id)
+        old = items.get(item_id)
+        if old is not None:
+            touched.add(old['parent_id'])
+        if item is None:
+            items.pop(item_id, None)
+            continue
+        items[item_id] = copy_record(item)
+        touched.add(item['parent_id'])
+
+    # 恢复被其他程序删除的上级节点
+    restored = []
+    for node_id in list(touched):
+        while node_id is not None and node_id not in nodes:
+            node = local['nodes'].get(node_id)
+            if node is None:
+                break
+            nodes[node_id] = copy_record(node)
+            restored.append(node_id)
+            touched.add(node_id)
+            node_id = node['parent_id']
+            touched.add(node_id)
+    touched.discard(None)
+
+    # 两边分别移动节点可能形成环，比如本程序把 A 移到 B 下面，而其他程序
+    # 把 B 移到了 A 下面，这时把本程序移动的节点放到第一层
+    for node_id in dirty_nodes:
+        seen = set()
+        current = node_id
+        while current is not None and current in nodes \
+                and current not in seen:
+            seen.add(current)
+            current = nodes[current]['parent_id']
+        if current is not None and current in seen:
+            touched.add(nodes[node_id]['parent_id'])
+            nodes[node_id]['parent_id'] = 'root'
+            touched.add('root')
+
+    # 其他程序移到某个节点下面的记录，这个节点被本程序删除了：放回本程序
+    # 中原来的位置。本程序中没有合适的位置时，节点放到第一层，项删除
+    reparented = {'nodes': [], 'items': []}
+    for table, records in (('nodes', nodes), ('items', items)):
+        for _id in orphans[table]:
+            record = records.get(_id)
+            if record is None or record['parent_id'] in nodes:
+                continue
+            parent_id = record['parent_id']
+            touched.add(parent_id)
+            own = local[table].get(_id)
+            if own is not None and own['parent_id'] in nodes:
+                parent_id = own['parent_id']
+            elif table == 'nodes':
+                parent_id = 'root'
+            else:
+                del items[_id]
+                continue
+            records[_id] = dict(record, parent_id=parent_id)
+            reparented[table].append(_id)
+            touched.add(parent_id)
+
+    # 按 parent_id 整理列表：去掉已经不属于这个节点的，补上缺少的
+    for node_id in touched:
+        node = nodes.get(node_id)
+        if node is None:
+            continue
+        node['items'] = [
+            x for x in dict.fromkeys(node['items'])
+            if x in items and items[x]['parent_id'] == node_id
+        ]
+        node['sub_nodes'] = [
+            x for x in dict.fromkeys(node['sub_nodes'])
+            if x in nodes and nodes[x]['parent_id'] == node_id
+        ]
+    for table, records, key in (
+            (list(dirty_items) + reparented['items'], items, 'items'),
+            (list(dirty_nodes) + restored + reparented['nodes'], nodes,
+             'sub_nodes')):
+        members = {}
+        for _id in table:
+            record = records.get(_id)
+            if record is None or record['parent_id'] not in nodes:
+                continue
+            parent_id = record['parent_id']
+            if parent_id not in members:
+                members[parent_id] = set(nodes[parent_id][key])
+            if _id not in members[parent_id]:
+                members[parent_id].add(_id)
+                nodes[parent_id][key].append(_id)
+    return {'nodes': nodes, 'items': items}
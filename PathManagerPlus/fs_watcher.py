@@ -0,0 +1,261 @@
+"""
+监视已收录的本地路径，目标被删除或者改名以后在界面上标记出来。
+
+不给每一项单独注册监视，而是监视项所在的文件夹，同一个文件夹里面的项
+共用一个注册。系统能够同时监视的数量是有限的(比如 Linux 的 inotify)，
+所以注册的文件夹数量有上限，最近打开过的节点中的项优先。
+文件夹的变化往往是一连串的，先收集起来，等一小段时间后一次性检查。
+
+安排监视的文件夹需要遍历所有的项，检查目标是否存在需要访问文件系统
+(网络路径可能很慢)，这两件事都作为 MAINTENANCE 优先级的后台任务运行，
+结果在主线程中应用。
+"""
+import os
+from collections import OrderedDict
+
+from PySide6.QtCore import QObject, QTimer, QFileSystemWatcher, Signal
+
+from .qt_scheduler import QtScheduler
+from .scheduler import DONE, MAINTENANCE
+from .search import get_path_scheme
+
+
+def item_directory(path):
+    """本地路径所在的文件夹，网址和网络路径不监视，返回 None。
+    """
+    if not path or get_path_scheme(path) != 'local':
+        return None
+    return os.path.dirname(os.path.normpath(path))
+
+
+def plan_directories(data, node_ids, limit):
+    """
+    返回 {文件夹: [(item_id, path), ...]}，最多 limit 个文件夹。
+    先收录 node_ids 中节点的项，再按顺序收录其他项，文件夹数量达到上限
+    以后就不再继续。
+    """
+    plan = OrderedDict()
+    seen = set()
+
+    def collect(item_ids):
+        for item_id in item_ids:
+            if item_id in seen:
+                continue
+            seen.add(item_id)
+            path = data['items'][item_id]['path']
+            directory = item_directory(path)
+            if directory is None:
+                continue
+            if directory not in plan:
+                if len(plan) >= limit:
+                    continue
+                plan[directory] = []
+            plan[directory].append((item_id, path))
+
+    for node_id in node_ids:
+        if node_id in data['nodes']:
+            collect(data['nodes'][node_id]['items'])
+    if len(plan) < limit:
+        collect(data['items'])
+    return plan
+
+
+def check_directories(plan, directories, task=None):
+    """
+    检查这些文件夹中的项，返回 {item_id: 目标是否存在}。
+    task: 作为后台任务运行时，被取消以后不再继续检查。
+    """
+    statuses = {}
+    for directory in directories:
+        if task is not None:
+            task.check()
+        for item_id, path in plan.get(directory, ()):
+            statuses[item_id] = os.path.exists(path)
+    return statuses
+
+
+class QtWatchBackend:
+
+    """
+    QFileSystemWatcher 的包装。换成其他实现(比如测试用的假实现)时，
+    只需要提供同样的 add、remove、watched 方法，并在文件夹变化时调用
+    callback(path)。
+    """
+
+    def __init__(self, callback):
+        self.watcher = QFileSystemWatcher()
+        self.watcher.directoryChanged.connect(callback)
+
+    def add(self, paths):
+        if paths:
+            self.watcher.addPaths(list(paths))
+
+    def remove(self, paths):
+        if paths:
+            self.watcher.removePaths(list(paths))
+
+    def watched(self):
+        return set(self.watcher.directories())
+
+
+class FileWatcher(QObject):
+
+    """
+    data: DataStorage
+
+    检查的结果写入 DataStorage.update_item_status，状态有变化的 item id
+    通过 statusChanged 发出。
+    scheduler: qt_scheduler.QtScheduler，没有给出时自己建一个。
+    """
+
+    # 文件夹变化后等待多久再检查(毫秒)
+    DELAY = 500
+    # 数据修改或者打开节点后，等待多久再重新安排监视的文件夹
+    REFRESH_DELAY = 1000
+    LIMIT = 2000
+    # 记录最近打开过的节点数量
+    RECENT = 50
+
+    statusChanged = Signal(list)
+
+    def __init__(self, data, limit=None, backend_class=QtWatchBackend,
+                 parent=None, scheduler=None):
+        super().__init__(parent)
+        self.data = data
+        self.limit = limit or self.LIMIT
+        self.backend = backend_class(self.directory_changed)
+        self.scheduler = scheduler or QtScheduler(1, parent=self)
+        self.recent = OrderedDict()
+        self.plan = OrderedDict()
+        self.pending = set()
+        # 还没有检查完的文件夹。新的检查会取代还在进行的检查，所以每次
+        # 都带上之前没有检查完的文件夹
+        self.unchecked = set()
+        # 上次安排时的 generation 和最近节点，都没变时不需要重新安排
+        self.planned_state = None
+        self.planning_state = None
+        # 正在进行的后台任务，只应用这两个任务的结果
+        self.refresh_task = None
+        self.check_task = None
+
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(self.DELAY)
+        self.flush_timer.timeout.connect(self.flush)
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(self.REFRESH_DELAY)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def touch_node(self, node_id):
+        """节点被打开，它的项优先监视。
+        """
+        self.recent.pop(node_id, None)
+        self.recent[node_id] = None
+        while len(self.recent) > self.RECENT:
+            self.recent.popitem(last=False)
+        self.schedule_refresh()
+
+    def schedule_refresh(self):
+        if not self.refresh_timer.isActive():
+            self.refresh_timer.start()
+
+    def refresh(self):
+        """
+        在后台重新安排监视的文件夹，完成后新加入或者内容有变化的文件夹
+        马上检查一次。
+        """
+        recent = list(reversed(self.recent))
+        state = (self.data.generation, recent)
+        if state in (self.planned_state, self.planning_state):
+            return
+        self.planning_state = state
+        snapshot = self.data.snapshot()
+        limit = self.limit
+
+        def plan(task):
+            with snapshot:
+                plan = plan_directories(snapshot, recent, limit)
+            task.check()
+            return plan, {
+                directory for directory in plan if os.path.isdir(directory)
+            }
+
+        # 新的安排取代还没有完成的安排
+        self.refresh_task = self.scheduler.submit(
+            plan, name='安排监视的文件夹', priority=MAINTENANCE,
+            key=(id(self), 'refresh'),
+            on_done=lambda task: self._on_planned(state, task)
+        )
+
+    def _on_planned(self, state, task):
+        if task is not self.refresh_task:
+            return
+        self.refresh_task = None
+        self.planning_state = None
+        if task.state != DONE:
+            return
+        self.planned_state = state
+        plan, directories = task.result
+        old_plan = self.plan
+        self.plan = plan
+        watched = self.backend.watched()
+        self.backend.remove(watched - set(plan))
+        self.backend.add([
+            directory for directory in plan
+            if directory not in watched and directory in directories
+        ])
+        self._check([
+            directory for directory, entries in plan.items()
+            if old_plan.get(directory) != entries
+        ])
+
+    def directory_changed(self, path):
+        self.pending.add(path)
+        # 从第一次变化开始计时，连续的变化不会一直推迟检查
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def flush(self):
+        directories = self.pending
+        self.pending = set()
+        self._check(directories)
+
+    def _check(self, directories):
+        self.unchecked.update(directories)
+        if not self.unchecked:
+            return
+        plan = self.plan
+        directories = set(self.unchecked)
+        self.check_task = self.scheduler.submit(
+            lambda task: check_directories(plan, directories, task),
+            name='检查收录的文件', priority=MAINTENANCE,
+            key=(id(self), 'check'),
+            on_done=lambda task: self._on_checked(directories, task)
+        )
+
+    def _on_checked(self, directories, task):
+        if task is not self.check_task:
+            return
+        self.check_task = None
+        if task.state != DONE:
+            return
+        self.unchecked -= directories
+        changed = self.data.update_item_status(task.result)
+        if changed:
+            self.statusChanged.emit(changed)
+
+    def stop(self):
+        self.flush_timer.stop()
+        self.refresh_timer.stop()
+        for task in (self.refresh_task, self.check_task):
+            if task is not None:
+                task.cancel()
+        self.refresh_task = None
+        self.check_task = None
+        self.backend.remove(self.backend.watched())
+        self.plan = OrderedDict()
+        self.pending = set()
+        self.unchecked = set()
+        self.planned_state = None
+        self.planning_state = None
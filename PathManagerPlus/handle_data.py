@@ -1,6 +1,14 @@
+import os
 import uuid
 import json
-from copy import deepcopy
+import weakref
+import threading
+
+from .search import SearchIndex, QueryPlan, QueryCache, parse_query
+from .pinyin import PinyinIndex, is_pinyin_query
+from .tree_index import EulerIntervals, NodeCounts, BreadcrumbCache
+from .snapshot import MISSING, Snapshot
+from .concurrency import RWLock, reads, writes
 
 
 def get_uuid():
@@ -28,6 +36,27 @@ def get_data_format(data_type):
         raise TypeError
 
 
+def copy_record(record):
+    """复制一条记录，列表和 dict 类型的值(节点的 items、sub_nodes)也复制。
+    """
+    record = dict(record)
+    for key, value in record.items():
+        if isinstance(value, (list, dict)):
+            record[key] = value.copy()
+    return record
+
+
+def path_to_item(path, name=None, comment=None):
+    """路径转成项的数据，没有给出名称时取路径最后一部分。
+    """
+    item_data = get_data_format('item')
+    item_data['name'] = name or os.path.basename(os.path.normpath(path)) \
+        or path
+    item_data['path'] = path
+    item_data['comment'] = comment
+    return item_data
+
+
 class JsonDb(dict):
 
     """A json storage with some functions.
@@ -92,6 +121,79 @@ class DataStorage(dict):
             self['nodes']['root'] = node
         else:
             super().__init__(data)
+        # 只有一个线程修改数据，修改时持有写锁；其他线程读取最新的数据时
+        # 持有读锁，见 concurrency.py
+        self.lock = RWLock()
+        # 多个读线程可能同时用到还没有建立的索引
+        self._build_lock = threading.Lock()
+        # 多个读线程可能同时拍快照，见 snapshot()
+        self._snapshot_lock = threading.Lock()
+        # 搜索索引不会被保存到文件中，第一次搜索时才建立。
+        self.search_index = SearchIndex()
+        self.node_pinyin = PinyinIndex()
+        # 节点的 enter/exit 编号，用于判断子孙关系，用到时才建立。
+        self.intervals = EulerIntervals()
+        self.counts = NodeCounts()
+        self.breadcrumbs = BreadcrumbCache()
+        # 每次修改数据 generation 都会加一。field_generations 记录每一类
+        # 数据最后一次被修改时的 generation：items 是项的增删改，tree 是
+        # 节点结构以及项所属的节点。缓存的查询结果据此判断是否过期。
+        self.generation = 0
+        self.field_generations = {'items': 0, 'tree': 0}
+        self.query_cache = QueryCache()
+        # 找不到目标的项，由文件监视更新，只在运行时使用
+        self.missing_items = set()
+        # 修改过但还没有保存的记录 {id: 最后修改时的 generation}，
+        # 记录被删除时 id 仍然保留。多个程序同时修改数据文件时，
+        # 只需要合并这些记录。
+        self.dirty = {'nodes': {}, 'items': {}}
+        # 还在使用的快照。有快照时修改记录采用写时复制，见 snapshot.py
+        self._snapshots = weakref.WeakSet()
+        # 拍最近一个快照以后新建或者复制过的记录，没有和快照共用，
+        # 可以直接修改
+        self._owned = {'nodes': set(), 'items': set()}
+
+    def _bump(self, *fields, nodes=(), items=()):
+        self.generation += 1
+        for field in fields:
+            self.field_generations[field] = self.generation
+        for node_id in nodes:
+            self.dirty['nodes'][node_id] = self.generation
+        for item_id in items:
+            self.dirty['items'][item_id] = self.generation
+
+    @writes
+    def clear_dirty(self, generation):
+        """generation 及之前的修改已经保存。
+        """
+        for table in self.dirty.values():
+            saved = [_id for _id, value in table.items() if value <= generation]
+            for _id in saved:
+                del table[_id]
+
+    def is_dirty(self):
+        return bool(self.dirty['nodes'] or self.dirty['items'])
+
+    @writes
+    def replace_data(self, data, keep_dirty=False):
+        """
+        用 data 替换全部数据，所有索引重新建立。keep_dirty 为 True 时保留
+        未保存的记录，比如 data 是合并了本程序修改的数据，之后仍然需要保存。
+        """
+        dirty = self.dirty
+        self.clear()
+        self.update(data)
+        self.search_index = SearchIndex()
+        self.node_pinyin = PinyinIndex()
+        self.intervals = EulerIntervals()
+        self.counts = NodeCounts()
+        self.breadcrumbs = BreadcrumbCache()
+        self.missing_items &= set(self['items'])
+        self.dirty = dirty if keep_dirty else {'nodes': {}, 'items': {}}
+        # 原来的表不会再被修改，已有的快照不受影响
+        self._snapshots = weakref.WeakSet()
+        self._owned = {'nodes': set(), 'items': set()}
+        self._bump('items', 'tree')
 
     @classmethod
     def from_json(cls, file):
@@ -103,7 +205,73 @@ class DataStorage(dict):
         with open(file, 'w', encoding='utf-8')as fl:
             json.dump(self, fl, indent=indent, ensure_ascii=False)
 
-    def add_item(self, item, parent_id='root'):
+    @reads
+    def snapshot(self):
+        """
+        返回数据的只读快照(snapshot.Snapshot)，是 O(1) 的，不复制记录。
+        之后对数据的修改不会影响快照，快照可以交给其他线程读取，不需要
+        加锁。不再使用时调用快照的 release()。
+        """
+        # 读锁排除了写线程，但是读线程之间不互斥，_snapshots 和 _owned
+        # 还需要单独的锁
+        with self._snapshot_lock:
+            snapshot = Snapshot(self)
+            self._snapshots.add(snapshot)
+            # 现在所有的记录都和这个快照共用
+            self._owned = {'nodes': set(), 'items': set()}
+        return snapshot
+
+    def _preserve(self, table, _id):
+        """
+        记录被替换、删除或者新建之前调用，把当前的版本交给还在使用的
+        快照。返回是否有这样的快照。
+        """
+        snapshots = []
+        for snapshot in list(self._snapshots):
+            if snapshot.released:
+                self._snapshots.discard(snapshot)
+            else:
+                snapshots.append(snapshot)
+        if snapshots:
+            old = self[table].get(_id, MISSING)
+            for snapshot in snapshots:
+                snapshot.preserve(table, _id, old)
+        return bool(snapshots)
+
+    def _writable(self, table, _id):
+        """
+        返回可以直接修改的记录。记录和快照共用时先复制一份替换掉，每个
+        快照之后每条记录只复制一次。
+        """
+        record = self[table][_id]
+        if self._snapshots and _id not in self._owned[table] \
+                and self._preserve(table, _id):
+            record = copy_record(record)
+            self[table][_id] = record
+            self._owned[table].add(_id)
+        return record
+
+    def _put(self, table, _id, record):
+        """新建记录。
+        """
+        if self._snapshots and self._preserve(table, _id):
+            self._owned[table].add(_id)
+        self[table][_id] = record
+
+    def _pop(self, table, _id):
+        if self._snapshots:
+            self._preserve(table, _id)
+        return self[table].pop(_id)
+
+    def _new_item_id(self):
+        while True:
+            item_id = get_uuid()
+            if item_id not in self['items']:
+                return item_id
+
+    def _insert_item(self, item, parent_id):
+        """写入一项数据，但不更新 parent 的 items 列表和计数。
+        """
         if isinstance(item, dict):
             pass
         elif isinstance(item, str):
@@ -112,27 +280,91 @@ class DataStorage(dict):
             item['name'] = name
         else:
             raise TypeError
-        while True:
-            item_id = get_uuid()
-            if item_id not in self['items']:
-                break
+        item_id = self._new_item_id()
         item['parent_id'] = parent_id
-        self['items'][item_id] = item
-        self['nodes'][parent_id]['items'].append(item_id)
+        self._put('items', item_id, item)
+        self.search_index.add(item_id, item)
+        return item_id
+
+    @writes
+    def add_item(self, item, parent_id='root'):
+        # 节点不存在时在写入任何记录之前报错
+        if parent_id not in self['nodes']:
+            raise KeyError(parent_id)
+        item_id = self._insert_item(item, parent_id)
+        self._writable('nodes', parent_id)['items'].append(item_id)
+        self.counts.items_changed(self['nodes'], {parent_id: 1})
+        self._bump('items', nodes=[parent_id], items=[item_id])
         return item_id
 
+    @writes
+    def add_items(self, items, parent_id='root'):
+        """
+        批量添加项到同一个节点，返回 id 列表。
+        items 里面的元素和 add_item 的参数一样，可以是 dict 或者名称。
+        节点不存在时抛出 KeyError，不会写入任何一项。
+        """
+        if parent_id not in self['nodes']:
+            raise KeyError(parent_id)
+        item_ids = [self._insert_item(item, parent_id) for item in items]
+        self._writable('nodes', parent_id)['items'].extend(item_ids)
+        self.counts.items_changed(self['nodes'], {parent_id: len(item_ids)})
+        self._bump('items', nodes=[parent_id], items=item_ids)
+        return item_ids
+
+    @writes
     def remove_item(self, item_id):
         parent_node = self['items'][item_id]['parent_id']
-        self['items'].pop(item_id)
-        self['nodes'][parent_node]['items'].remove(item_id)
-
+        item = self._pop('items', item_id)
+        self._writable('nodes', parent_node)['items'].remove(item_id)
+        self.search_index.remove(item_id, item)
+        self.missing_items.discard(item_id)
+        self.counts.items_changed(self['nodes'], {parent_node: -1})
+        self._bump('items', nodes=[parent_node], items=[item_id])
+
+    def _detach_items(self, item_ids):
+        """
+        把一批项从各自父节点的 items 列表中摘下来，每个父节点的列表只
+        重建一次。返回 {parent_id: 变化量}。
+        """
+        groups = {}
+        for item_id in item_ids:
+            parent_id = self['items'][item_id]['parent_id']
+            groups.setdefault(parent_id, set()).add(item_id)
+        for parent_id, ids in groups.items():
+            node = self._writable('nodes', parent_id)
+            node['items'] = [x for x in node['items'] if x not in ids]
+        return {parent_id: -len(ids) for parent_id, ids in groups.items()}
+
+    @writes
+    def remove_items(self, item_ids):
+        """批量删除项，项可以来自不同的节点。
+        """
+        deltas = self._detach_items(item_ids)
+        for item_id in item_ids:
+            item = self._pop('items', item_id)
+            self.search_index.remove(item_id, item)
+            self.missing_items.discard(item_id)
+        self.counts.items_changed(self['nodes'], deltas)
+        self._bump('items', nodes=deltas, items=item_ids)
+
+    @writes
     def update_item(self, item_id, update_data):
         for key in update_data.keys():
             if key not in ('name', 'path', 'comment'):
                 raise ValueError
+        item = self._writable('items', item_id)
+        old_item = dict(item)
         for key, value in update_data.items():
-            self['items'][item_id][key] = value
-
+            item[key] = value
+        self.search_index.update(item_id, old_item, item)
+        # 没有 path 的记录(比如只给了名称的项)也可以修改名称、备注
+        if item.get('path', old_item.get('path')) != old_item.get('path'):
+            # 路径变了，原来的状态不再适用
+            self.missing_items.discard(item_id)
+        self._bump('items', items=[item_id])
+
+    @writes
     def add_node(self, name, parent_id='root'):
         while True:
             node_id = get_uuid()
@@ -141,23 +373,60 @@ class DataStorage(dict):
         node = get_data_format('node')
         node['name'] = name
         node['parent_id'] = parent_id
-        self['nodes'][node_id] = node
-        self['nodes'][parent_id]['sub_nodes'].append(node_id)
+        self._put('nodes', node_id, node)
+        self._writable('nodes', parent_id)['sub_nodes'].append(node_id)
+        self.node_pinyin.set(node_id, name)
+        self.intervals.place(self['nodes'], node_id)
+        self.counts.add_node(node_id)
+        self._bump('tree', nodes=[node_id, parent_id])
         return node_id
 
+    @writes
+    def update_node(self, node_id, update_data):
+        """
+        修改节点的附加数据，比如导入文件夹时记录的 mirror。名称和树结构
+        需要通过专门的方法修改。
+        """
+        for key in update_data.keys():
+            if key in ('name', 'parent_id', 'items', 'sub_nodes'):
+                raise ValueError
+        self._writable('nodes', node_id).update(update_data)
+        self._bump(nodes=[node_id])
+
+    @writes
     def remove_node(self, node_id):
+        # 计数只需要在最上层的节点从父节点上摘下来时更新一次
+        self.counts.subtree_removed(self['nodes'], node_id)
+        node_ids = list(self.iter_subtree(node_id))
+        item_ids = [
+            item_id for _id in node_ids
+            for item_id in self['nodes'][_id]['items']
+        ]
+        node_ids.append(self['nodes'][node_id]['parent_id'])
+        self._remove_node(node_id)
+        self._bump('items', 'tree', nodes=node_ids, items=item_ids)
+
+    def _remove_node(self, node_id):
         # 需要递归删除，同时需要删除掉该节点上所附带的项
         node = self['nodes'][node_id]
         parent_id = node['parent_id']
-        sub_nodes = node['sub_nodes']
+        # 子节点删除时会修改 sub_nodes，需要遍历副本，否则会漏掉节点
+        sub_nodes = list(node['sub_nodes'])
         for sub_node in sub_nodes:
-            self.remove_node(sub_node)
+            self._remove_node(sub_node)
         if parent_id is not None:
-            self['nodes'][parent_id]['sub_nodes'].remove(node_id)
+            self._writable('nodes', parent_id)['sub_nodes'].remove(node_id)
         for item_id in node['items']:
-            self['items'].pop(item_id)
-        self['nodes'].pop(node_id)
-
+            item = self._pop('items', item_id)
+            self.search_index.remove(item_id, item)
+            self.missing_items.discard(item_id)
+        self._pop('nodes', node_id)
+        self.node_pinyin.discard(node_id)
+        self.intervals.discard(node_id)
+        self.counts.discard(node_id)
+        self.breadcrumbs.invalidate([node_id])
+
+    @writes
     def move_item_within_node(self, item_id, to_index):
         """
         item_id 在 node 的 items 列表里面是唯一的。
@@ -167,48 +436,88 @@ class DataStorage(dict):
         插入值之后的最终结果是在倒数第二个。这个需要特别注意。
         """
         node_id = self['items'][item_id]['parent_id']
-        self['nodes'][node_id]['items'].remove(item_id)
-        self['nodes'][node_id]['items'].insert(to_index, item_id)
+        items = self._writable('nodes', node_id)['items']
+        items.remove(item_id)
+        items.insert(to_index, item_id)
+        self._bump(nodes=[node_id])
 
     def move_item_to_first(self, item_id):
         self.move_item_within_node(item_id, 0)
 
+    @writes
     def move_item_to_last(self, item_id):
         node_id = self['items'][item_id]['parent_id']
-        self['nodes'][node_id]['items'].remove(item_id)
-        self['nodes'][node_id]['items'].append(item_id)
+        items = self._writable('nodes', node_id)['items']
+        items.remove(item_id)
+        items.append(item_id)
+        self._bump(nodes=[node_id])
 
+    @writes
     def move_item_to_node(self, item_id, node_id, to_index=None):
         """移动列表项到别的树节点上
         to_index 如果不设置值的话，就默认移动到末尾。
         """
         old_parent_id = self['items'][item_id]['parent_id']
-        self['items'][item_id]['parent_id'] = node_id
-        self['nodes'][old_parent_id]['items'].remove(item_id)
+        self._writable('items', item_id)['parent_id'] = node_id
+        self._writable('nodes', old_parent_id)['items'].remove(item_id)
+        items = self._writable('nodes', node_id)['items']
         if to_index is None:
-            self['nodes'][node_id]['items'].append(item_id)
+            items.append(item_id)
         else:
-            self['nodes'][node_id]['items'].insert(to_index, item_id)
-
+            items.insert(to_index, item_id)
+        if old_parent_id != node_id:
+            self.counts.items_changed(
+                self['nodes'], {old_parent_id: -1, node_id: 1})
+        self._bump('tree', nodes=[old_parent_id, node_id], items=[item_id])
+
+    @writes
+    def move_items_to_node(self, item_ids, node_id):
+        """批量移动项到 node_id 的末尾，项可以来自不同的节点。
+        """
+        item_ids = [
+            item_id for item_id in item_ids
+            if self['items'][item_id]['parent_id'] != node_id
+        ]
+        deltas = self._detach_items(item_ids)
+        for item_id in item_ids:
+            self._writable('items', item_id)['parent_id'] = node_id
+        self._writable('nodes', node_id)['items'].extend(item_ids)
+        deltas[node_id] = deltas.get(node_id, 0) + len(item_ids)
+        self.counts.items_changed(self['nodes'], deltas)
+        self._bump('tree', nodes=deltas, items=item_ids)
+
+    @writes
     def change_node_name(self, node_id, name):
-        self['nodes'][node_id]['name'] = name
+        self._writable('nodes', node_id)['name'] = name
+        self.node_pinyin.set(node_id, name)
+        self.breadcrumbs.invalidate(self.iter_subtree(node_id))
+        self._bump(nodes=[node_id])
 
+    @writes
     def change_node_index(self, node_id, new_index):
         """
         Same parent_id, different index.
         """
         parent_id = self['nodes'][node_id]['parent_id']
-        self['nodes'][parent_id]['sub_nodes'].remove(node_id)
-        self['nodes'][parent_id]['sub_nodes'].insert(new_index, node_id)
+        sub_nodes = self._writable('nodes', parent_id)['sub_nodes']
+        sub_nodes.remove(node_id)
+        sub_nodes.insert(new_index, node_id)
+        self._bump(nodes=[parent_id])
 
+    @writes
     def change_node_parent(self, node_id, new_parent_id, new_index):
         """
         Different parent_id.
         """
         old_parent_id = self['nodes'][node_id]['parent_id']
-        self['nodes'][node_id]['parent_id'] = new_parent_id
-        self['nodes'][old_parent_id]['sub_nodes'].remove(node_id)
-        self['nodes'][new_parent_id]['sub_nodes'].insert(new_index, node_id)
+        self._writable('nodes', node_id)['parent_id'] = new_parent_id
+        self._writable('nodes', old_parent_id)['sub_nodes'].remove(node_id)
+        self._writable('nodes', new_parent_id)['sub_nodes'].insert(
+            new_index, node_id)
+        self.intervals.place(self['nodes'], node_id)
+        self.counts.subtree_moved(self['nodes'], node_id, old_parent_id)
+        self.breadcrumbs.invalidate(self.iter_subtree(node_id))
+        self._bump('tree', nodes=[node_id, old_parent_id, new_parent_id])
 
     def get_node_name(self, node_id):
         return self['nodes'][node_id]['name']
@@ -229,6 +538,7 @@ class DataStorage(dict):
         else:
             print(names)
 
+    @writes
     def sort_items_within_node(self, node_id, reverse=False):
         """
         给节点中的项进行排序，默认为升序。reverse 为 True 时则为降序。
@@ -240,11 +550,13 @@ class DataStorage(dict):
             key=lambda x: self['items'][x]['name'].upper(),
             reverse=reverse
         )
-        self['nodes'][node_id]['items'] = sorted_items
+        self._writable('nodes', node_id)['items'] = sorted_items
+        self._bump(nodes=[node_id])
 
     def pretty_print(self, indent=4):
         print(json.dumps(self, indent=indent, ensure_ascii=False))
 
+    @reads
     def check_data_integrity(self):
 
         # 需要检查
@@ -273,10 +585,12 @@ class DataStorage(dict):
                     return False
         return True
 
+    @writes
     def fix_data(self, json_file=None):
         # 如果给与了文件名，则会强制保存数据覆盖掉原始文件
         # 以父节点为准修复数据
-        copy_data = deepcopy(self)
+        # 遍历修复之前的快照，修复时只复制被修改的节点
+        copy_data = self.snapshot()
 
         for node_id, data in copy_data['nodes'].items():
             node_name = data['name']
@@ -286,7 +600,8 @@ class DataStorage(dict):
                 sub_node_data = copy_data['nodes'][sub_node_id]
                 sub_node_name = sub_node_data['name']
                 if sub_node_data['parent_id'] != node_id:
-                    self['nodes'][node_id]['sub_nodes'].remove(sub_node_id)
+                    self._writable('nodes', node_id)['sub_nodes'].remove(
+                        sub_node_id)
                     print(f'移除多余的字节点：[{node_name}]-[{sub_node_name}]')
 
             # 处理父节点没有正确链接字节点
@@ -295,18 +610,255 @@ class DataStorage(dict):
                 continue
             if parent_id not in copy_data['nodes']:
                 # 挂载的父节点不存在的类型
-                self['nodes'].pop(node_id)
+                self._pop('nodes', node_id)
                 print(f'挂载父节点不存在，删除掉节点：[{node_name}]')
                 continue
             parent_data = copy_data['nodes'][parent_id]
             parent_name = parent_data['name']
             if node_id not in parent_data['sub_nodes']:
-                self['nodes'][parent_id]['sub_nodes'].append(node_id)
+                self._writable('nodes', parent_id)['sub_nodes'].append(
+                    node_id)
                 print(f'给父节点添加缺失的字节点,[{parent_name}]+[{node_name}]')
-        del copy_data
+        copy_data.release()
+        # 树结构被直接修改过，相关索引需要重新建立
+        self.intervals = EulerIntervals()
+        self.node_pinyin = PinyinIndex()
+        self.counts = NodeCounts()
+        self.breadcrumbs = BreadcrumbCache()
+        # 修复涉及的记录不好逐一列出，全部当作修改过
+        self._bump('items', 'tree', nodes=self['nodes'], items=self['items'])
         if json_file is not None:
             self.to_json(json_file)
 
+    @reads
+    def build_indexes(self):
+        """
+        提前建立所有用到时才建立的索引，可以在后台线程中调用(建立完
+        再交给界面)，之后第一次搜索、筛选也很快。
+        """
+        for name in ('search_index', 'intervals', 'counts', 'node_pinyin'):
+            self._index(name)
+        self.search_index.build_vocabularies()
+
+    def _index(self, name):
+        """
+        返回名为 name 的索引，还没有建立的话先建立。索引在新的对象中建立
+        好以后再替换掉原来的，其他读线程不会用到建立了一半的索引。
+        """
+        index = getattr(self, name)
+        if index.built:
+            return index
+        with self._build_lock:
+            index = getattr(self, name)
+            if index.built:
+                return index
+            index = type(index)()
+            if name == 'search_index':
+                index.build(self['items'])
+            elif name == 'node_pinyin':
+                index.build(
+                    (_id, node['name']) for _id, node in self['nodes'].items()
+                )
+            else:
+                index.build(self['nodes'])
+            setattr(self, name, index)
+            return index
+
+    @reads
+    def is_node_under(self, node_id, ancestor_id):
+        """node_id 是 ancestor_id 本身或者它的子孙节点时返回 True。
+        """
+        return self._index('intervals').contains(ancestor_id, node_id)
+
+    @reads
+    def is_item_under(self, item_id, node_id):
+        """项是否挂在 node_id 或者它的子孙节点上。
+        """
+        parent_id = self['items'][item_id]['parent_id']
+        return self.is_node_under(parent_id, node_id)
+
+    @reads
+    def plan_query(self, query, use_index=True, scope=None):
+        """
+        解析查询语句并生成查询计划，语法见 search.py。
+        use_index 为 False 时不建立索引，直接全表扫描，适合只查询一次的场景。
+        scope 为节点 id 时，只在该节点及其子节点中查找。
+        """
+        if use_index:
+            self._index('search_index')
+        within = label = None
+        if scope is not None:
+            contains = self._index('intervals').contains
+            items = self['items']
+
+            def within(item_id):
+                return contains(scope, items[item_id]['parent_id'])
+            label = f'{self.get_node_path(scope)} 及子节点'
+        plan = QueryPlan(
+            parse_query(query),
+            self['items'],
+            self.search_index,
+            within,
+            label
+        )
+        # 规范化后的查询语句作为缓存的 key，大小写和写法不同但含义相同的
+        # 查询可以共用结果
+        plan.cache_key = (' '.join(str(term) for term in plan.terms), scope)
+        return plan
+
+    @reads
+    def execute_plan(self, plan):
+        """
+        执行查询计划。结果按 generation 缓存，之后没有发生相关修改的话，
+        相同的查询直接返回缓存的结果。
+        """
+        if not plan.terms:
+            return []
+        # 限定范围的查询还和节点结构有关
+        fields = ('items', 'tree') if plan.cache_key[1] else ('items',)
+        generations = self.field_generations
+
+        def is_fresh(generation):
+            return all(generations[field] <= generation for field in fields)
+
+        result = self.query_cache.get(plan.cache_key, is_fresh)
+        if result is not None:
+            plan.cached = True
+            plan.result_count = len(result)
+            return list(result)
+        result = plan.execute()
+        self.query_cache.put(plan.cache_key, self.generation, result)
+        return result
+
+    @reads
+    def search(self, query, use_index=True, scope=None):
+        plan = self.plan_query(query, use_index, scope)
+        return self.execute_plan(plan)
+
+    @reads
+    def explain_query(self, query, scope=None):
+        plan = self.plan_query(query, scope=scope)
+        self.execute_plan(plan)
+        return plan.explain()
+
+    @reads
+    def match_node_name(self, node_id, text):
+        """
+        节点名称是否包含 text，不区分大小写。text 是纯字母时也匹配名称的
+        拼音全拼和首字母，比如 cg 可以匹配“常规”。
+        """
+        text = text.lower()
+        name = self['nodes'][node_id]['name'] or ''
+        if text in name.lower():
+            return True
+        if not is_pinyin_query(text):
+            return False
+        return self._index('node_pinyin').match(node_id, text)
+
+    @reads
+    def filter_nodes(self, text):
+        """
+        返回名称匹配 text 的节点以及它们所有祖先节点的 id，用于过滤树。
+
+        按层次顺序倒过来遍历一次，子节点总是先于父节点处理，匹配的节点
+        或者已经可见的节点把父节点标记为可见，不需要每个节点单独往上找。
+        """
+        visible = set()
+        order = list(self.iter_subtree('root'))
+        for node_id in reversed(order):
+            if node_id not in visible and node_id != 'root' \
+                    and not self.match_node_name(node_id, text):
+                continue
+            visible.add(node_id)
+            parent_id = self['nodes'][node_id]['parent_id']
+            if parent_id is not None:
+                visible.add(parent_id)
+        return visible
+
+    @writes
+    def update_item_status(self, statuses):
+        """
+        statuses: {item_id: 目标是否存在}，返回状态有变化的 item id 列表。
+        """
+        changed = []
+        for item_id, exists in statuses.items():
+            if item_id not in self['items']:
+                continue
+            if exists == (item_id in self.missing_items):
+                changed.append(item_id)
+                if exists:
+                    self.missing_items.discard(item_id)
+                else:
+                    self.missing_items.add(item_id)
+        return changed
+
+    @writes
+    def clear_item_status(self):
+        changed = list(self.missing_items)
+        self.missing_items = set()
+        return changed
+
+    def is_item_missing(self, item_id):
+        return item_id in self.missing_items
+
+    @reads
+    def get_item_counts(self, node_id):
+        """
+        返回 (直接挂载的项数, 包括子节点在内的项数)，不需要遍历子节点。
+        """
+        return self._index('counts').get(node_id)
+
+    @reads
+    def get_node_path(self, node_id):
+        """节点的完整路径，比如“常规 / 程序 / 工具”，结果会被缓存。
+        """
+        return self.breadcrumbs.get(self['nodes'], node_id)
+
+    @reads
+    def get_item_node_path(self, item_id):
+        return self.get_node_path(self['items'][item_id]['parent_id'])
+
+    @reads
+    def find_node(self, spec):
+        """
+        spec 为节点 id，或者用 / 分隔的名称路径(比如“常规/程序”)，空的
+        spec 表示根节点。找不到时返回 None。
+        """
+        if not spec:
+            return 'root'
+        if spec in self['nodes']:
+            return spec
+        node_id = 'root'
+        for name in spec.strip('/').split('/'):
+            name = name.strip()
+            for sub_node_id in self['nodes'][node_id]['sub_nodes']:
+                if self['nodes'][sub_node_id]['name'] == name:
+                    node_id = sub_node_id
+                    break
+            else:
+                return None
+        return node_id
+
+    @reads
+    def describe_item(self, item_id):
+        """项的数据加上 id 和所在节点的路径，用于输出给命令行和其他程序。
+        """
+        record = dict(self['items'][item_id], id=item_id)
+        record.setdefault('comment', None)
+        record['node'] = self.get_item_node_path(item_id)
+        return record
+
+    @reads
+    def iter_subtree(self, node_id):
+        """
+        按层次顺序返回 node_id 及其所有子孙节点的 id。在读锁中先取得完整
+        的列表，遍历期间数据被修改也不受影响。
+        """
+        order = [node_id]
+        for current in order:
+            order.extend(self['nodes'][current]['sub_nodes'])
+        return iter(order)
+
     def node_count(self):
         return len(self['nodes'])
 
@@ -0,0 +1,67 @@
+"""
+已经打开的窗口接收其他启动请求的一端，客户端见 single_instance。
+"""
+from PySide6.QtCore import QObject, Signal
+from PySide6.QtNetwork import QLocalServer
+
+from .single_instance import decode_request, is_running
+
+
+class InstanceServer(QObject):
+
+    """
+    收到一个完整的请求后发出 requestReceived(dict)，路径已经转换成
+    绝对路径。
+    """
+
+    requestReceived = Signal(dict)
+    # 一个请求最多这么长，超过时断开连接
+    MAX_REQUEST = 1 << 20
+
+    def __init__(self, name, parent=None):
+        super().__init__(parent)
+        self.name = name
+        self.server = QLocalServer(self)
+        # 只允许同一个用户连接
+        self.server.setSocketOptions(QLocalServer.UserAccessOption)
+        self.server.newConnection.connect(self._new_connection)
+
+    def listen(self):
+        """
+        开始监听，已经有其他窗口在监听时返回 False。上次异常退出留下的
+        套接字连接不上，删除以后重新监听。
+        """
+        # 设置了 UserAccessOption 时，Unix 上的 listen 会直接替换掉已有的
+        # 套接字，不会报告地址被占用，所以先自己检查
+        if is_running(self.name):
+            return False
+        QLocalServer.removeServer(self.name)
+        return self.server.listen(self.name)
+
+    def close(self):
+        self.server.close()
+
+    def _new_connection(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            buffer = bytearray()
+            socket.readyRead.connect(
+                lambda socket=socket, buffer=buffer:
+                    self._read(socket, buffer)
+            )
+            socket.disconnected.connect(socket.deleteLater)
+
+    def _read(self, socket, buffer):
+        buffer += bytes(socket.readAll())
+        if len(buffer) > self.MAX_REQUEST:
+            socket.abort()
+            return
+        if b'\n' not in buffer:
+            return
+        line = bytes(buffer).split(b'\n', 1)[0]
+        request = decode_request(line)
+        socket.write(b'ok\n' if request is not None else b'error\n')
+        socket.flush()
+        socket.disconnectFromServer()
+        if request is not None:
+            self.requestReceived.emit(request)
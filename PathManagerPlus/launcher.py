@@ -0,0 +1,225 @@
+"""
+打开文件、文件夹、终端等外部程序的队列。
+
+以前一次最多只能打开 5 项，而且每项都在主线程中直接启动。现在启动请求
+先放进队列，由定时器一项一项取出来启动：同时处于启动阶段的进程数量有
+上限，启动的速度也有限制(令牌桶)，一次选中几十项打开时不会同时冒出
+几十个进程，界面也不会卡住。
+启动以后的子进程由定时器轮询回收，不会留下僵尸进程。启动失败或者在
+刚启动的一段时间内以非 0 状态退出的(比如 xdg-open 找不到打开方式)，
+通过 failed 信号报告，由界面显示在状态栏中，不弹出对话框。
+"""
+import time
+import subprocess
+from collections import deque
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+
+class LaunchError(Exception):
+
+    """启动前就知道无法打开，消息直接显示给用户。
+    """
+
+
+class TokenBucket:
+
+    """
+    每秒补充 rate 个令牌，最多存 burst 个。时间由调用方传入，方便测试。
+    """
+
+    # 浮点误差，等待 wait_time 以后一定能拿到令牌
+    EPSILON = 1e-9
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = None
+
+    def _refill(self, now):
+        if self.updated is not None:
+            self.tokens = min(
+                self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now):
+        self._refill(now)
+        if self.tokens >= 1 - self.EPSILON:
+            self.tokens = max(0.0, self.tokens - 1)
+            return True
+        return False
+
+    def wait_time(self, now):
+        """还要等多久才有一个令牌。
+        """
+        self._refill(now)
+        if self.tokens >= 1 - self.EPSILON:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class LaunchQueue:
+
+    """
+    启动请求的队列，和 Qt 无关，时间由调用方传入。
+
+    submit(label, func, *args) 提交一个请求，func 在 pump 中被调用，
+    可以返回 subprocess.Popen(会被跟踪和回收)、False(表示失败)或者
+    其他值(表示已经完成)。抛出 LaunchError 或者 OSError 表示失败。
+    pump(now) 启动能够启动的请求，回收已经退出的进程，返回这一次发现
+    的失败 [(label, 消息), ...]。
+    """
+
+    MAX_STARTING = 4
+    RATE = 10.0
+    BURST = 5
+    # 启动后这么长时间内退出且状态不是 0 的算作失败，超过以后不再占用
+    # 启动的名额，只等待回收
+    SETTLE = 3.0
+
+    def __init__(self, max_starting=None, rate=None, burst=None, settle=None):
+        self.max_starting = max_starting or self.MAX_STARTING
+        self.bucket = TokenBucket(rate or self.RATE, burst or self.BURST)
+        self.settle = settle or self.SETTLE
+        self.pending = deque()
+        # [(label, process, 截止时间)]
+        self.starting = []
+        # 已经启动完成但还没有退出的进程
+        self.detached = []
+        # 当前这一批请求的数量和已经完成的数量
+        self.total = 0
+        self.done = 0
+        # 还没有报告的失败
+        self.failures = []
+
+    def submit(self, label, func, *args):
+        if self.idle():
+            self.total = self.done = 0
+        self.pending.append((label, func, args))
+        self.total += 1
+
+    def fail(self, label, message):
+        """记录一个在提交前就失败的请求，在下一次 pump 中和其他失败一起
+        报告。
+        """
+        if self.idle():
+            self.total = self.done = 0
+        self.total += 1
+        self.done += 1
+        self.failures.append((label, message))
+
+    def idle(self):
+        return not self.pending and not self.starting and not self.failures
+
+    def busy(self):
+        return not self.idle() or bool(self.detached)
+
+    def pump(self, now):
+        failures = self.failures
+        self.failures = []
+        self._reap(now, failures)
+        while self.pending and len(self.starting) < self.max_starting:
+            if not self.bucket.take(now):
+                break
+            label, func, args = self.pending.popleft()
+            self._start(now, label, func, args, failures)
+        return failures
+
+    def _start(self, now, label, func, args, failures):
+        try:
+            result = func(*args)
+        except LaunchError as e:
+            result = False
+            message = str(e)
+        except OSError as e:
+            result = False
+            # 通常是找不到打开文件的程序
+            message = e.strerror or str(e)
+            if e.filename:
+                message = f'{message}：{e.filename}'
+        else:
+            message = '无法打开'
+        if isinstance(result, subprocess.Popen):
+            self.starting.append((label, result, now + self.settle))
+            return
+        self.done += 1
+        if result is False:
+            failures.append((label, message))
+
+    def _reap(self, now, failures):
+        starting = []
+        for label, process, deadline in self.starting:
+            code = process.poll()
+            if code is None:
+                if now < deadline:
+                    starting.append((label, process, deadline))
+                    continue
+                self.detached.append(process)
+            elif code != 0:
+                failures.append((label, f'程序退出，状态是 {code}'))
+            self.done += 1
+        self.starting = starting
+        self.detached = [p for p in self.detached if p.poll() is None]
+
+    def next_delay(self, now):
+        """距离下一次需要 pump 的时间(秒)，没有需要做的事时返回 None。
+        """
+        if self.failures:
+            return 0.0
+        if self.pending and len(self.starting) < self.max_starting:
+            return self.bucket.wait_time(now)
+        if self.starting:
+            return 0.05
+        if self.detached:
+            return 1.0
+        return None
+
+
+class Launcher(QObject):
+
+    """
+    LaunchQueue 的界面版本，由 QTimer 驱动。
+
+    failed(label, 消息)：一项启动失败。
+    progress(已完成, 总数)：这一批请求的进度。
+    """
+
+    failed = Signal(str, str)
+    progress = Signal(int, int)
+
+    def __init__(self, queue=None, parent=None):
+        super().__init__(parent)
+        self.queue = queue or LaunchQueue()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self._pump)
+
+    def submit(self, label, func, *args):
+        self.queue.submit(label, func, *args)
+        self._schedule()
+
+    def fail(self, label, message):
+        self.queue.fail(label, message)
+        self._schedule()
+
+    def _schedule(self):
+        # 在当前事件处理结束后再启动，连续提交的请求算作同一批
+        if not self.timer.isActive() or self.timer.remainingTime() > 0:
+            self.timer.start(0)
+
+    def _pump(self):
+        now = time.monotonic()
+        done = self.queue.done
+        failures = self.queue.pump(now)
+        for label, message in failures:
+            self.failed.emit(label, message)
+        # 提交前就失败的请求已经算在 done 中了
+        if failures or self.queue.done != done:
+            self.progress.emit(self.queue.done, self.queue.total)
+        delay = self.queue.next_delay(time.monotonic())
+        if delay is not None:
+            self.timer.start(max(1, int(delay * 1000)))
+
+    def stop(self):
+        self.timer.stop()
@@ -2,9 +2,6 @@ import os
 import sys
 import webbrowser
 import subprocess
-import platform
-from pathlib import Path
-from copy import deepcopy
 
 from PySide6.QtGui import (
     QIcon,
@@ -25,35 +22,63 @@ from PySide6.QtWidgets import (
     QInputDialog,
     QDialog,
     QLineEdit,
-    QLabel
+    QLabel,
+    QHeaderView,
+    QProgressDialog
+)
+from PySide6.QtCore import (
+    Qt,
+    Signal,
+    QTimer,
+    QUrl,
+    QItemSelection,
+    QItemSelectionModel
 )
-from PySide6.QtCore import Qt, Signal, QTimer
 from .ui.main_window import Ui_MainWindow
-from .ui.config_form import Ui_ConfigForm
-from .ui.add_path_form import Ui_AddPathForm
 from .ui.custom_widgets import CustomLineEdit
 from .settings import *
 from .handle_data import (
-    gen_base_data,
     DataStorage,
     get_data_format,
     JsonDb
 )
+from .actions import system, system_actions, open_path
+from .drop_pipeline import DropPipeline
+from .data_loader import DataLoader
+from .qt_scheduler import QtScheduler
+from .scheduler import CANCELLED, FAILED, NORMAL
+from .fs_watcher import FileWatcher
+from .autosave import AutoSaver, AutosavePolicy, JsonWriter
+from .launcher import Launcher, LaunchQueue, LaunchError
+from .file_sync import DataFile, FileChangedError, merge_data
+from .single_instance import (
+    UnsafeSocketError,
+    server_name,
+    send_request,
+    encode_request,
+    decode_request
+)
+from .daemon import notify_reload
+from .startup_profile import profile
+from .watchdog import StallWatchdog
+from .dir_mirror import (
+    scan_directory,
+    mirror_state,
+    create_mirror_node,
+    apply_scan,
+    get_mirror_path,
+    describe_stats
+)
 
 
-system = platform.system()
-
+if system_actions is None:
+    raise SystemExit('不支持这个系统。')
 if system == "Windows":
-    from .actions import windows_actions as system_actions
     from .settings import WINDOWS_QSS_PATH as PROJECT_QSS
 elif system == "Linux":
-    from .actions import linux_actions as system_actions
     from .settings import LINUX_QSS_PATH as PROJECT_QSS
-elif system == "Darwin":
-    from .actions import mac_actions as system_actions
-    from .settings import MAC_QSS_PATH as PROJECT_QSS
 else:
-    raise SystemExit('不支持这个系统。')
+    from .settings import MAC_QSS_PATH as PROJECT_QSS
 
 if os.path.exists(CONFIG_FILE):
     config = JsonDb.from_json(CONFIG_FILE)
@@ -109,6 +134,8 @@ class ConfigForm(QDialog):
 
     def __init__(self, parent=None):
         super().__init__(parent)
+        # 对话框第一次打开时才导入，不影响启动时间
+        from .ui.config_form import Ui_ConfigForm
         self.ui = Ui_ConfigForm()
         self.ui.setupUi(self)
         self.setWindowFlags(
@@ -146,6 +173,10 @@ class ConfigForm(QDialog):
             self.ui.hideToolbar.setChecked(True)
         if self.config.get('hide_statusbar', False):
             self.ui.hideStatusBar.setChecked(True)
+        if self.config.get('watch_files', False):
+            self.ui.watchFiles.setChecked(True)
+        if self.config.get('autosave', False):
+            self.ui.autoSave.setChecked(True)
 
         self.ui.pushButton.clicked.connect(self.choose_editor)
         self.ui.pushButtonConfirm.clicked.connect(self.confirm)
@@ -155,6 +186,8 @@ class ConfigForm(QDialog):
         self.ui.expandTree.toggled.connect(self.handle_expand_tree)
         self.ui.hideToolbar.toggled.connect(self.handle_hide_toolbar)
         self.ui.hideStatusBar.toggled.connect(self.handle_hide_statusbar)
+        self.ui.watchFiles.toggled.connect(self.handle_watch_files)
+        self.ui.autoSave.toggled.connect(self.handle_autosave)
         self.ui.lineEditEditorName.textChanged.connect(self.change_name)
 
 
@@ -204,6 +237,14 @@ class ConfigForm(QDialog):
         self.config['hide_statusbar'] = checked
         self.has_edited = True
 
+    def handle_watch_files(self, checked):
+        self.config['watch_files'] = checked
+        self.has_edited = True
+
+    def handle_autosave(self, checked):
+        self.config['autosave'] = checked
+        self.has_edited = True
+
     def cancel(self):
         del self.config
         self.has_edited = False
@@ -221,6 +262,7 @@ class AddPathForm(QDialog):
 
     def __init__(self, parent=None):
         super().__init__(parent)
+        from .ui.add_path_form import Ui_AddPathForm
         self.ui = Ui_AddPathForm()
         self.ui.setupUi(self)
         self.setWindowFlags(
@@ -272,11 +314,16 @@ class AddPathForm(QDialog):
 
 class MainWindow(QMainWindow):
 
+    # 窗口第一次绘制完成后发出，不影响显示的初始化放在这之后
+    firstPainted = Signal()
+
     def __init__(self):
         super().__init__()
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
         self.ui.splitter.setSizes([200, 600])
+        self.painted = False
+        profile.mark('创建主窗口')
 
         self.BASE_WINDOW_TITLE = self.windowTitle()
         self.has_edited = False
@@ -288,39 +335,76 @@ class MainWindow(QMainWindow):
         self.ui.toolBar.addSeparator()
         self.ui.toolBar.addWidget(self.search_box)
         self.search_box.returnPressed.connect(self.handle_search)
+        # 勾选后只在当前节点及其子节点中搜索
+        self.scope_search_action = QAction('仅当前节点', self)
+        self.scope_search_action.setCheckable(True)
+        self.scope_search_action.setToolTip('只搜索当前选中的节点及其子节点')
+        self.ui.toolBar.addAction(self.scope_search_action)
+        # 最近一次点击的真实节点，搜索结果节点不算
+        self.current_node_id = None
+        # 按名称过滤左侧的树，输入停顿一下再过滤，避免每个按键都刷新
+        self.tree_filter_box = CustomLineEdit()
+        self.tree_filter_box.setPlaceholderText('筛选节点')
+        self.tree_filter_box.setMaximumWidth(150)
+        self.ui.toolBar.addSeparator()
+        self.ui.toolBar.addWidget(self.tree_filter_box)
+        self.tree_filter_timer = QTimer(self)
+        self.tree_filter_timer.setSingleShot(True)
+        self.tree_filter_timer.setInterval(150)
+        self.tree_filter_timer.timeout.connect(self.filter_tree)
+        self.tree_filter_box.textChanged.connect(self.tree_filter_timer.start)
+        self.tree_filter_box.escSignal.connect(self.tree_filter_box.clear)
 
         # set gui icon
-        if os.path.exists(PROJECT_ICON_PATH):
-            self.setWindowIcon(QIcon(PROJECT_ICON_PATH))
-        if os.path.exists(SAVE_ICON_PATH):
-            self.ui.saveAction.setIcon(QIcon(SAVE_ICON_PATH))
-        if os.path.exists(ADD_ICON_PATH):
-            self.ui.addAction.setIcon(QIcon(ADD_ICON_PATH))
-        if os.path.exists(DELETE_ICON_PATH):
-            self.ui.deleteAction.setIcon(QIcon(DELETE_ICON_PATH))
-        if os.path.exists(SETTINGS_ICON_PATH):
-            self.ui.configAction.setIcon(QIcon(SETTINGS_ICON_PATH))
+        # 文件不存在时 QIcon 是空的图标，不需要先检查
+        self.setWindowIcon(QIcon(PROJECT_ICON_PATH))
+        self.ui.saveAction.setIcon(QIcon(SAVE_ICON_PATH))
+        self.ui.addAction.setIcon(QIcon(ADD_ICON_PATH))
+        self.ui.deleteAction.setIcon(QIcon(DELETE_ICON_PATH))
+        self.ui.configAction.setIcon(QIcon(SETTINGS_ICON_PATH))
 
         # data init
-        if not os.path.exists(DATABASE):
-            self.data = gen_base_data()
-            self.data.to_json(DATABASE)
-        else:
-            self.data = DataStorage.from_json(DATABASE)
-            status = self.data.check_data_integrity()
-            if not status:
-                # 修复数据的同时，将修复完的数据保存到数据库。
-                self.data.fix_data(DATABASE)
+        # 数据文件的读写都经过 data_file，同时打开多个程序时不会互相覆盖
+        self.data_file = DataFile(DATABASE)
+        self.writer = JsonWriter(self.data_file)
+        # 载入、保存、扫描文件夹等后台任务都交给同一个调度器，见
+        # scheduler.py。分析启动时间时也输出每个任务的时间
+        self.scheduler = QtScheduler(
+            log=sys.stderr if profile.enabled else None, parent=self)
+        # 配置文件中设置了 stall_watchdog(毫秒)时，界面卡住超过这个时间
+        # 就把主线程的调用栈记录到 stalls.log，见 watchdog.py
+        self.watchdog = None
+        if config.get('stall_watchdog'):
+            self.watchdog = StallWatchdog(
+                config['stall_watchdog'] / 1000, STALL_LOG, parent=self)
+            self.watchdog.start()
+        # 数据在后台线程中载入(见 data_loader)，窗口先显示出来。载入完成
+        # 之前是一份空的数据，树和保存都不能用，搜索框可以输入。
+        self.data = DataStorage()
+        self.loading = True
+        # 载入期间拖进来的文件、其他程序转交的请求，载入完成后再处理
+        self.pending_actions = []
+        self.pending_search = False
+        # 载入任务被取消时为 True，见 handle_load_cancelled
+        self.load_cancelled = False
+        # 正在分批添加拖入文件的 DropPipeline
+        self.drop_pipeline = None
         self.build_tree()
+        self.ui.treeWidget.setEnabled(False)
+        self.loader = DataLoader(
+            self.data_file, self.writer, self, self.scheduler)
+        self.loader.topLevelReady.connect(self.show_loading_tree)
+        self.loader.loaded.connect(self.finish_loading)
+        self.loader.failed.connect(self.handle_load_failed)
+        self.loader.cancelled.connect(self.handle_load_cancelled)
 
         # add right click menu
         self.add_context_menu()
-        # 初始化右键弹出菜单
-        self.init_listwidget_context_menu()
-        self.init_treewidget_context_menu()
+        # 右键弹出菜单在第一次使用时创建
+        self.listwidget_menu = None
+        self.treewidget_menu = None
 
-        # 设置状态栏内容
-        node_count = self.data.node_count()
+        # 设置状态栏内容，数量在载入完成后由 update_statusbar_left 显示
         # 左侧状态
         self.label_left = QLabel()
         self.ui.statusBar.addWidget(self.label_left)
@@ -330,7 +414,7 @@ class MainWindow(QMainWindow):
         self.ui.statusBar.addWidget(self.label_center)
         # 这一行会导致无法最大化窗口？
         # self.label_center.setFixedWidth(400)
-        self.update_statusbar_left()
+        self.label_left.setText('正在载入数据...')
 
         # ----------------------- Slots -----------------------
 
@@ -365,10 +449,23 @@ class MainWindow(QMainWindow):
         self.ui.textEditComment.editingFinished.connect(
             self.change_comment_data)
         self.search_box.escSignal.connect(self.handle_esc_signal)
+        # 正在后台扫描的导入节点，同时只扫描一个
+        self.mirror_scan_node = None
+        # 监视收录的文件，找不到目标的项显示为灰色；空闲时自动保存。
+        # 都在数据载入完成后开始
+        self.file_watcher = None
+        self.autosaver = None
+        # 打开文件等外部程序的请求排队启动，失败时显示在状态栏中
+        self.launcher = Launcher(LaunchQueue(
+            config.get('launch_concurrency'), config.get('launch_rate')
+        ), self)
+        self.launcher.failed.connect(self.handle_launch_failed)
+        self.launcher.progress.connect(self.handle_launch_progress)
+        self.launch_failures = []
+        # 切换回本程序时检查数据文件是否被其他程序修改过
+        QApplication.instance().applicationStateChanged.connect(
+            self.handle_application_state)
 
-        # 展开所有树节点
-        if config.get('expand_tree_on_startup', False):
-            self.ui.treeWidget.expandAll()
         # 根据配置隐藏工具栏和状态栏
         if config.get('hide_toolbar', False):
             self.ui.toolBar.hide()
@@ -387,13 +484,120 @@ class MainWindow(QMainWindow):
         )
         self.search_node = None
 
+        # 设置搜索焦点，载入数据期间就可以输入
+        QTimer.singleShot(0, self.search_box.setFocus)
+        # 第一次绘制完成后开始载入，没有绘制(比如最小化启动)也不会一直
+        # 等下去
+        self.firstPainted.connect(self.loader.start)
+        QTimer.singleShot(200, self.loader.start)
+        profile.mark('其他初始化')
+
+    def show_loading_tree(self, nodes):
+        """数据还没有载入完成，先显示第一层节点。
+        """
+        if not self.loading:
+            return
+        tree = self.ui.treeWidget
+        tree.clear()
+        for node_id, name in nodes:
+            QTreeWidgetItem(tree).setText(0, name)
+
+    def finish_loading(self, data):
+        self.data = data
+        self.loading = False
+        tree = self.ui.treeWidget
+        tree.setUpdatesEnabled(False)
+        try:
+            tree.clear()
+            self.build_tree()
+        finally:
+            tree.setUpdatesEnabled(True)
+        tree.setEnabled(True)
+        # 展开所有树节点
+        if config.get('expand_tree_on_startup', False):
+            tree.expandAll()
+        if self.tree_filter_box.text().strip():
+            self.filter_tree()
         # 初始化后点击第一项
-        first_item = self.ui.treeWidget.topLevelItem(0)
+        first_item = tree.topLevelItem(0)
         if first_item:
-            self.ui.treeWidget.setCurrentItem(first_item)
+            tree.setCurrentItem(first_item)
             self.tree_item_click(first_item)
-        # 设置搜索焦点
-        QTimer.singleShot(0, self.search_box.setFocus)
+        self.update_statusbar_left()
+        if config.get('watch_files', False):
+            self.start_file_watcher()
+        if config.get('autosave', False):
+            self.start_autosave()
+        profile.mark('载入数据')
+        # 按载入期间的顺序处理
+        actions, self.pending_actions = self.pending_actions, []
+        for action in actions:
+            action()
+        if self.pending_search:
+            self.pending_search = False
+            self.handle_search()
+
+    def handle_load_failed(self, error):
+        QMessageBox.critical(self, '错误', f'无法载入数据文件：{error}')
+        # 不能在空的数据上继续操作，否则保存时会覆盖数据文件
+        self.has_edited = False
+        self.close()
+
+    def handle_load_cancelled(self):
+        """
+        载入任务被取消(通常是关闭窗口时调度器停止了)，数据不会再来了：
+        丢掉载入期间排队的操作，之后的操作也不再排队。数据还是空的，
+        loading 保持为 True，保存仍然不可用，不会覆盖数据文件。
+        """
+        self.load_cancelled = True
+        self.pending_actions = []
+        self.pending_search = False
+        self.ui.treeWidget.clear()
+        self.label_center.setText('数据载入已取消')
+
+    def defer_while_loading(self, action):
+        """载入期间把操作放到队列中，载入完成后再执行，返回是否放入了队列。
+        """
+        if not self.loading:
+            return False
+        if not self.load_cancelled:
+            self.pending_actions.append(action)
+        return True
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.painted:
+            self.painted = True
+            # 等这一次绘制全部完成
+            QTimer.singleShot(0, self.firstPainted.emit)
+
+    def handle_request(self, request):
+        """
+        处理启动请求：再次启动程序时，命令行参数由已经打开的窗口处理。
+        paths 添加到当前节点，search 不为空时搜索。
+        """
+        if self.defer_while_loading(lambda: self.handle_request(request)):
+            self.raise_()
+            self.activateWindow()
+            return
+        if self.isMinimized():
+            self.showNormal()
+        self.raise_()
+        self.activateWindow()
+        paths = request.get('paths') or []
+        if paths:
+            item = self.ui.treeWidget.currentItem()
+            if item is None or item.data(0, Qt.UserRole) is None:
+                # 在搜索模式中，回到第一个节点
+                self.handle_esc_signal()
+            item = self.ui.treeWidget.currentItem()
+            if item is not None and item.data(0, Qt.UserRole) is not None:
+                self.external_items_drop(
+                    [QUrl.fromLocalFile(path) for path in paths])
+        search = request.get('search')
+        if search:
+            self.search_box.setText(search)
+            self.handle_search()
 
     def handle_esc_signal(self):
         first_item = self.ui.treeWidget.topLevelItem(0)
@@ -415,6 +619,13 @@ class MainWindow(QMainWindow):
         text = self.search_box.text().strip()
         if len(text) == 0:
             return
+        if self.loading:
+            if self.load_cancelled:
+                return
+            # 载入完成后用那时搜索框中的内容搜索
+            self.pending_search = True
+            self.label_center.setText('载入数据后搜索...')
+            return
 
         # ui 层面
         self.clear_input_widgets()
@@ -425,29 +636,27 @@ class MainWindow(QMainWindow):
             self.ui.treeWidget.setCurrentItem(self.search_node)
 
         # 处理数据部分
-        # 不区分大小写搜索 name, path, comment
-        # 这里的部分后续如果要增强搜索功能，比如正则表达式之类的，
-        # 需要在这里进行接口改变。
-        result_count = 0
-        text = text.lower()
-        for item_id in self.data['items']:
-            try:
-                item_data = self.data['items'][item_id]
-            except:
-                continue
-            name = self._format_data(item_data.get('name'))
-            path = self._format_data(item_data.get('path'))
-            comment = self._format_data(item_data.get('comment'))
-            if text in name.lower() \
-                or text in path.lower()\
-                    or text in comment.lower():
-                item = QListWidgetItem(name)
-                item.setData(Qt.UserRole, item_id)
-                self.ui.listWidget.addItem(item)
-                result_count += 1
+        # 查询语法见 search.py，比如 name:report ext:xlsx -comment:old
+        scope = None
+        if self.scope_search_action.isChecked() \
+                and self.current_node_id in self.data['nodes']:
+            scope = self.current_node_id
+        plan = self.data.plan_query(text, scope=scope)
+        # 数据没有变化时，重复的查询直接使用缓存的结果
+        result_ids = self.data.execute_plan(plan)
+        for item_id in result_ids:
+            item_data = self.data['items'][item_id]
+            item = QListWidgetItem(self._format_data(item_data.get('name')))
+            item.setData(Qt.UserRole, item_id)
+            self.show_item_status(item, item_id)
+            # 搜索结果里面看不出项属于哪个节点，用提示显示节点路径
+            item.setToolTip(self.data.get_item_node_path(item_id))
+            self.ui.listWidget.addItem(item)
 
-        # 更新状态栏
-        self.label_center.setText(f'搜索结果：{result_count}')
+        # 更新状态栏，鼠标悬停可以看到查询计划
+        self.label_center.setText(f'搜索结果：{len(result_ids)}')
+        self.label_center.setToolTip(
+            plan.explain() + '\n' + self.data.query_cache.describe())
 
     def init_listwidget_context_menu(self):
         self.action_open_selected_path = QAction('打开目标路径')
@@ -493,6 +702,8 @@ class MainWindow(QMainWindow):
         self.action_ascend_items = QAction('升序')
         self.action_descend_items = QAction('降序')
         self.action_delete_node = QAction('删除节点')
+        self.action_import_directory = QAction('导入文件夹为子节点')
+        self.action_rescan_directory = QAction('重新扫描文件夹')
 
         self.action_add_node.triggered.connect(self.add_node)
         self.action_add_sub_node.triggered.connect(self.add_sub_node)
@@ -500,6 +711,8 @@ class MainWindow(QMainWindow):
         self.action_ascend_items.triggered.connect(self.ascent_items)
         self.action_descend_items.triggered.connect(self.descend_items)
         self.action_delete_node.triggered.connect(self.delete_node)
+        self.action_import_directory.triggered.connect(self.import_directory)
+        self.action_rescan_directory.triggered.connect(self.rescan_directory)
 
         self.treewidget_menu = QMenu(self.ui.treeWidget)
         self.treewidget_menu.addAction(self.action_add_node)
@@ -509,6 +722,9 @@ class MainWindow(QMainWindow):
         self.treewidget_menu.addAction(self.action_ascend_items)
         self.treewidget_menu.addAction(self.action_descend_items)
         self.treewidget_menu.addSeparator()
+        self.treewidget_menu.addAction(self.action_import_directory)
+        self.treewidget_menu.addAction(self.action_rescan_directory)
+        self.treewidget_menu.addSeparator()
         self.treewidget_menu.addAction(self.action_delete_node)
 
     def tree_item_change(self, current, previous):
@@ -520,6 +736,7 @@ class MainWindow(QMainWindow):
             self.search_node = None
             # 更新状态栏
             self.label_center.setText('')
+            self.label_center.setToolTip('')
         self.tree_item_click(current)
 
     def tree_key_press(self, key):
@@ -563,6 +780,7 @@ class MainWindow(QMainWindow):
             return
         node_id = node.data(0, Qt.UserRole)
         item_id = self.data.add_item(payload, node_id)
+        self.refresh_node_counts([node_id])
         # 更新 listWidget 的 UI
         self.tree_item_click(node)
         row_count = self.ui.listWidget.count()
@@ -588,11 +806,11 @@ class MainWindow(QMainWindow):
         first_item_data = self.data['items'][ids[0]]
         if first_item_data['parent_id'] == tree_node_id:
             return
-        for item_id in ids:
-            list_item_data = self.data['items'][item_id]
-            parent_id = list_item_data['parent_id']
-            self.data.move_item_to_node(item_id, tree_node_id)
-            # 这里还缺少 ui 处理逻辑
+        old_parent_ids = {
+            self.data['items'][item_id]['parent_id'] for item_id in ids
+        }
+        self.data.move_items_to_node(ids, tree_node_id)
+        self.refresh_node_counts(list(old_parent_ids) + [tree_node_id])
         self.tree_item_click(tree_node)
         self.set_has_edited(True)
 
@@ -621,23 +839,109 @@ class MainWindow(QMainWindow):
         self.set_has_edited(True)
 
     def external_items_drop(self, urllist):
+        if self.defer_while_loading(
+                lambda: self.external_items_drop(urllist)):
+            self.label_center.setText(
+                f'载入数据后添加拖入的 {len(urllist)} 项...')
+            return
         node = self.ui.treeWidget.currentItem()
-        node_id = node.data(0, Qt.UserRole)
+        node_id = node.data(0, Qt.UserRole) if node is not None else None
+        if node_id is None or self.search_node is not None:
+            # 没有节点，或者在搜索模式中，不知道添加到哪里
+            self.label_center.setText('请先选择要添加到的节点')
+            return
         self.ui.listWidget.clearSelection()
-        for QUrl in urllist:
-            path = QUrl.toLocalFile()
-            row_count = self.ui.listWidget.count()
-            basename = os.path.basename(Path(path))
-            item_data = get_data_format('item')
-            item_data['name'] = basename
-            item_data['path'] = path
-            item_id = self.data.add_item(item_data, node_id)
-            item = QListWidgetItem(basename)
-            item.setData(Qt.UserRole, item_id)
-            self.ui.listWidget.addItem(item)
-            item.setSelected(True)
+        # 分批添加，每一批写入数据后马上追加到列表中
+        pipeline = DropPipeline(self.data, urllist, node_id, self)
+        pipeline.chunkAdded.connect(
+            lambda item_ids: self.append_list_items(node_id, item_ids))
+        pipeline.finished.connect(
+            lambda item_ids, cancelled:
+                self.external_items_drop_finished(
+                    node_id, item_ids, cancelled)
+        )
+        if len(urllist) <= DropPipeline.CHUNK_SIZE:
+            pipeline.run()
+            return
+        # 数量多的时候显示进度，可以取消
+        progress = QProgressDialog(
+            f'正在添加 {len(urllist)} 项...', '取消', 0, len(urllist), self)
+        progress.setWindowTitle('添加')
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(300)
+        progress.canceled.connect(pipeline.cancel)
+        pipeline.progressed.connect(
+            lambda position, total: progress.setValue(position))
+        pipeline.finished.connect(
+            lambda item_ids, cancelled: progress.deleteLater())
+        self.drop_pipeline = pipeline
+        pipeline.start()
+
+    def list_shows_node(self, node_id):
+        """
+        列表显示的是不是 node_id 节点的项。分批添加期间可以点击其他节点
+        或者搜索，这时不能改动列表，回到这个节点时会按数据重新显示。
+        """
+        return self.search_node is None and self.current_node_id == node_id
+
+    def append_list_items(self, node_id, item_ids):
+        """把新增的项追加到列表末尾，追加完再刷新界面。
+        """
+        if not self.list_shows_node(node_id):
+            return
+        list_widget = self.ui.listWidget
+        list_widget.setUpdatesEnabled(False)
+        try:
+            for item_id in item_ids:
+                item = QListWidgetItem(self.data['items'][item_id]['name'])
+                item.setData(Qt.UserRole, item_id)
+                self.show_item_status(item, item_id)
+                list_widget.addItem(item)
+        finally:
+            list_widget.setUpdatesEnabled(True)
+
+    def external_items_drop_finished(self, node_id, item_ids, cancelled):
+        self.drop_pipeline = None
+        list_widget = self.ui.listWidget
+        if node_id not in self.data['nodes']:
+            # 添加期间节点被删除了，列表已经不是这个节点的
+            self.update_statusbar_left()
+            return
+        self.refresh_node_counts([node_id])
+        showing = self.list_shows_node(node_id)
+        if cancelled:
+            if not showing:
+                self.update_statusbar_left()
+                return
+            # 数据已经恢复，去掉列表末尾已经追加的项
+            list_widget.setUpdatesEnabled(False)
+            try:
+                for _ in item_ids:
+                    list_widget.takeItem(list_widget.count() - 1)
+            finally:
+                list_widget.setUpdatesEnabled(True)
+            self.update_statusbar_left()
+            return
+        if not item_ids:
+            return
+        if not showing:
+            self.set_has_edited()
+            self.update_statusbar_left()
+            return
+        # 新增的项在列表末尾，一次选中整个范围
+        last_row = list_widget.count() - 1
+        model = list_widget.model()
+        list_widget.selectionModel().select(
+            QItemSelection(
+                model.index(last_row - len(item_ids) + 1, 0),
+                model.index(last_row, 0)
+            ),
+            QItemSelectionModel.Select
+        )
+        item = list_widget.item(last_row)
         self.listwidget_left_click(item)
-        self.ui.listWidget.setCurrentItem(item)
+        # 只移动当前项，保留上面选中的范围
+        list_widget.setCurrentItem(item, QItemSelectionModel.NoUpdate)
         self.ui.listWidget.setFocus(Qt.OtherFocusReason)
         self.window().activateWindow()
         self.set_has_edited()
@@ -654,11 +958,17 @@ class MainWindow(QMainWindow):
                 '此功能用于删除列表上的项。你需要先选中项才能使用该功能。'
             )
             return
+        item_ids = []
         for item in selected_items:
             row = self.ui.listWidget.row(item)
             self.ui.listWidget.takeItem(row)    # 处理UI界面
-            item_id = item.data(Qt.UserRole)
-            self.data.remove_item(item_id)      # 处理数据删除
+            item_ids.append(item.data(Qt.UserRole))
+        # 处理数据删除，搜索模式下这些项可能来自不同的节点
+        parent_ids = {
+            self.data['items'][item_id]['parent_id'] for item_id in item_ids
+        }
+        self.data.remove_items(item_ids)
+        self.refresh_node_counts(parent_ids)
         count = self.ui.listWidget.count()
         if count > 0:
             current_item = self.ui.listWidget.currentItem()
@@ -723,6 +1033,17 @@ class MainWindow(QMainWindow):
     def update_config(self, payload):
         config.update(payload)
         config.to_json(CONFIG_FILE)
+        # 载入数据期间不用处理，载入完成时会按配置开始监视和自动保存
+        if 'watch_files' in payload and not self.loading:
+            if payload['watch_files'] and self.file_watcher is None:
+                self.start_file_watcher()
+            elif not payload['watch_files'] and self.file_watcher is not None:
+                self.stop_file_watcher()
+        if 'autosave' in payload and not self.loading:
+            if payload['autosave'] and self.autosaver is None:
+                self.start_autosave()
+            elif not payload['autosave'] and self.autosaver is not None:
+                self.stop_autosave()
         # 这里可能后续还需要有修改字体后更新窗体渲染的代码
         # 支持部分配置功能实时更新
         if 'hide_toolbar' in payload:
@@ -748,14 +1069,17 @@ class MainWindow(QMainWindow):
 
     def build_tree(self):
         self.ui.treeWidget.setHeaderHidden(True)
-        # 渲染树节点的需要，渲染完后，这个实例变量就不需要了。
-        # 感觉还是不维护的好。因为可以减少很多时间和精力，似乎也
-        # 没有必要。想要获得的目标节点对象一般都很容易就获得了。
-        self.tree_item_map = {}
+        # 第二列显示节点的项数：直接挂载的/包括子节点的
+        self.ui.treeWidget.setColumnCount(2)
+        header = self.ui.treeWidget.header()
+        header.setStretchLastSection(False)
+        header.setSectionResizeMode(0, QHeaderView.Stretch)
+        header.setSectionResizeMode(1, QHeaderView.ResizeToContents)
+        # node_id 到树节点对象的映射。原来渲染完就删除了，现在项数变化
+        # 时需要沿着祖先链更新显示，所以一直维护着。
+        self.tree_items = {}
         for node_id in self.data['nodes']['root']['sub_nodes']:
             self.render_node(node_id)
-        # 用完直接删除掉，回收内存。
-        del self.tree_item_map
         item_count = self.ui.treeWidget.topLevelItemCount()
         if item_count > 0:
             item = self.ui.treeWidget.topLevelItem(0)
@@ -769,15 +1093,64 @@ class MainWindow(QMainWindow):
         name = node['name']
         parent_id = node['parent_id']
         if parent_id == 'root':
-            item = QTreeWidgetItem(self.ui.treeWidget)
+            parent = self.ui.treeWidget
         else:
-            item = QTreeWidgetItem(self.tree_item_map[parent_id])
-        item.setText(0, name)
-        item.setData(0, Qt.UserRole, node_id)
-        self.tree_item_map[node_id] = item
+            parent = self.tree_items[parent_id]
+        self.create_tree_item(parent, node_id, name)
         for _node_id in self.data['nodes'][node_id]['sub_nodes']:
             self.render_node(_node_id)
 
+    def create_tree_item(self, parent, node_id, name):
+        """
+        parent: QTreeWidget 或者 QTreeWidgetItem
+        """
+        item = QTreeWidgetItem(parent)
+        item.setText(0, name)
+        item.setData(0, Qt.UserRole, node_id)
+        item.setTextAlignment(1, Qt.AlignRight | Qt.AlignVCenter)
+        item.setForeground(1, Qt.gray)
+        self.tree_items[node_id] = item
+        self.show_node_counts(node_id)
+        return item
+
+    def show_node_counts(self, node_id):
+        direct, total = self.data.get_item_counts(node_id)
+        item = self.tree_items[node_id]
+        item.setText(1, f'{direct}/{total}')
+        item.setToolTip(1, f'本节点：{direct}，包括子节点：{total}')
+
+    def refresh_node_counts(self, node_ids):
+        """更新这些节点以及它们所有祖先的项数显示。
+        """
+        done = set()
+        for node_id in node_ids:
+            while node_id in self.tree_items and node_id not in done:
+                done.add(node_id)
+                self.show_node_counts(node_id)
+                node_id = self.data['nodes'][node_id]['parent_id']
+
+    def filter_tree(self):
+        """
+        只显示名称匹配的节点和它们的祖先节点，祖先节点会被展开。
+        清空筛选框时显示全部节点。
+        """
+        text = self.tree_filter_box.text().strip()
+        visible = self.data.filter_nodes(text) if text else None
+        tree = self.ui.treeWidget
+        # 一次性修改完再刷新界面，节点很多时逐个刷新会很慢
+        tree.setUpdatesEnabled(False)
+        try:
+            for node_id, item in self.tree_items.items():
+                hidden = visible is not None and node_id not in visible
+                if item.isHidden() != hidden:
+                    item.setHidden(hidden)
+                if visible is not None and not hidden:
+                    parent = item.parent()
+                    if parent is not None and not parent.isExpanded():
+                        parent.setExpanded(True)
+        finally:
+            tree.setUpdatesEnabled(True)
+
     def tree_item_click(self, item, column=0):
         """
         item: PySide6.QtWidgets.QTreeWidgetItem
@@ -789,6 +1162,9 @@ class MainWindow(QMainWindow):
             # 在搜索模式中
             return
         name = item.text(0)
+        self.current_node_id = node_id
+        if self.file_watcher is not None:
+            self.file_watcher.touch_node(node_id)
         self.ui.listWidget.clear()
         self.clear_input_widgets()
         item_ids = self.data['nodes'][node_id]['items']
@@ -796,8 +1172,70 @@ class MainWindow(QMainWindow):
             item = self.data['items'][item_id]
             item = QListWidgetItem(item['name'])
             item.setData(Qt.UserRole, item_id)
+            self.show_item_status(item, item_id)
             self.ui.listWidget.addItem(item)
 
+    def show_item_status(self, item, item_id):
+        """找不到目标的项显示为灰色。
+        """
+        if self.data.is_item_missing(item_id):
+            item.setForeground(Qt.gray)
+        else:
+            item.setData(Qt.ForegroundRole, None)
+
+    def start_file_watcher(self):
+        limit = config.get('watch_limit')
+        self.file_watcher = FileWatcher(
+            self.data, limit, parent=self, scheduler=self.scheduler)
+        self.file_watcher.statusChanged.connect(self.refresh_item_status)
+        if self.current_node_id is not None:
+            self.file_watcher.touch_node(self.current_node_id)
+        self.file_watcher.schedule_refresh()
+
+    def stop_file_watcher(self):
+        self.file_watcher.stop()
+        self.file_watcher.deleteLater()
+        self.file_watcher = None
+        self.refresh_item_status(self.data.clear_item_status())
+
+    def start_autosave(self):
+        policy = AutosavePolicy(
+            config.get('autosave_idle'),
+            config.get('autosave_max_delay'),
+            config.get('autosave_budget')
+        )
+        self.autosaver = AutoSaver(
+            self.data, self.writer, policy, self, self.scheduler)
+        self.autosaver.saved.connect(self.handle_autosaved)
+        self.autosaver.conflict.connect(self.save)
+        self.autosaver.failed.connect(
+            lambda error: self.label_center.setText(f'自动保存失败：{error}'))
+        if self.has_edited:
+            self.autosaver.mark_dirty()
+
+    def stop_autosave(self):
+        self.autosaver.stop()
+        self.autosaver.deleteLater()
+        self.autosaver = None
+
+    def handle_autosaved(self, generation):
+        self.data.clear_dirty(generation)
+        notify_reload(DATABASE)
+        # 保存期间又有新的修改时，仍然是未保存的状态
+        if generation == self.data.generation:
+            self.set_has_edited(False)
+
+    def refresh_item_status(self, item_ids):
+        """更新列表中这些项的显示。
+        """
+        item_ids = set(item_ids)
+        list_widget = self.ui.listWidget
+        for row in range(list_widget.count()):
+            item = list_widget.item(row)
+            item_id = item.data(Qt.UserRole)
+            if item_id in item_ids:
+                self.show_item_status(item, item_id)
+
     def listwidget_left_click(self, item=None):
         self.clear_input_widgets()
         if item is None:
@@ -816,13 +1254,6 @@ class MainWindow(QMainWindow):
         items = self.ui.listWidget.selectedItems()
         if not items:
             return
-        if len(items) > 5:
-            QMessageBox.about(
-                self,
-                '提示',
-                '当前最大允许同时进行任务数是5个！'
-            )
-            return
         return items
 
     def get_listwidget_item_data(self, item):
@@ -830,46 +1261,74 @@ class MainWindow(QMainWindow):
         item_data = self.data['items'][item_id]
         return item_data
 
-    def handle_open_file(self, path):
+    def handle_launch_failed(self, label, message):
+        self.launch_failures.append(f'{label}：{message}')
+
+    def handle_launch_progress(self, done, total):
         """
-        处理打开单个文件，附带 UI 反馈
+        一次打开多项时显示进度，全部完成后显示失败的项，失败的详细信息
+        放在提示中。
         """
-        if not path:
+        if done < total:
+            if total > 1:
+                self.label_center.setText(f'正在打开：{done}/{total}')
+                self.label_center.setToolTip('')
+            return
+        failures = self.launch_failures
+        self.launch_failures = []
+        if not failures:
+            if total > 1:
+                self.label_center.setText(f'已打开 {total} 项')
+                self.label_center.setToolTip('')
             return
-        if path.startswith('http'):
-            system_actions.open_url(path)
-        elif path.startswith(('ftp', r'\\')):
-            system_actions.open_ftp(path)
-        elif os.path.exists(path):
-            system_actions.open_file(path)
+        if len(failures) == 1:
+            self.label_center.setText(f'打开失败：{failures[0]}')
         else:
-            QMessageBox.critical(self, '错误', f'找不到目标路径：{path}')
+            self.label_center.setText(
+                f'{len(failures)} 项打开失败：{failures[-1]}')
+        self.label_center.setToolTip('\n'.join(failures))
+
+    @staticmethod
+    def launch_path(path):
+        status = open_path(path)
+        if status is False:
+            raise LaunchError(f'找不到目标路径：{path}')
+        return status
+
+    def handle_open_file(self, path, label=None):
+        """
+        处理打开单个文件，请求交给 launcher 排队启动
+        """
+        self.launcher.submit(label or path, self.launch_path, path)
 
-    def handle_directory(self, path, action_type):
+    def handle_directory(self, path, action_type, label=None):
         if not path:
             return
+        label = label or path
         if os.path.isdir(path):
             directory = path
         else:
             if not os.path.exists(path):
-                QMessageBox.critical(self, '错误', f'找不到该文件：{path}')
+                self.launcher.fail(label, f'找不到该文件：{path}')
                 return
             directory = os.path.dirname(path)
         if directory and os.path.exists(directory):
             if action_type == 'open_directory':
-                system_actions.open_directory(directory)
+                self.launcher.submit(
+                    label, system_actions.open_directory, directory)
             elif action_type == 'open_console':
-                system_actions.open_console(directory)
+                self.launcher.submit(
+                    label, system_actions.open_console, directory)
             else:
                 raise TypeError
         else:
-            QMessageBox.critical(self, '错误', f'找不到目标路径：{path}')
+            self.launcher.fail(label, f'找不到目标路径：{path}')
 
-    def handle_open_directory(self, path):
-        return self.handle_directory(path, 'open_directory')
+    def handle_open_directory(self, path, label=None):
+        return self.handle_directory(path, 'open_directory', label)
 
-    def handle_open_console(self, path):
-        return self.handle_directory(path, 'open_console')
+    def handle_open_console(self, path, label=None):
+        return self.handle_directory(path, 'open_console', label)
 
     def open_selected_files(self):
         items = self.get_listwidget_selected_items()
@@ -877,8 +1336,7 @@ class MainWindow(QMainWindow):
             return
         for item in items:
             item_data = self.get_listwidget_item_data(item)
-            path = item_data['path']
-            self.handle_open_file(path)
+            self.handle_open_file(item_data['path'], item_data['name'])
 
     def open_selected_directories(self):
         items = self.get_listwidget_selected_items()
@@ -886,8 +1344,7 @@ class MainWindow(QMainWindow):
             return
         for item in items:
             item_data = self.get_listwidget_item_data(item)
-            path = item_data['path']
-            self.handle_open_directory(path)
+            self.handle_open_directory(item_data['path'], item_data['name'])
 
     def open_console_windows(self):
         items = self.get_listwidget_selected_items()
@@ -895,18 +1352,24 @@ class MainWindow(QMainWindow):
             return
         for item in items:
             item_data = self.get_listwidget_item_data(item)
-            path = item_data['path']
-            self.handle_open_console(path)
+            self.handle_open_console(item_data['path'], item_data['name'])
 
-    def handle_locate_file(self, path):
+    @staticmethod
+    def launch_locate(path):
+        # 启动了子进程时 status 是这个 Popen，交给 launcher 回收
+        status, message = system_actions.locate_file(path)
+        if not status:
+            raise LaunchError(message)
+        return status
+
+    def handle_locate_file(self, path, label=None):
         if not path:
             return
+        label = label or path
         if not os.path.exists(path):
-            QMessageBox.critical(self, '错误', f'找不到该文件：{path}')
+            self.launcher.fail(label, f'找不到该文件：{path}')
             return
-        status, message = system_actions.locate_file(path)
-        if not status:
-            QMessageBox.about(self, '提示', message)
+        self.launcher.submit(label, self.launch_locate, path)
 
     def locate_files(self):
         items = self.get_listwidget_selected_items()
@@ -914,8 +1377,7 @@ class MainWindow(QMainWindow):
             return
         for item in items:
             item_data = self.get_listwidget_item_data(item)
-            path = item_data['path']
-            self.handle_locate_file(path)
+            self.handle_locate_file(item_data['path'], item_data['name'])
 
     def copy_items(self):
         items = self.get_listwidget_selected_items()
@@ -926,14 +1388,18 @@ class MainWindow(QMainWindow):
         # node = self.ui.treeWidget.currentItem()
         # node_id = node.data(0, Qt.UserRole)
         self.ui.listWidget.clearSelection()
+        node_ids = set()
         for _item in items:
-            item_data = deepcopy(self.get_listwidget_item_data(_item))
+            # 项的字段修改时会整体替换，不需要深复制
+            item_data = dict(self.get_listwidget_item_data(_item))
             node_id = item_data['parent_id']
+            node_ids.add(node_id)
             item_id = self.data.add_item(item_data, node_id)
             item = QListWidgetItem(item_data['name'])
             item.setData(Qt.UserRole, item_id)
             self.ui.listWidget.addItem(item)
             item.setSelected(True)
+        self.refresh_node_counts(node_ids)
         self.listwidget_left_click(item)
         self.ui.listWidget.setCurrentItem(item)
         self.ui.listWidget.setFocus(Qt.OtherFocusReason)
@@ -955,6 +1421,8 @@ class MainWindow(QMainWindow):
         if current_row == -1:
             return
 
+        if self.listwidget_menu is None:
+            self.init_listwidget_context_menu()
         editor_name = config.get('editor_name', '代码编辑器')
         self.action_open_file_with_editor.setText(
             f"使用 {editor_name} 打开文件")
@@ -969,6 +1437,14 @@ class MainWindow(QMainWindow):
     def show_tree_context_menu(self, position):
         # item = self.ui.treeWidget.currentItem()
         # self.tree_item_click(item, 0)
+        if self.treewidget_menu is None:
+            self.init_treewidget_context_menu()
+        node = self.ui.treeWidget.currentItem()
+        node_id = node.data(0, Qt.UserRole) if node else None
+        self.action_rescan_directory.setEnabled(
+            node_id is not None
+            and get_mirror_path(self.data, node_id) is not None
+        )
         self.treewidget_menu.exec_(
             self.ui.treeWidget.mapToGlobal(position))
 
@@ -1020,6 +1496,7 @@ class MainWindow(QMainWindow):
             self.data.change_node_index(node_id, new_index)
         else:
             self.data.change_node_parent(node_id, new_parent_id, new_index)
+            self.refresh_node_counts([old_parent_id, new_parent_id])
         self.set_has_edited(True)
 
     def add_node(self):
@@ -1043,11 +1520,10 @@ class MainWindow(QMainWindow):
 
         # UI 层面处理
         if parent_id == 'root':
-            item = QTreeWidgetItem(self.ui.treeWidget)
+            parent = self.ui.treeWidget
         else:
-            item = QTreeWidgetItem(node.parent())
-        item.setText(0, name)
-        item.setData(0, Qt.UserRole, new_node_id)
+            parent = node.parent()
+        item = self.create_tree_item(parent, new_node_id, name)
         self.ui.treeWidget.setFocus()
         self.ui.treeWidget.setCurrentItem(item)
         # self.tree_item_click(item)
@@ -1068,9 +1544,7 @@ class MainWindow(QMainWindow):
         new_node_id = self.data.add_node(name, parent_id)
 
         # UI 层面处理
-        item = QTreeWidgetItem(node)
-        item.setText(0, name)
-        item.setData(0, Qt.UserRole, new_node_id)
+        item = self.create_tree_item(node, new_node_id, name)
         self.ui.treeWidget.setFocus()
         self.ui.treeWidget.setCurrentItem(item)
         # self.tree_item_click(item)
@@ -1106,9 +1580,18 @@ class MainWindow(QMainWindow):
             return
         node = self.ui.treeWidget.currentItem()
         node_id = node.data(0, Qt.UserRole)
+        parent_id = self.data['nodes'][node_id]['parent_id']
 
         # 处理数据层面
+        subtree = set(self.data.iter_subtree(node_id))
+        for sub_node_id in subtree:
+            self.tree_items.pop(sub_node_id, None)
+        pipeline = self.drop_pipeline
+        if pipeline is not None and pipeline.node_id in subtree:
+            # 正在往被删除的节点中添加拖入的文件
+            pipeline.cancel()
         self.data.remove_node(node_id)
+        self.refresh_node_counts([parent_id])
 
         # 处理 UI 层面
         parent = node.parent()
@@ -1126,6 +1609,105 @@ class MainWindow(QMainWindow):
         self.set_has_edited(True)
         self.update_statusbar_left()
 
+    def import_directory(self):
+        path = QFileDialog.getExistingDirectory(self, '选择要导入的文件夹')
+        if not path:
+            return
+        node = self.ui.treeWidget.currentItem()
+        parent_id = node.data(0, Qt.UserRole) if node else None
+        if parent_id is None:
+            # 没有节点或者在搜索模式中，导入到第一层
+            parent_id = 'root'
+        node_id = create_mirror_node(self.data, path, parent_id)
+        parent = self.tree_items.get(parent_id, self.ui.treeWidget)
+        self.create_tree_item(
+            parent, node_id, self.data['nodes'][node_id]['name'])
+        self.set_has_edited(True)
+        self.update_statusbar_left()
+        self.start_mirror_scan(node_id)
+
+    def rescan_directory(self):
+        node = self.ui.treeWidget.currentItem()
+        if node is None or node.data(0, Qt.UserRole) is None:
+            return
+        self.start_mirror_scan(node.data(0, Qt.UserRole))
+
+    def start_mirror_scan(self, node_id):
+        """
+        在后台任务中扫描文件夹，扫描完以后回到主线程应用差异。
+        """
+        if self.mirror_scan_node is not None:
+            QMessageBox.about(self, '提示', '正在扫描其他文件夹，请稍后再试。')
+            return
+        path = get_mirror_path(self.data, node_id)
+        snapshot = self.data.snapshot()
+        self.mirror_scan_node = node_id
+        self.label_center.setText(f'正在扫描：{path}')
+
+        def scan(task):
+            with snapshot:
+                known = mirror_state(snapshot, node_id)
+            return scan_directory(path, known, task=task)
+
+        def progress(task):
+            self.label_center.setText(
+                f'正在扫描：{path}，已扫描 {task.done} 个文件夹')
+
+        self.scheduler.submit(
+            scan, name='扫描文件夹', priority=NORMAL,
+            on_done=lambda task: self.finish_mirror_scan(node_id, task),
+            on_progress=progress
+        )
+
+    def finish_mirror_scan(self, node_id, task):
+        self.mirror_scan_node = None
+        if task.state == CANCELLED or node_id not in self.data['nodes']:
+            # 程序退出，或者扫描期间节点被删除了
+            self.label_center.setText('')
+            return
+        path = get_mirror_path(self.data, node_id)
+        if task.state == FAILED:
+            self.label_center.setText('')
+            QMessageBox.critical(self, '错误', f'扫描[{path}]失败：{task.error}')
+            return
+        stats = apply_scan(self.data, node_id, task.result)
+        if stats['missing']:
+            self.label_center.setText('')
+            QMessageBox.critical(self, '错误', f'找不到[{path}]！')
+            return
+        self.label_center.setText(f'扫描完成：{describe_stats(stats)}')
+        changes = sum(
+            stats[key] for key in
+            ('nodes_added', 'nodes_removed', 'items_added', 'items_removed')
+        )
+        if not changes:
+            return
+        self.rerender_subtree(node_id)
+        self.refresh_node_counts([node_id])
+        current = self.ui.treeWidget.currentItem()
+        if current is not None and current.data(0, Qt.UserRole) is not None:
+            self.tree_item_click(current)
+        self.set_has_edited(True)
+        self.update_statusbar_left()
+
+    def rerender_subtree(self, node_id):
+        """节点下面的结构整体变化以后，重新生成它的所有子节点。
+        """
+        item = self.tree_items[node_id]
+        stack = [item.child(i) for i in range(item.childCount())]
+        while stack:
+            child = stack.pop()
+            self.tree_items.pop(child.data(0, Qt.UserRole), None)
+            stack.extend(child.child(i) for i in range(child.childCount()))
+        tree = self.ui.treeWidget
+        tree.setUpdatesEnabled(False)
+        try:
+            item.takeChildren()
+            for sub_node_id in self.data['nodes'][node_id]['sub_nodes']:
+                self.render_node(sub_node_id)
+        finally:
+            tree.setUpdatesEnabled(True)
+
     def sort_items(self, reverse=False):
         node = self.ui.treeWidget.currentItem()
         node_id = node.data(0, Qt.UserRole)
@@ -1146,18 +1728,13 @@ class MainWindow(QMainWindow):
         self.sort_items(reverse=True)
 
     def open_with_editor(self, flag):
-        items = self.get_listwidget_selected_items()
-        if not items:
-            return
-        for item in items:
-            item_data = self.get_listwidget_item_data(item)
-            path = item_data['path']
-            self.handle_open_with_editor(path, flag)
-
-    def handle_open_with_editor(self, path, flag):
         if flag not in ('file', 'path'):
             print('flag 必须为 file 或者 path')
             return
+        items = self.get_listwidget_selected_items()
+        if not items:
+            return
+        # 编辑器的配置有问题时只提示一次
         editor_path = config.get('editor_path', None)
         if editor_path is None:
             QMessageBox.about(
@@ -1169,18 +1746,22 @@ class MainWindow(QMainWindow):
         if not os.path.exists(editor_path):
             QMessageBox.critical(self, '错误', f'[{editor_path}]不存在！')
             return
+        for item in items:
+            item_data = self.get_listwidget_item_data(item)
+            self.handle_open_with_editor(
+                item_data['path'], flag, editor_path, item_data['name'])
+
+    def handle_open_with_editor(self, path, flag, editor_path, label=None):
         if not path:
             return
+        label = label or path
         if not os.path.exists(path):
-            QMessageBox.critical(self, '错误', f'找不到[{path}]！')
+            self.launcher.fail(label, f'找不到[{path}]！')
             return
         if flag == 'file':
             if os.path.isdir(path):
-                QMessageBox.critical(
-                    self,
-                    '错误',
-                    f'无法通过打开文件的方式打开文件夹！[{path}]'
-                )
+                self.launcher.fail(
+                    label, f'无法通过打开文件的方式打开文件夹！[{path}]')
                 return
             target = path
         elif flag == 'path':
@@ -1190,19 +1771,82 @@ class MainWindow(QMainWindow):
                 target = os.path.dirname(path)
         else:
             raise TypeError
-        system_actions.use_editor_open_path(editor_path, target)
+        self.launcher.submit(
+            label, system_actions.use_editor_open_path, editor_path, target)
 
     def set_has_edited(self, state=True):
         self.has_edited = state
+        if state and self.file_watcher is not None:
+            # 数据有修改，重新安排监视的文件夹
+            self.file_watcher.schedule_refresh()
+        if state and self.autosaver is not None:
+            self.autosaver.mark_dirty()
         if state:
             self.setWindowTitle(self.BASE_WINDOW_TITLE + ' *')
         else:
             self.setWindowTitle(self.BASE_WINDOW_TITLE)
 
     def save(self):
-        self.data.to_json(DATABASE)
+        if self.loading:
+            # 还没有载入数据，不能用空的数据覆盖数据文件
+            return
+        # 和后台的自动保存使用同一个写入对象，不会互相覆盖
+        with self.data_file.lock():
+            try:
+                size = self.writer.write(self.data, self.data.generation)
+            except FileChangedError:
+                # 其他程序保存过，先合并再保存
+                self.sync_from_file()
+                size = self.writer.write(
+                    self.data, self.data.generation, check=False)
+        self.data.clear_dirty(self.data.generation)
+        if self.autosaver is not None:
+            self.autosaver.saved_elsewhere(size)
+        # 后台服务在运行的话，让它提前载入新的数据
+        notify_reload(DATABASE)
         self.set_has_edited(False)
 
+    def sync_from_file(self):
+        """
+        读取其他程序保存的数据，和本程序未保存的修改合并，然后刷新界面。
+        """
+        with self.data_file.lock():
+            disk = self.data_file.read()
+            self.data.replace_data(
+                merge_data(self.data, disk), keep_dirty=True)
+        self.reload_view()
+        self.label_center.setText('已合并其他窗口保存的数据')
+
+    def handle_application_state(self, state):
+        if state != Qt.ApplicationActive or self.loading:
+            return
+        if self.data_file.changed():
+            self.sync_from_file()
+
+    def reload_view(self):
+        """数据整体替换以后，重新生成树和列表。
+        """
+        node_id = self.current_node_id
+        tree = self.ui.treeWidget
+        tree.setUpdatesEnabled(False)
+        try:
+            tree.clear()
+            self.search_node = None
+            self.build_tree()
+        finally:
+            tree.setUpdatesEnabled(True)
+        if self.tree_filter_box.text().strip():
+            self.filter_tree()
+        item = self.tree_items.get(node_id)
+        if item is None:
+            item = tree.topLevelItem(0)
+        if item is not None:
+            tree.setCurrentItem(item)
+            self.tree_item_click(item)
+        else:
+            self.ui.listWidget.clear()
+        self.update_statusbar_left()
+
     def try_to_save_window_size(self):
         """
         仅保存拖拽窗口之后的窗体大小。最大化不算。和原来大小一样不保存。
@@ -1258,17 +1902,63 @@ class MainWindow(QMainWindow):
                 event.ignore()
         else:
             event.accept()
+        if event.isAccepted():
+            self.scheduler.shutdown()
+            if self.watchdog is not None:
+                self.watchdog.stop()
+
+
+def start_instance_server(window, request):
+    """
+    开始接收其他启动请求。在窗口第一次绘制以后才做，QtNetwork 的导入
+    不影响启动时间。
+    """
+    from .instance_server import InstanceServer
+    try:
+        name = server_name()
+    except UnsafeSocketError as e:
+        # 没有安全的地方放套接字，只是不能接收其他启动请求
+        window.label_center.setText(str(e))
+        return
+    server = InstanceServer(name, window)
+    if not server.listen() and request is not None \
+            and not request.get('new_instance'):
+        # 同时启动了两次，另一个已经先开始监听了
+        if send_request(request):
+            window.close()
+            return
+    server.requestReceived.connect(window.handle_request)
+    QApplication.instance().aboutToQuit.connect(server.close)
 
 
-def main():
-
+def run_gui(request=None):
+    """
+    request: single_instance.parse_args 的返回值，打开窗口后马上处理。
+    """
+    if request is not None and request.get('profile_startup'):
+        profile.enabled = True
     app = QApplication(sys.argv)
+    profile.mark('创建 QApplication')
     app.setStyleSheet(load_qss())
+    profile.mark('样式表')
     window = MainWindow()
+    window.firstPainted.connect(profile.finish)
+    window.firstPainted.connect(
+        lambda: start_instance_server(window, request))
     window.show()
+    profile.mark('显示窗口')
+    if request is not None:
+        request = decode_request(encode_request(request))
+        if request['paths'] or request['search']:
+            window.handle_request(request)
     os.environ.pop('QT_PLUGIN_PATH', None)
     os.environ.pop('QML2_IMPORT_PATH', None)
-    sys.exit(app.exec_())
+    code = app.exec_()
+    sys.exit(code)
+
+
+def main():
+    run_gui()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,98 @@
+"""
+汉字转拼音，用于拼音搜索。
+
+对照表放在 static/pinyin.txt，第一次使用时才读取。多音字只取最常用的读音，
+非汉字原样保留（转成小写），空白字符会被去掉，所以“常规 工具”的首字母是 cggj。
+"""
+import re
+
+from .settings import PINYIN_TABLE_PATH
+
+
+_table = None
+_HANZI = re.compile('[一-龥]')
+
+
+def load_table():
+    global _table
+    if _table is None:
+        table = {}
+        with open(PINYIN_TABLE_PATH, encoding='utf-8')as fl:
+            for line in fl:
+                if line.startswith('#'):
+                    continue
+                syllable, chars = line.split()
+                for char in chars:
+                    table[char] = syllable
+        _table = table
+    return _table
+
+
+def has_hanzi(text):
+    return bool(text) and _HANZI.search(text) is not None
+
+
+def is_pinyin_query(text):
+    """只有纯字母的搜索词才会去匹配拼音。
+    """
+    return text.isascii() and text.isalpha()
+
+
+def to_pinyin(text):
+    """
+    返回 (全拼, 首字母)，比如 '常规' -> ('changgui', 'cg')。
+    """
+    table = load_table()
+    full = []
+    initials = []
+    for char in text.lower():
+        if char.isspace():
+            continue
+        syllable = table.get(char)
+        if syllable is None:
+            full.append(char)
+            initials.append(char)
+        else:
+            full.append(syllable)
+            initials.append(syllable[0])
+    return ''.join(full), ''.join(initials)
+
+
+class PinyinIndex:
+
+    """
+    key(item id 或 node id) 到名称拼音的映射，只记录含有汉字的名称。
+    拼音在名称写入时就转换好，搜索时只需要查表。
+    """
+
+    def __init__(self):
+        self.built = False
+        self.spellings = {}
+
+    def build(self, names):
+        """names: 可迭代的 (key, name)
+        """
+        self.spellings = {}
+        self.built = True
+        for key, name in names:
+            self.set(key, name)
+
+    def set(self, key, name):
+        if not self.built:
+            return
+        if has_hanzi(name):
+            self.spellings[key] = to_pinyin(name)
+        else:
+            self.spellings.pop(key, None)
+
+    def discard(self, key):
+        self.spellings.pop(key, None)
+
+    def get(self, key, default=None):
+        return self.spellings.get(key, default)
+
+    def match(self, key, text):
+        spelling = self.spellings.get(key)
+        if spelling is None:
+            return False
+        return text in spelling[0] or text in spelling[1]
@@ -0,0 +1,50 @@
+"""
+界面中使用的调度器：任务的通知和回调都回到主线程，可以直接操作界面
+和修改数据。调度器本身见 scheduler.py。
+"""
+from PySide6.QtCore import QObject, Signal
+
+from .scheduler import NORMAL, Scheduler
+
+
+class QtScheduler(QObject):
+
+    """
+    taskStarted(task)、taskProgress(task)、taskFinished(task) 在主线程中
+    发出，用于在状态栏显示后台任务。
+    """
+
+    taskStarted = Signal(object)
+    taskProgress = Signal(object)
+    taskFinished = Signal(object)
+    # 其他线程发出，连接到主线程中的 _call
+    _posted = Signal(object)
+
+    def __init__(self, workers=4, log=None, parent=None):
+        super().__init__(parent)
+        self._posted.connect(self._call)
+        self.scheduler = Scheduler(workers, self._posted.emit, log)
+        self.scheduler.listeners.append(self._on_event)
+
+    def submit(self, func, *args, name=None, priority=NORMAL, key=None,
+               on_done=None, on_progress=None):
+        return self.scheduler.submit(
+            func, *args, name=name, priority=priority, key=key,
+            on_done=on_done, on_progress=on_progress
+        )
+
+    def cancel(self, task):
+        self.scheduler.cancel(task)
+
+    def shutdown(self, wait=False, timeout=None):
+        self.scheduler.shutdown(wait, timeout)
+
+    def _call(self, callback):
+        callback()
+
+    def _on_event(self, event, task):
+        {
+            'started': self.taskStarted,
+            'progress': self.taskProgress,
+            'finished': self.taskFinished
+        }[event].emit(task)
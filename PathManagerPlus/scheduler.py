@@ -0,0 +1,389 @@
+"""
+后台任务调度。
+
+载入数据、保存、扫描文件夹之类的后台任务都交给 Scheduler 运行：
+
+    task = scheduler.submit(func, *args, name='保存', priority=NORMAL)
+
+- func 的第一个参数是 Task，可以用 task.progress(done, total) 报告进度，
+  用 task.check() 或者 task.cancelled 检查是否已经被取消；
+- 普通函数在工作线程中运行，async 函数在调度器的 asyncio 事件循环中运行；
+- 同时运行的任务不超过 workers 个，其余的排队，优先级数值小的先运行，
+  同一优先级按提交顺序；
+- task.cancel() 取消任务：还在排队的直接丢掉；正在运行的 async 任务
+  会被 asyncio 取消，普通函数需要自己检查 task.cancelled。取消以后的
+  结果会被丢弃；
+- 提交时给出 key 的话，同一个 key 之前的任务会被取消，比如连续输入
+  搜索词时只保留最后一次搜索；
+- 每个任务记录排队和运行的时间，按名称汇总在 Scheduler.timings 中。
+
+调度器不依赖 Qt，命令行和测试中可以直接使用，用 task.wait() 等待结果。
+任务开始、进度、结束的通知以及 on_done、on_progress 回调都通过 post
+调用：默认直接在工作线程中调用，界面中使用 qt_scheduler.QtScheduler，
+回调在主线程中调用。
+
+工作线程都是 daemon 线程，程序退出时不会等待还没有完成的任务。
+"""
+import time
+import queue
+import asyncio
+import inspect
+import itertools
+import threading
+
+# 优先级，数值小的先运行
+INTERACTIVE = 0
+NORMAL = 10
+MAINTENANCE = 20
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class Cancelled(Exception):
+
+    """任务被取消，task.check() 抛出，任务函数也可以自己抛出。
+    """
+
+
+class Task:
+
+    """
+    Scheduler.submit 的返回值。
+
+    state 为 PENDING、RUNNING、DONE、FAILED、CANCELLED 之一，结束以后
+    result 是函数的返回值，error 是抛出的异常。时间都是 perf_counter。
+    """
+
+    def __init__(self, scheduler, func, args, name, priority, key,
+                 on_done, on_progress):
+        self.scheduler = scheduler
+        self.func = func
+        self.args = args
+        self.name = name
+        self.priority = priority
+        self.key = key
+        self.on_done = on_done
+        self.on_progress = on_progress
+        self.state = PENDING
+        self.result = None
+        self.error = None
+        self.done = 0
+        self.total = None
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._finished = threading.Event()
+        # 正在运行的 async 任务，取消时用到
+        self._future = None
+
+    def __repr__(self):
+        return f'<Task {self.name} {self.state}>'
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        """已经被取消时抛出 Cancelled，任务函数可以在循环中调用。
+        """
+        if self._cancel.is_set():
+            raise Cancelled()
+
+    def cancel(self):
+        self.scheduler.cancel(self)
+
+    def progress(self, done, total=None):
+        """报告进度，total 未知时为 None。
+        """
+        self.done = done
+        self.total = total
+        self.scheduler._notify('progress', self)
+
+    def is_finished(self):
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        """
+        等待任务结束并返回结果。任务失败时抛出原来的异常，被取消时抛出
+        Cancelled，超时抛出 TimeoutError。
+        """
+        if not self._finished.wait(timeout):
+            raise TimeoutError(f'{self.name} 没有在 {timeout} 秒内完成')
+        if self.state == CANCELLED:
+            raise Cancelled()
+        if self.state == FAILED:
+            raise self.error
+        return self.result
+
+    @property
+    def queue_time(self):
+        """排队等待的秒数。
+        """
+        end = self.started or self.finished
+        return None if end is None else end - self.submitted
+
+    @property
+    def run_time(self):
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+    def _begin(self):
+        with self._lock:
+            if self.state != PENDING:
+                return False
+            self.state = RUNNING
+            self.started = time.perf_counter()
+            return True
+
+
+def _work(jobs):
+    """工作线程：依次运行 jobs 中的函数，结果交回事件循环。
+    """
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        loop, future, func, args = job
+        try:
+            result = func(*args)
+        except BaseException as e:
+            outcome = (None, e)
+        else:
+            outcome = (result, None)
+        try:
+            loop.call_soon_threadsafe(_settle, future, *outcome)
+        except RuntimeError:
+            # 调度器已经关闭
+            pass
+
+
+def _settle(future, result, error):
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class Scheduler:
+
+    """
+    workers: 同时运行的任务数。
+    post(callback)：在哪里调用通知和回调，默认直接调用。
+    log：文件对象，每个任务结束时写入一行时间，None 时不输出。
+    """
+
+    def __init__(self, workers=4, post=None, log=None):
+        self.workers = workers
+        self.post = post or (lambda callback: callback())
+        self.log = log
+        # listener(事件, task)，事件为 started、progress、finished
+        self.listeners = []
+        # {任务名称: [次数, 总运行时间, 最长运行时间, 最长排队时间]}
+        self.timings = {}
+        self._lock = threading.Lock()
+        self._order = itertools.count()
+        self._active = set()
+        self._keys = {}
+        self._loop = None
+        self._queue = None
+        self._thread = None
+        self._closed = False
+
+    def submit(self, func, *args, name=None, priority=NORMAL, key=None,
+               on_done=None, on_progress=None):
+        """
+        提交任务，返回 Task。on_done(task) 在任务结束(包括失败和取消)时
+        调用，on_progress(task) 在报告进度时调用。
+        """
+        task = Task(self, func, args, name or func.__name__, priority, key,
+                    on_done, on_progress)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('调度器已经关闭')
+            self._start()
+            self._active.add(task)
+            previous = self._keys.get(key) if key is not None else None
+            if key is not None:
+                self._keys[key] = task
+        if previous is not None:
+            self.cancel(previous)
+        entry = (priority, next(self._order), task)
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, entry)
+        return task
+
+    def cancel(self, task):
+        """已经结束的任务不受影响。
+        """
+        with task._lock:
+            state = task.state
+            if state == PENDING:
+                # 还在队列中的任务，轮到它时直接跳过
+                task.state = CANCELLED
+            if state in (PENDING, RUNNING):
+                task._cancel.set()
+        if state == PENDING:
+            self._finish(task, CANCELLED)
+        elif state == RUNNING and task._future is not None:
+            self._loop.call_soon_threadsafe(task._future.cancel)
+
+    def cancel_all(self):
+        with self._lock:
+            tasks = list(self._active)
+        for task in tasks:
+            self.cancel(task)
+
+    def shutdown(self, wait=False, timeout=None):
+        """
+        取消所有任务并停止事件循环。wait 为 True 时等待正在运行的任务
+        结束(普通函数只有检查取消才会提前结束)。
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            tasks = list(self._active)
+        for task in tasks:
+            self.cancel(task)
+        if wait:
+            for task in tasks:
+                task._finished.wait(timeout)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            if wait:
+                self._thread.join(timeout)
+
+    def format_timings(self):
+        lines = ['任务时间：']
+        for name, (count, total, longest, queued) in self.timings.items():
+            lines.append(
+                f'  {name}  {count} 次  平均 {total / count * 1000:.1f} ms'
+                f'  最长 {longest * 1000:.1f} ms'
+                f'  最长排队 {queued * 1000:.1f} ms'
+            )
+        return '\n'.join(lines)
+
+    def _start(self):
+        """第一次提交任务时启动事件循环和工作线程。
+        """
+        if self._loop is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run_loop, args=(ready,), daemon=True,
+            name='PathManagerPlus-scheduler'
+        )
+        self._thread.start()
+        ready.wait()
+
+    def _run_loop(self, ready):
+        loop = self._loop
+        asyncio.set_event_loop(loop)
+        # Python 3.10 以前 Queue 绑定创建时的事件循环，需要在这个线程中创建
+        self._queue = asyncio.PriorityQueue()
+        dispatchers = []
+        for i in range(self.workers):
+            jobs = queue.SimpleQueue()
+            threading.Thread(
+                target=_work, args=(jobs,), daemon=True,
+                name=f'PathManagerPlus-worker-{i}'
+            ).start()
+            dispatchers.append(loop.create_task(self._dispatch(jobs)))
+        ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            for dispatcher in dispatchers:
+                dispatcher.cancel()
+            loop.run_until_complete(
+                asyncio.gather(*dispatchers, return_exceptions=True))
+            loop.close()
+
+    async def _dispatch(self, jobs):
+        """每个 dispatcher 对应一个工作线程，空闲时取优先级最高的任务。
+        """
+        try:
+            while True:
+                _, _, task = await self._queue.get()
+                if task._begin():
+                    await self._run(task, jobs)
+        finally:
+            jobs.put(None)
+
+    async def _run(self, task, jobs):
+        self._notify('started', task)
+        loop = asyncio.get_running_loop()
+        if inspect.iscoroutinefunction(task.func):
+            future = loop.create_task(task.func(task, *task.args))
+            task._future = future
+            if task.cancelled:
+                future.cancel()
+        else:
+            future = loop.create_future()
+            jobs.put((loop, future, task.func, (task,) + task.args))
+        try:
+            # 等待结束，不管任务本身是否被取消都不会抛出 CancelledError，
+            # 抛出的话就是调度器在关闭
+            await asyncio.wait([future])
+        except asyncio.CancelledError:
+            future.cancel()
+            self._finish(task, CANCELLED)
+            raise
+        error = None if future.cancelled() else future.exception()
+        if task.cancelled or future.cancelled() \
+                or isinstance(error, Cancelled):
+            self._finish(task, CANCELLED)
+        elif error is not None:
+            self._finish(task, FAILED, error=error)
+        else:
+            self._finish(task, DONE, future.result())
+
+    def _finish(self, task, state, result=None, error=None):
+        task.state = state
+        task.result = result
+        task.error = error
+        task.finished = time.perf_counter()
+        with self._lock:
+            self._active.discard(task)
+            if task.key is not None and self._keys.get(task.key) is task:
+                del self._keys[task.key]
+            if task.started is not None:
+                self._record(task)
+        task._finished.set()
+        self._notify('finished', task)
+
+    def _record(self, task):
+        timing = self.timings.setdefault(task.name, [0, 0.0, 0.0, 0.0])
+        timing[0] += 1
+        timing[1] += task.run_time
+        timing[2] = max(timing[2], task.run_time)
+        timing[3] = max(timing[3], task.queue_time)
+        if self.log is not None:
+            print(
+                f'{task.name}：排队 {task.queue_time * 1000:.1f} ms，'
+                f'运行 {task.run_time * 1000:.1f} ms，{task.state}',
+                file=self.log
+            )
+
+    def _notify(self, event, task):
+        callback = {'finished': task.on_done,
+                    'progress': task.on_progress}.get(event)
+        listeners = list(self.listeners)
+
+        def deliver():
+            for listener in listeners:
+                listener(event, task)
+            if callback is not None:
+                callback(task)
+
+        if callback is not None or listeners:
+            self.post(deliver)
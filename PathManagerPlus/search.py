@@ -0,0 +1,672 @@
+"""
+搜索功能：查询语句解析，按字段维护的倒排索引，以及查询计划。
+
+查询语法（多个条件之间是 AND 关系，不区分大小写）：
+
+    report                  名称、路径、备注中任意一个包含 report
+    name:report             只在名称中查找
+    path:"/mnt/my share"    值里面有空格时用双引号括起来
+    comment:old             只在备注中查找
+    ext:xlsx                扩展名精确匹配，写成 ext:.xlsx 也可以
+    scheme:http             路径类型：http / ftp / unc / local
+    -comment:old            条件前面加 - 表示排除
+    pinyin:cg / py:cg       名称的拼音全拼或首字母，比如 cg 可以找到“常规”
+
+不带字段的纯字母搜索词同时也会匹配名称的拼音。
+不认识的字段前缀（比如 C:\\Users）按普通文本处理。
+"""
+import os
+import re
+import time
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+
+from .pinyin import PinyinIndex, has_hanzi, is_pinyin_query, to_pinyin
+
+
+TEXT_FIELDS = ('name', 'path', 'comment')
+PINYIN_FIELD = 'pinyin'
+KEYWORD_FIELDS = ('ext', 'scheme')
+FIELDS = TEXT_FIELDS + (PINYIN_FIELD,) + KEYWORD_FIELDS
+FIELD_ALIASES = {
+    'py': PINYIN_FIELD,
+}
+SCHEMES = ('http', 'ftp', 'unc', 'local')
+SCHEME_ALIASES = {
+    'https': 'http',
+    'ftps': 'ftp',
+    'file': 'local',
+}
+
+# 校验一个候选项的代价，大约相当于在词表(Vocabulary)中比较这么多个词
+FILTER_COST = 100
+
+_QUERY_TOKEN = re.compile(r'(-?)(?:([A-Za-z]+):)?(?:"([^"]*)"|(\S+))')
+_WORD = re.compile(r'[^\W_]+')
+_PATH_SEP = re.compile(r'[\\/]')
+
+
+def get_path_scheme(path):
+    """
+    路径的类型，和 MainWindow.handle_open_file 的判断顺序保持一致。
+    """
+    if not path:
+        return None
+    if path.startswith('http'):
+        return 'http'
+    if path.startswith('ftp'):
+        return 'ftp'
+    if path.startswith('\\\\'):
+        return 'unc'
+    return 'local'
+
+
+def get_path_ext(path):
+    """
+    返回不带点的小写扩展名，没有扩展名时返回空字符串。
+    windows 和 linux 的路径分隔符都要考虑到。
+    """
+    if not path:
+        return ''
+    name = _PATH_SEP.split(path.rstrip('\\/'))[-1]
+    return os.path.splitext(name)[1][1:].lower()
+
+
+def _lower(value):
+    return value.lower() if value else ''
+
+
+def _words(text):
+    return set(_WORD.findall(text))
+
+
+class Term:
+
+    """查询中的一个条件。field 为 None 时表示 name/path/comment 任意字段，
+    如果值是纯字母，还会匹配名称的拼音。
+    """
+
+    def __init__(self, field, value, negate=False):
+        self.field = field
+        self.negate = negate
+        if field == 'ext':
+            value = value.lower().lstrip('.')
+        elif field == 'scheme':
+            value = value.lower()
+            value = SCHEME_ALIASES.get(value, value)
+        else:
+            value = value.lower()
+        self.value = value
+
+    @property
+    def text_fields(self):
+        """需要查找的文本字段，包括 pinyin。
+        """
+        if self.field is None:
+            if is_pinyin_query(self.value):
+                return TEXT_FIELDS + (PINYIN_FIELD,)
+            return TEXT_FIELDS
+        if self.field in KEYWORD_FIELDS:
+            return ()
+        return (self.field,)
+
+    def match(self, item, spelling=None):
+        """
+        不考虑 negate，只判断该项是否满足条件本身。
+        spelling: 名称的 (全拼, 首字母)，有索引时由索引提供；为 None 时
+        在需要的时候现场转换。
+        """
+        if self.field == 'ext':
+            return get_path_ext(item.get('path')) == self.value
+        if self.field == 'scheme':
+            return get_path_scheme(item.get('path')) == self.value
+        for field in self.text_fields:
+            if field == PINYIN_FIELD:
+                if spelling is None:
+                    name = item.get('name')
+                    spelling = to_pinyin(name) if has_hanzi(name) else ()
+                if any(self.value in text for text in spelling):
+                    return True
+            elif self.value in _lower(item.get(field)):
+                return True
+        return False
+
+    def accept(self, item, spelling=None):
+        return self.match(item, spelling) != self.negate
+
+    def __str__(self):
+        value = self.value
+        if not value or re.search(r'\s', value):
+            value = f'"{value}"'
+        prefix = '-' if self.negate else ''
+        if self.field is None:
+            return f'{prefix}{value}'
+        return f'{prefix}{self.field}:{value}'
+
+    __repr__ = __str__
+
+
+def parse_query(text):
+    """把查询字符串解析成 Term 列表。
+    """
+    terms = []
+    for match in _QUERY_TOKEN.finditer(text):
+        negate, field, quoted, bare = match.groups()
+        value = quoted if quoted is not None else bare
+        if field is not None:
+            field = FIELD_ALIASES.get(field.lower(), field)
+            if field.lower() in FIELDS:
+                field = field.lower()
+            else:
+                # 不是已知字段，比如 C:\Users，整个当作普通文本
+                value = f'{field}:{value}'
+                field = None
+        if not value:
+            if negate and field is None:
+                # 单独的一个 -
+                terms.append(Term(None, '-'))
+            continue
+        terms.append(Term(field, value, bool(negate)))
+    return terms
+
+
+class Vocabulary:
+
+    """
+    一个字段的词表，用换行把所有的词连接成一个字符串。在词表里面查找
+    前缀、后缀和包含关系时直接在这个字符串上用 str.find 搜索，比逐个
+    比较词快很多。词表有变化时标记为过期，下次查找时重新生成。
+    """
+
+    def __init__(self):
+        self.text = None
+        self.keys = None
+        self.starts = None
+
+    def invalidate(self):
+        self.text = None
+
+    def build(self, postings):
+        # 多个读线程可能同时生成词表，生成好以后才替换，查找时不会用到
+        # 生成了一半的列表
+        keys = list(postings)
+        starts = []
+        position = 1
+        for key in keys:
+            starts.append(position)
+            position += len(key) + 1
+        self.keys, self.starts = keys, starts
+        self.text = '\n' + '\n'.join(keys) + '\n'
+
+    def find(self, postings, word, prefix=False, suffix=False):
+        """返回以 word 开头(prefix)、结尾(suffix)或者包含 word 的词。
+        """
+        if self.text is None:
+            self.build(postings)
+        text = self.text
+        keys = self.keys
+        starts = self.starts
+        if prefix:
+            needle = '\n' + word
+            shift = 1
+        elif suffix:
+            needle = word + '\n'
+            shift = 0
+        else:
+            needle = word
+            shift = 0
+        found = []
+        position = 0
+        while True:
+            position = text.find(needle, position)
+            if position < 0:
+                break
+            index = bisect_right(starts, position + shift) - 1
+            found.append(keys[index])
+            # 同一个词里面不需要再找，跳到下一个词
+            position = starts[index] + len(keys[index]) + 1 - shift
+        return found
+
+
+class SearchIndex:
+
+    """
+    按字段维护的倒排索引。
+
+    文本字段(name, path, comment)按“词”建立倒排表，词是连续的字母、数字
+    或汉字。查询值被切成词以后，两边都被分隔符包住的词必须和项中的某个词
+    完全相同，只有一边被包住的词必须是某个词的前缀或后缀，其余情况在词表
+    里面查找包含关系。这样得到的是候选集，最后还要用原始字段校验一遍。
+
+    含有汉字的名称会预先转换成拼音，全拼和首字母作为 pinyin 字段的词。
+
+    ext 和 scheme 是精确值，直接对应倒排表。
+
+    索引在第一次搜索时才建立，之后由 DataStorage 的增删改接口增量维护。
+    """
+
+    def __init__(self):
+        self.built = False
+        self.order = {}
+        self.text_postings = {}
+        self.vocabularies = {}
+        self.keyword_postings = {}
+        self.pinyin = PinyinIndex()
+        self._next_order = 0
+
+    def build(self, items):
+        self.order = {}
+        self.text_postings = {
+            field: {} for field in TEXT_FIELDS + (PINYIN_FIELD,)
+        }
+        self.vocabularies = {
+            field: Vocabulary() for field in self.text_postings
+        }
+        self.keyword_postings = {field: {} for field in KEYWORD_FIELDS}
+        self.pinyin.build(())
+        self._next_order = 0
+        self.built = True
+        for item_id, item in items.items():
+            self.add(item_id, item)
+
+    def _keys(self, item, spelling=None):
+        keys = {}
+        for field in TEXT_FIELDS:
+            keys[field] = _words(_lower(item.get(field)))
+        keys[PINYIN_FIELD] = _words(' '.join(spelling)) if spelling else set()
+        path = item.get('path')
+        keys['ext'] = {get_path_ext(path)}
+        scheme = get_path_scheme(path)
+        keys['scheme'] = {scheme} if scheme else set()
+        return keys
+
+    def _postings(self, field):
+        if field in self.text_postings:
+            return self.text_postings[field]
+        return self.keyword_postings[field]
+
+    def _add_keys(self, item_id, keys):
+        for field, values in keys.items():
+            postings = self._postings(field)
+            for value in values:
+                ids = postings.get(value)
+                if ids is None:
+                    ids = postings[value] = set()
+                    if field in self.vocabularies:
+                        self.vocabularies[field].invalidate()
+                ids.add(item_id)
+
+    def _remove_keys(self, item_id, keys):
+        for field, values in keys.items():
+            postings = self._postings(field)
+            for value in values:
+                ids = postings.get(value)
+                if ids is None:
+                    continue
+                ids.discard(item_id)
+                if not ids:
+                    del postings[value]
+                    if field in self.vocabularies:
+                        self.vocabularies[field].invalidate()
+
+    def add(self, item_id, item):
+        if not self.built:
+            return
+        self.order[item_id] = self._next_order
+        self._next_order += 1
+        self.pinyin.set(item_id, item.get('name'))
+        self._add_keys(item_id, self._keys(item, self.pinyin.get(item_id)))
+
+    def remove(self, item_id, item):
+        if not self.built:
+            return
+        self.order.pop(item_id, None)
+        spelling = self.pinyin.get(item_id)
+        self.pinyin.discard(item_id)
+        self._remove_keys(item_id, self._keys(item, spelling))
+
+    def update(self, item_id, old_item, new_item):
+        if not self.built:
+            return
+        old_keys = self._keys(old_item, self.pinyin.get(item_id))
+        self.pinyin.set(item_id, new_item.get('name'))
+        new_keys = self._keys(new_item, self.pinyin.get(item_id))
+        for field in old_keys:
+            removed = old_keys[field] - new_keys[field]
+            added = new_keys[field] - old_keys[field]
+            self._remove_keys(item_id, {field: removed})
+            self._add_keys(item_id, {field: added})
+
+    def estimate(self, term):
+        """
+        估计条件命中的数量，用于决定执行顺序。返回 None 表示
+        只能在词表里面查找包含关系，代价和词表大小相关，无法估计。
+        """
+        if term.field in KEYWORD_FIELDS:
+            return len(self.keyword_postings[term.field].get(term.value, ()))
+        total = 0
+        for field in term.text_fields:
+            postings = self.text_postings[field]
+            sizes = [
+                len(postings.get(word, ()))
+                for word, left, right in self._split(term.value)
+                if left and right
+            ]
+            if not sizes:
+                return None
+            total += min(sizes)
+        return total
+
+    def vocabulary_size(self, term):
+        return sum(
+            len(self.text_postings[field]) for field in term.text_fields
+        )
+
+    def indexable(self, term):
+        if term.field in KEYWORD_FIELDS:
+            return True
+        return bool(_WORD.search(term.value))
+
+    def exact(self, term):
+        """
+        lookup 的结果是否就是准确的结果，不需要再校验。值只有一个词时，
+        包含这个值的词一定来自包含这个值的字段。
+        """
+        if term.field in KEYWORD_FIELDS:
+            return True
+        return _WORD.fullmatch(term.value) is not None
+
+    def build_vocabularies(self):
+        """提前生成词表，第一次查找包含关系时不需要等待。
+        """
+        for field, vocabulary in self.vocabularies.items():
+            if vocabulary.text is None:
+                vocabulary.build(self.text_postings[field])
+
+    def lookup(self, term):
+        """
+        返回候选 id 集合（可能多于真实结果，需要再校验）。返回的可能是
+        索引内部的集合，调用方不能修改。
+        """
+        if term.field in KEYWORD_FIELDS:
+            return self.keyword_postings[term.field].get(term.value, set())
+        result = set()
+        for field in term.text_fields:
+            result |= self._lookup_text(field, term.value)
+        return result
+
+    @staticmethod
+    def _split(value):
+        """切词，同时标记词的左右两边是否被分隔符包住。
+        """
+        words = []
+        for match in _WORD.finditer(value):
+            left = match.start() > 0
+            right = match.end() < len(value)
+            words.append((match.group(), left, right))
+        return words
+
+    def _lookup_text(self, field, value):
+        postings = self.text_postings[field]
+        words = self._split(value)
+        # 完全匹配的词代价最低，先处理
+        words.sort(key=lambda x: not (x[1] and x[2]))
+        result = None
+        for word, left, right in words:
+            if left and right:
+                ids = postings.get(word, set())
+            else:
+                if result is not None \
+                        and len(result) * FILTER_COST < len(postings):
+                    # 候选已经比词表还少了，剩下的交给校验
+                    break
+                ids = set()
+                keys = self.vocabularies[field].find(
+                    postings, word, prefix=left, suffix=right)
+                for key in keys:
+                    ids |= postings[key]
+            result = set(ids) if result is None else result & ids
+            if not result:
+                break
+        return result if result is not None else set()
+
+
+class PlanStep:
+
+    def __init__(self, term, action, estimate=None):
+        self.term = term
+        # lookup: 查索引取交集; filter: 逐个校验候选
+        self.action = action
+        self.estimate = estimate
+        self.output = None
+
+    def describe(self):
+        if self.action == 'lookup':
+            estimate = '?' if self.estimate is None else self.estimate
+            text = f'索引查找 (估计 {estimate})'
+        elif self.action == 'scan':
+            text = '全表扫描'
+        else:
+            text = '校验候选'
+        if self.output is not None:
+            text += f' -> {self.output}'
+        return f'{self.term}  {text}'
+
+
+class QueryPlan:
+
+    """
+    查询计划。先按估计的命中数从少到多使用索引求交集，得到候选集；
+    无法使用索引的条件和排除条件最后对候选集逐个校验。
+    索引还没有建立时，全部条件都在全表扫描时校验。
+    """
+
+    def __init__(self, terms, items, index=None, scope=None, label=None):
+        """
+        scope: 可选，接受 item id 返回 bool 的函数，用来把结果限定在某个
+        范围内（比如某个节点及其子节点），在校验之前对候选集过滤。
+        label: scope 的说明文字，用于 explain。
+        """
+        self.terms = terms
+        self.items = items
+        self.index = index if index is not None and index.built else None
+        self.scope = scope
+        self.scope_label = label
+        self.scope_output = None
+        self.steps = []
+        self.elapsed = None
+        self.result_count = None
+        self.cached = False
+        self._plan()
+
+    def _plan(self):
+        positive = [term for term in self.terms if not term.negate]
+        negative = [term for term in self.terms if term.negate]
+        if self.index is None:
+            self.steps = [PlanStep(term, 'filter') for term in self.terms]
+            return
+        indexed = []
+        unindexed = []
+        for term in positive:
+            if self.index.indexable(term):
+                indexed.append((term, self.index.estimate(term)))
+            else:
+                unindexed.append(term)
+        # 估计值为 None 的排在最后，它们之间按词表大小排序
+        indexed.sort(key=lambda x: (
+            x[1] is None,
+            x[1] if x[1] is not None else self.index.vocabulary_size(x[0])
+        ))
+        for term, estimate in indexed:
+            self.steps.append(PlanStep(term, 'lookup', estimate))
+        for term in unindexed + negative:
+            self.steps.append(PlanStep(term, 'filter'))
+
+    def _ordered(self, ids):
+        order = self.index.order
+        return sorted(ids, key=order.__getitem__)
+
+    def execute(self):
+        """返回排好序的 item id 列表。
+        """
+        start = time.perf_counter()
+        if self.index is None:
+            result = self._execute_scan()
+        else:
+            result = self._execute_indexed()
+        self.result_count = len(result)
+        self.elapsed = time.perf_counter() - start
+        return result
+
+    def _in_scope(self, ids):
+        if self.scope is None:
+            return ids
+        ids = [item_id for item_id in ids if self.scope(item_id)]
+        self.scope_output = len(ids)
+        return ids
+
+    def _execute_scan(self):
+        items = self.items
+        result = [
+            item_id for item_id in self._in_scope(items)
+            if all(term.accept(items[item_id]) for term in self.terms)
+        ]
+        for step in self.steps:
+            step.output = len(result)
+        return result
+
+    def _execute_indexed(self):
+        items = self.items
+        candidates = None
+        checks = []
+        for step in self.steps:
+            if step.action == 'lookup':
+                vocabulary = self.index.vocabulary_size(step.term)
+                if candidates is not None and (
+                        step.estimate is None
+                        and len(candidates) * FILTER_COST < vocabulary
+                        or step.estimate is not None
+                        and len(candidates) < step.estimate):
+                    # 候选已经很少了，直接校验比查索引便宜
+                    step.action = 'filter'
+                    checks.append(step)
+                    continue
+                ids = self.index.lookup(step.term)
+                candidates = ids if candidates is None else candidates & ids
+                step.output = len(candidates)
+                if not self.index.exact(step.term):
+                    # 文本索引给出的是候选，还需要校验
+                    checks.append(step)
+            else:
+                checks.append(step)
+        if candidates is None:
+            self.steps.insert(0, PlanStep(Term(None, '*'), 'scan'))
+            candidates = items.keys()
+        if not checks:
+            # 索引给出的已经是准确的结果
+            return self._ordered(self._in_scope(candidates))
+        result = []
+        spellings = self.index.pinyin
+        for item_id in self._in_scope(candidates):
+            item = items[item_id]
+            spelling = spellings.get(item_id, ())
+            if all(step.term.accept(item, spelling) for step in checks):
+                result.append(item_id)
+        for step in checks:
+            if step.action == 'filter':
+                step.output = len(result)
+        return self._ordered(result)
+
+    def explain(self):
+        lines = [f'查询: {" ".join(str(term) for term in self.terms)}']
+        if self.index is None:
+            lines.append('索引: 未建立，全表扫描')
+        else:
+            lines.append(f'索引: 已建立 ({len(self.index.order)} 项)')
+        if self.scope is not None:
+            text = f'范围: {self.scope_label or "自定义"}'
+            if self.scope_output is not None:
+                text += f' -> {self.scope_output}'
+            lines.append(text)
+        for number, step in enumerate(self.steps, 1):
+            lines.append(f'{number}. {step.describe()}')
+        if self.cached:
+            lines.append(f'结果: {self.result_count} 项, 来自缓存')
+        elif self.elapsed is not None:
+            lines.append(
+                f'结果: {self.result_count} 项, '
+                f'耗时 {self.elapsed * 1000:.2f} ms'
+            )
+        return '\n'.join(lines)
+
+
+class QueryCache:
+
+    """
+    最近查询结果的 LRU 缓存。
+
+    每个结果记录计算时 DataStorage 的 generation，取出时由调用方判断
+    在那之后有没有发生会影响结果的修改，没有的话就直接复用。
+    多个读线程会同时查询，所以有自己的锁。
+    """
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def get(self, key, is_fresh):
+        """
+        is_fresh: 接受结果的 generation，返回结果是否仍然有效。
+        没有可用的结果时返回 None。
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            generation, result = entry
+            if not is_fresh(generation):
+                del self._entries[key]
+                self.stale += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, generation, result):
+        result = tuple(result)
+        with self._lock:
+            self._entries[key] = (generation, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def info(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+        }
+
+    def describe(self):
+        info = self.info()
+        return (
+            f'查询缓存: 命中 {info["hits"]}, 未命中 {info["misses"]} '
+            f'(过期 {info["stale"]}), 淘汰 {info["evictions"]}, '
+            f'{info["size"]}/{info["maxsize"]}'
+        )
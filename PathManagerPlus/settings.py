@@ -5,6 +5,10 @@ PROJECT_PATH = os.path.dirname(os.path.abspath(__file__))
 STATIC_PATH = os.path.join(PROJECT_PATH, 'static')
 DATABASE = os.path.join(PROJECT_PATH, 'data.json')
 CONFIG_FILE = os.path.join(PROJECT_PATH, 'config.json')
+# 检测系统环境(比如有哪些终端)的结果，PATH 改变后重新检测
+PROBE_CACHE = os.path.join(PROJECT_PATH, 'probe_cache.json')
+# 界面卡顿的记录，配置文件中设置 stall_watchdog 以后才会写入
+STALL_LOG = os.path.join(PROJECT_PATH, 'stalls.log')
 ICON_PATH = os.path.join(STATIC_PATH, 'icons')
 QSS_PATH = os.path.join(STATIC_PATH, 'qss')
 
@@ -19,3 +23,6 @@ SETTINGS_ICON_PATH = os.path.join(ICON_PATH, 'settings.ico')
 WINDOWS_QSS_PATH = os.path.join(QSS_PATH, 'windows.qss')
 LINUX_QSS_PATH = os.path.join(QSS_PATH, 'linux.qss')
 MAC_QSS_PATH = os.path.join(QSS_PATH, 'mac.qss')
+
+# 拼音搜索使用的汉字拼音对照表
+PINYIN_TABLE_PATH = os.path.join(STATIC_PATH, 'pinyin.txt')
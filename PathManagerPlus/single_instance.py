@@ -0,0 +1,213 @@
+"""
+单实例运行。
+
+已经有窗口打开时，再次启动程序不会再打开一个窗口，而是把命令行参数
+(要添加的路径、要搜索的内容)交给已经打开的窗口，然后马上退出。
+
+已经打开的窗口通过 QLocalServer 监听(见 instance_server)，Linux 和 macOS
+上是 Unix 套接字，Windows 上是命名管道。这里的客户端只用标准库，转交
+请求的时候不需要导入 PySide6，也不需要读取数据文件。
+
+Unix 套接字放在只有当前用户可以访问的文件夹中(见 runtime_dir)，连接前
+还会检查套接字属于当前用户，不会把请求发给其他用户伪造的套接字。
+
+请求是一行 JSON：{"paths": [...], "search": "...", "cwd": "..."}，
+对方处理后回复一行 ok。
+"""
+import os
+import sys
+import json
+import stat
+import socket
+import hashlib
+import getpass
+import argparse
+import tempfile
+
+from .settings import DATABASE
+
+
+def instance_key(database=DATABASE):
+    """
+    同一个用户、同一个数据文件对应同一个 key，使用不同数据文件的程序
+    可以同时运行。
+    """
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = 'user'
+    return hashlib.sha1(
+        f'{user}:{os.path.abspath(database)}'.encode('utf-8')).hexdigest()[:12]
+
+
+class UnsafeSocketError(OSError):
+
+    """放套接字的文件夹或者套接字本身不属于当前用户，或者其他用户可以
+    访问。
+    """
+
+
+def _is_private_dir(path):
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISDIR(st.st_mode) and st.st_uid == os.getuid() \
+        and not st.st_mode & 0o077
+
+
+def runtime_dir():
+    """
+    放 Unix 套接字的文件夹，只有当前用户可以访问。优先使用
+    XDG_RUNTIME_DIR；没有时在临时文件夹中建立 PathManagerPlus-<uid>，
+    权限是 0700。文件夹已经存在但是不属于当前用户，或者其他用户可以
+    访问时抛出 UnsafeSocketError。
+    """
+    path = os.environ.get('XDG_RUNTIME_DIR')
+    if path and _is_private_dir(path):
+        return path
+    path = os.path.join(
+        tempfile.gettempdir(), f'PathManagerPlus-{os.getuid()}')
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    if not _is_private_dir(path):
+        raise UnsafeSocketError(f'放套接字的文件夹不安全：{path}')
+    return path
+
+
+def check_socket(path):
+    """
+    连接前检查套接字属于当前用户，不是时抛出 UnsafeSocketError，不存在时
+    抛出 FileNotFoundError。
+    """
+    st = os.lstat(path)
+    if not stat.S_ISSOCK(st.st_mode) or st.st_uid != os.getuid():
+        raise UnsafeSocketError(f'套接字不属于当前用户：{path}')
+
+
+def server_name(database=DATABASE):
+    name = f'PathManagerPlus-{instance_key(database)}'
+    if os.name == 'nt':
+        return name
+    # QLocalServer 遇到绝对路径时直接使用，和客户端连接的是同一个文件
+    return os.path.join(runtime_dir(), name + '.sock')
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='PathManagerPlus',
+        description='打开窗口；已经有窗口打开时把请求交给它。'
+    )
+    parser.add_argument('paths', nargs='*', help='添加到当前节点的路径')
+    parser.add_argument('-s', '--search', help='搜索的内容')
+    parser.add_argument(
+        '--new-instance', action='store_true', help='总是打开新的窗口')
+    parser.add_argument(
+        '--profile-startup', action='store_true',
+        help='打开新的窗口，输出启动过程中每个阶段的时间')
+    args = parser.parse_args(argv)
+    return {
+        'paths': args.paths,
+        'search': args.search,
+        'cwd': os.getcwd(),
+        'new_instance': args.new_instance or args.profile_startup,
+        'profile_startup': args.profile_startup
+    }
+
+
+def encode_request(request):
+    request = {
+        key: request.get(key) for key in ('paths', 'search', 'cwd')
+    }
+    return json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def decode_request(line):
+    """解析收到的一行，格式不对时返回 None。
+    """
+    try:
+        request = json.loads(line.decode('utf-8'))
+    except ValueError:
+        return None
+    if not isinstance(request, dict):
+        return None
+    paths = request.get('paths') or []
+    if not isinstance(paths, list):
+        return None
+    cwd = request.get('cwd') or ''
+    # 相对路径以发出请求的程序的当前文件夹为准
+    request['paths'] = [
+        os.path.abspath(os.path.join(cwd, str(path))) for path in paths
+    ]
+    return request
+
+
+def _send_unix(name, content, timeout):
+    check_socket(name)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(name)
+        sock.sendall(content)
+        reply = b''
+        while not reply.endswith(b'\n'):
+            chunk = sock.recv(64)
+            if not chunk:
+                break
+            reply += chunk
+    return reply
+
+
+def _send_pipe(name, content, timeout):
+    # 命名管道不支持超时，对方正常运行时马上就会回复
+    with open(r'\\.\pipe' + '\\' + name, 'r+b', buffering=0)as pipe:
+        pipe.write(content)
+        return pipe.readline()
+
+
+def is_running(name=None):
+    """
+    只检查能不能连接上，不等待回复：对方正在忙(比如正在载入数据)的时候
+    也算在运行。不属于当前用户的套接字不算。
+    """
+    try:
+        name = name or server_name()
+        if os.name == 'nt':
+            open(r'\\.\pipe' + '\\' + name, 'r+b', buffering=0).close()
+        else:
+            check_socket(name)
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(0.5)
+                sock.connect(name)
+    except OSError:
+        return False
+    return True
+
+
+def send_request(request, name=None, timeout=2.0):
+    """
+    把请求交给已经打开的窗口，成功返回 True。没有窗口在运行(或者套接字
+    是上次异常退出留下的)时返回 False。
+    """
+    content = encode_request(request)
+    try:
+        name = name or server_name()
+        if os.name == 'nt':
+            reply = _send_pipe(name, content, timeout)
+        else:
+            reply = _send_unix(name, content, timeout)
+    except OSError:
+        return False
+    return reply.strip() == b'ok'
+
+
+def hand_off(argv=None):
+    """
+    解析命令行参数，有窗口在运行时把请求交给它，返回 None；否则返回
+    请求，由调用方打开新的窗口。
+    """
+    request = parse_args(sys.argv[1:] if argv is None else argv)
+    if not request['new_instance'] and send_request(request):
+        return None
+    return request
@@ -0,0 +1,133 @@
+"""
+数据的只读快照，给保存、扫描、导出之类的后台任务使用。
+
+拍快照只是记下当时的 nodes 和 items 两张表，不复制任何记录，是 O(1) 的。
+之后 DataStorage 修改数据时采用写时复制：第一次修改某条记录之前，先把
+旧的记录交给还在使用的快照(记在快照的 overlay 中)，再用修改后的副本
+替换表中的记录，原来的记录本身不会被改动。所以只有被修改的记录(以及
+节点被修改的 items、sub_nodes 列表)会被复制。
+
+快照读取时先读表中现在的记录，再看 overlay：overlay 中有的以 overlay
+为准。写入方总是先写 overlay 再改表，读取方按相反的顺序读，两边都不
+需要加锁，读到的总是拍快照时的数据，不会看到修改了一半的结果(比如
+move_item_to_node 改了项但还没有改节点的列表)。这依赖于 dict 的单个
+操作在 GIL 下是原子的。
+"""
+from collections.abc import Mapping
+
+# 拍快照时不存在的记录
+MISSING = object()
+
+
+class SnapshotTable(Mapping):
+
+    """快照中的一张表(nodes 或者 items)，用法和 dict 相同，但是只读。
+    """
+
+    def __init__(self, live):
+        self.live = live
+        # {id: 拍快照时的记录或者 MISSING}，只增加不删除
+        self.overlay = {}
+
+    def preserve(self, key, old):
+        """记录 key 在拍快照时的版本，只有第一次有效。
+        """
+        if key not in self.overlay:
+            self.overlay[key] = old
+
+    def __getitem__(self, key):
+        value = self.live.get(key, MISSING)
+        value = self.overlay.get(key, value)
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        # list(dict) 和 dict(dict) 都是一次完成的，不会遇到遍历期间
+        # 表被修改的错误
+        keys = list(self.live)
+        overlay = dict(self.overlay)
+        removed = [key for key, value in overlay.items()
+                   if value is not MISSING]
+        for key in keys:
+            if overlay.get(key) is not MISSING:
+                yield key
+        if removed:
+            present = set(keys)
+            for key in removed:
+                if key not in present:
+                    yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class Snapshot(Mapping):
+
+    """
+    DataStorage.snapshot() 的返回值，用法和数据本身相同：
+    snapshot['nodes'][node_id]、snapshot['items'][item_id]。
+    不再使用时调用 release()，或者直接丢掉。
+    """
+
+    TABLES = ('nodes', 'items')
+    # Mapping 按内容比较，不能作为集合的元素，DataStorage 需要把快照
+    # 放在 WeakSet 中
+    __hash__ = object.__hash__
+
+    def __init__(self, data):
+        self.generation = data.generation
+        self.tables = {key: SnapshotTable(data[key]) for key in self.TABLES}
+        self.others = {
+            key: value for key, value in data.items()
+            if key not in self.TABLES
+        }
+        self.released = False
+
+    def preserve(self, table, key, old):
+        self.tables[table].preserve(key, old)
+
+    def release(self):
+        self.released = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    def __getitem__(self, key):
+        if key in self.tables:
+            return self.tables[key]
+        return self.others[key]
+
+    def __iter__(self):
+        yield from self.tables
+        yield from self.others
+
+    def __len__(self):
+        return len(self.tables) + len(self.others)
+
+    def iter_subtree(self, node_id):
+        """和 DataStorage.iter_subtree 相同。
+        """
+        nodes = self.tables['nodes']
+        order = [node_id]
+        for current in order:
+            order.extend(nodes[current]['sub_nodes'])
+            yield current
+
+    def node_count(self):
+        return len(self.tables['nodes'])
+
+    def item_count(self):
+        return len(self.tables['items'])
+
+    def to_dict(self):
+        """
+        普通的 dict，记录是和数据共用的，不会再被修改(修改时会被替换)，
+        可以交给 json 等只接受 dict 的地方。
+        """
+        data = {key: dict(table) for key, table in self.tables.items()}
+        data.update(self.others)
+        return data
@@ -0,0 +1,19 @@
+"""
+程序入口。
+
+先尝试把请求交给已经打开的窗口，成功的话直接退出，不导入 PySide6
+也不读取数据文件；没有窗口在运行时才导入界面，打开新的窗口。
+"""
+# 最先导入，启动计时从这里开始
+from .startup_profile import profile
+from .single_instance import hand_off
+
+
+def main(argv=None):
+    request = hand_off(argv)
+    if request is None:
+        return
+    profile.mark('解析参数')
+    from .main import run_gui
+    profile.mark('导入界面模块')
+    run_gui(request)
@@ -0,0 +1,82 @@
+"""
+启动时间分析，看启动过程中每个阶段用了多少时间：
+
+    python run.py --profile-startup
+
+或者设置环境变量 PATHMANAGERPLUS_PROFILE=1。窗口第一次绘制完成以后，
+在 stderr 中输出每个阶段的时间。计时从导入这个模块开始(startup 最先导入
+它)，Python 解释器本身的启动时间不包括在内。
+
+没有打开时也会记录，只是不输出，记录一次只是读一下时钟。
+"""
+import os
+import sys
+import time
+import unicodedata
+
+
+def display_width(text):
+    """在终端中占的宽度，中文字符占两格。
+    """
+    return sum(
+        2 if unicodedata.east_asian_width(char) in 'WF' else 1
+        for char in text
+    )
+
+
+def pad(text, width):
+    return text + ' ' * (width - display_width(text))
+
+
+class StartupProfile:
+
+    """
+    mark(name)：上一次 mark 到现在的时间记为 name 阶段。
+    时钟可以替换，方便测试。
+    """
+
+    def __init__(self, enabled=False, clock=time.perf_counter):
+        self.enabled = enabled
+        self.clock = clock
+        self.start = clock()
+        self.last = self.start
+        # [(阶段名称, 秒数)]
+        self.phases = []
+        self.finished = False
+
+    def mark(self, name):
+        if self.finished:
+            return
+        now = self.clock()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    def total(self):
+        return self.last - self.start
+
+    def format(self):
+        width = max([display_width(name) for name, _ in self.phases] + [4])
+        lines = ['启动时间：']
+        elapsed = 0.0
+        for name, seconds in self.phases:
+            elapsed += seconds
+            lines.append(
+                f'  {pad(name, width)}  {seconds * 1000:7.1f} ms'
+                f'  {elapsed * 1000:7.1f} ms'
+            )
+        lines.append(
+            f'  {pad("合计", width)}  {self.total() * 1000:7.1f} ms')
+        return '\n'.join(lines)
+
+    def finish(self, name='第一次绘制', out=None):
+        """记录最后一个阶段，打开时输出结果。只有第一次调用有效。
+        """
+        if self.finished:
+            return
+        self.mark(name)
+        self.finished = True
+        if self.enabled:
+            print(self.format(), file=out or sys.stderr)
+
+
+profile = StartupProfile(os.environ.get('PATHMANAGERPLUS_PROFILE') == '1')
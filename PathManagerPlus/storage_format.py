@@ -0,0 +1,335 @@
+"""
+数据文件的格式。
+
+默认是 indent=4 的 JSON，每一项都重复写一遍完整的路径和 name、path、
+comment、parent_id 这些键，大部分字节都是重复的。紧凑格式(compact)：
+
+- 按列存储：每块最多 BLOCK 条记录，一块是一行 JSON 数组，数组的每个
+  元素是一列，键名不再重复；
+- 节点和项按树的层次顺序写入，parent 写成节点的序号并做游程编码，
+  节点的 items 和 sub_nodes 列表读取时按顺序重建，不需要写出来；
+- 路径做前缀编码(front coding)：只写和上一项路径相同的前缀长度以及
+  剩下的部分，同一个节点下的项通常在同一个文件夹中；
+- 名称是路径的结尾时(拖进来的文件都是这样)只写名称的长度。
+
+还可以再用 gzip 或者 lzma 压缩(compact-gz、compact-xz)。读取时按文件
+开头的几个字节判断格式，所以数据文件的名称不变，读进来是什么格式，
+保存时还用什么格式，可以用命令行的 convert 转换。
+
+写入是一块一块生成的(iter_encode)，读取也是一块一块解码的，不会先
+生成整个文件的文本。
+"""
+import io
+import json
+import lzma
+import zlib
+from itertools import chain, repeat
+
+FORMATS = ('json', 'compact', 'compact-gz', 'compact-xz')
+MAGIC = b'PathManagerPlus-compact 1\n'
+GZIP_MAGIC = b'\x1f\x8b'
+XZ_MAGIC = b'\xfd7zXZ\x00'
+# 每块的记录数，块越大压缩越好，解码时占用的临时内存也越多
+BLOCK = 4096
+
+NODE_FIELDS = ('name', 'parent_id', 'items', 'sub_nodes')
+ITEM_FIELDS = ('name', 'path', 'comment', 'parent_id')
+
+
+def detect_format(content):
+    """content: 文件开头的字节。
+    """
+    if content.startswith(GZIP_MAGIC):
+        return 'compact-gz'
+    if content.startswith(XZ_MAGIC):
+        return 'compact-xz'
+    if content.startswith(MAGIC):
+        return 'compact'
+    return 'json'
+
+
+def tree_order(data):
+    """
+    按层次顺序返回 (节点 id 列表, 项 id 列表)。数据的结构不一致(比如
+    列表中的项的 parent_id 不对，或者有不在树上的记录)时返回 None，
+    这样的数据不能用列表的顺序重建，只能保存为 JSON。
+    """
+    nodes = data['nodes']
+    items = data['items']
+    if 'root' not in nodes:
+        return None
+    # 快照的 len 需要遍历，只算一次
+    node_count = len(nodes)
+    item_count = len(items)
+    node_ids = ['root']
+    item_ids = []
+    for node_id in node_ids:
+        node = nodes[node_id]
+        for sub_node_id in node['sub_nodes']:
+            sub_node = nodes.get(sub_node_id)
+            if sub_node is None or sub_node['parent_id'] != node_id:
+                return None
+            node_ids.append(sub_node_id)
+        for item_id in node['items']:
+            item = items.get(item_id)
+            if item is None or item['parent_id'] != node_id:
+                return None
+            item_ids.append(item_id)
+        if len(node_ids) > node_count or len(item_ids) > item_count:
+            # 有环或者重复
+            return None
+    if len(node_ids) != node_count or len(item_ids) != item_count \
+            or len(set(item_ids)) != len(item_ids):
+        return None
+    return node_ids, item_ids
+
+
+def _runs(values):
+    """游程编码：[a, a, b] -> [[a, 2], [b, 1]]。
+    """
+    runs = []
+    for value in values:
+        if runs and runs[-1][0] == value:
+            runs[-1][1] += 1
+        else:
+            runs.append([value, 1])
+    return runs
+
+
+def _column(values):
+    """全是 None 的列写成 null。
+    """
+    return values if any(value is not None for value in values) else None
+
+
+def _extra(record, fields):
+    extra = {key: value for key, value in record.items() if key not in fields}
+    return extra or None
+
+
+def shared_prefix(a, b):
+    """a 和 b 相同前缀的长度，二分查找，每次比较切片。
+    """
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _dump(row):
+    return json.dumps(row, ensure_ascii=False, separators=(',', ':')) \
+        .encode('utf-8') + b'\n'
+
+
+def iter_compact(data, order):
+    """生成未压缩的紧凑格式，一次一行。
+    """
+    nodes = data['nodes']
+    items = data['items']
+    node_ids, item_ids = order
+    index = {node_id: i for i, node_id in enumerate(node_ids)}
+    header = {'nodes': len(node_ids), 'items': len(item_ids), 'block': BLOCK}
+    others = {key: value for key, value in data.items()
+              if key not in ('nodes', 'items')}
+    if others:
+        header['extra'] = others
+    yield MAGIC
+    yield _dump(header)
+    for start in range(0, len(node_ids), BLOCK):
+        block = node_ids[start:start + BLOCK]
+        records = [nodes[node_id] for node_id in block]
+        yield _dump([
+            'nodes',
+            block,
+            [record['name'] for record in records],
+            _runs([index.get(record['parent_id'], -1) for record in records]),
+            _column([_extra(record, NODE_FIELDS) for record in records]),
+        ])
+    previous = ''
+    for start in range(0, len(item_ids), BLOCK):
+        block = item_ids[start:start + BLOCK]
+        records = [items[item_id] for item_id in block]
+        names = []
+        prefixes = []
+        suffixes = []
+        for record in records:
+            path = record['path']
+            name = record['name']
+            if path is None:
+                prefixes.append(-1)
+                suffixes.append(None)
+                names.append(name)
+                continue
+            if not isinstance(path, str):
+                # 不是字符串的路径原样写出来，不做前缀编码
+                prefixes.append(-2)
+                suffixes.append(path)
+                names.append(name)
+                continue
+            shared = shared_prefix(path, previous)
+            prefixes.append(shared)
+            suffixes.append(path[shared:])
+            previous = path
+            names.append(len(name) if isinstance(name, str) and name and
+                         path.endswith(name) else name)
+        yield _dump([
+            'items',
+            block,
+            _runs([index[record['parent_id']] for record in records]),
+            names,
+            prefixes,
+            suffixes,
+            _column([record.get('comment') for record in records]),
+            _column([_extra(record, ITEM_FIELDS) for record in records]),
+        ])
+
+
+def _compress(chunks, compressor):
+    for chunk in chunks:
+        output = compressor.compress(chunk)
+        if output:
+            yield output
+    yield compressor.flush()
+
+
+def iter_encode(data, fmt='compact'):
+    """
+    按 fmt 编码数据，生成 bytes 块。紧凑格式不能表示结构不一致的数据，
+    这时退回到 JSON。
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'不支持的格式：{fmt}')
+    order = tree_order(data) if fmt != 'json' else None
+    if order is None:
+        if not isinstance(data, dict):
+            # 快照(snapshot.Snapshot)，json 只接受 dict
+            data = data.to_dict()
+        yield json.dumps(data, indent=4, ensure_ascii=False).encode('utf-8')
+        return
+    chunks = iter_compact(data, order)
+    if fmt == 'compact-gz':
+        # wbits=31 输出 gzip 格式，可以用 gzip 模块读取
+        chunks = _compress(chunks, zlib.compressobj(6, zlib.DEFLATED, 31))
+    elif fmt == 'compact-xz':
+        chunks = _compress(chunks, lzma.LZMACompressor())
+    yield from chunks
+
+
+def _expand(runs):
+    return list(chain.from_iterable(
+        repeat(value, count) for value, count in runs))
+
+
+def _decode_nodes(row, data, node_ids):
+    nodes = data['nodes']
+    _, block, names, parents, extras = row
+    for i, (node_id, name, parent) in enumerate(
+            zip(block, names, _expand(parents))):
+        parent_id = node_ids[parent] if parent >= 0 else None
+        node = {'name': name, 'parent_id': parent_id,
+                'items': [], 'sub_nodes': []}
+        if extras is not None and extras[i]:
+            node.update(extras[i])
+        nodes[node_id] = node
+        node_ids.append(node_id)
+        if parent_id is not None:
+            nodes[parent_id]['sub_nodes'].append(node_id)
+
+
+def _decode_items(row, data, node_ids, previous):
+    """返回这一块最后一个前缀编码的路径，下一块接着用。
+    """
+    nodes = data['nodes']
+    _, block, parents, names, prefixes, suffixes, comments, extras = row
+    count = len(block)
+    paths = []
+    for shared, suffix in zip(prefixes, suffixes):
+        if shared > 0:
+            previous = previous[:shared] + suffix
+        elif shared == 0:
+            previous = suffix
+        else:
+            # -1 没有路径，-2 不是字符串的路径
+            paths.append(suffix)
+            continue
+        paths.append(previous)
+    names = [
+        path[-name:] if type(name) is int else name
+        for name, path in zip(names, paths)
+    ]
+    parent_ids = [node_ids[parent] for parent in _expand(parents)]
+    records = [
+        {'name': name, 'path': path, 'comment': comment,
+         'parent_id': parent_id}
+        for name, path, comment, parent_id in zip(
+            names, paths, comments or repeat(None, count), parent_ids)
+    ]
+    if extras is not None:
+        for record, extra in zip(records, extras):
+            if extra:
+                record.update(extra)
+    data['items'].update(zip(block, records))
+    start = 0
+    for parent, run in parents:
+        nodes[node_ids[parent]]['items'].extend(block[start:start + run])
+        start += run
+    return previous
+
+
+def read_compact(lines):
+    """lines: 未压缩的紧凑格式的各行(bytes)。
+    """
+    lines = iter(lines)
+    if next(lines, None) != MAGIC:
+        raise ValueError('不是紧凑格式的数据文件')
+    header = json.loads(next(lines))
+    data = dict(header.get('extra') or {})
+    data['nodes'] = {}
+    data['items'] = {}
+    node_ids = []
+    previous = ''
+    for line in lines:
+        row = json.loads(line)
+        if row[0] == 'nodes':
+            _decode_nodes(row, data, node_ids)
+        elif row[0] == 'items':
+            previous = _decode_items(row, data, node_ids, previous)
+        else:
+            raise ValueError(f'不认识的数据块：{row[0]}')
+    if len(data['nodes']) != header['nodes'] \
+            or len(data['items']) != header['items']:
+        raise ValueError('数据文件不完整')
+    return data
+
+
+def _decompressed_lines(content, decompressor, chunk_size=1 << 18):
+    """一段一段地解压，按行生成，不会一次解压整个文件。
+    """
+    rest = b''
+    for start in range(0, len(content), chunk_size):
+        rest += decompressor.decompress(content[start:start + chunk_size])
+        lines = rest.split(b'\n')
+        rest = lines.pop()
+        for line in lines:
+            yield line + b'\n'
+    if rest:
+        yield rest
+
+
+def decode(content):
+    """content: 数据文件的全部字节。返回 (数据, 格式)。
+    """
+    fmt = detect_format(content)
+    if fmt == 'json':
+        return json.loads(content.decode('utf-8')), fmt
+    if fmt == 'compact-gz':
+        lines = _decompressed_lines(content, zlib.decompressobj(31))
+    elif fmt == 'compact-xz':
+        lines = _decompressed_lines(content, lzma.LZMADecompressor())
+    else:
+        lines = io.BytesIO(content)
+    return read_compact(lines), fmt
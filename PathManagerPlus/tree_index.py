@@ -0,0 +1,245 @@
+"""
+树结构上的辅助索引，只保存在内存中，不会写入数据文件。
+"""
+
+
+class EulerIntervals:
+
+    """
+    给每个节点分配一对编号 (enter, exit)，子孙节点的区间一定落在祖先节点
+    的区间里面，所以“X 是否在 N 下面”只需要比较两次编号。
+
+    编号之间预留了空隙：每个节点在子节点后面都有一段空闲编号，新加入或者
+    移动过来的子树从父节点的空闲编号中分走一半。空闲编号不够时，往上找到
+    一个空间充足的祖先，只重新编排这个祖先下面的子树。同级节点之间的顺序
+    和编号无关，所以调整节点顺序不需要改动编号。
+
+    Python 的整数没有上限，根节点的区间给得足够大，实际上很少需要重新编排。
+    """
+
+    ROOT_SPAN = 1 << 128
+    # 重新编排时每个节点至少能分到的编号数
+    MIN_WIDTH = 64
+
+    def __init__(self):
+        self.built = False
+        self.enter = {}
+        self.exit = {}
+        # 节点内已经用掉的最后一个编号，后面到 exit 之前都是空闲的
+        self.cursor = {}
+
+    def build(self, nodes):
+        self.enter = {'root': 0}
+        self.exit = {'root': self.ROOT_SPAN - 1}
+        self.cursor = {'root': 0}
+        self.built = True
+        sizes = self._subtree_sizes(nodes, 'root')
+        self._layout(nodes, 'root', 0, self.ROOT_SPAN, sizes)
+
+    def contains(self, ancestor_id, node_id):
+        """ancestor_id 是 node_id 本身或者它的祖先时返回 True。
+        """
+        ancestor_enter = self.enter.get(ancestor_id)
+        node_enter = self.enter.get(node_id)
+        if ancestor_enter is None or node_enter is None:
+            return False
+        return ancestor_enter <= node_enter \
+            and self.exit[node_id] <= self.exit[ancestor_id]
+
+    def place(self, nodes, node_id):
+        """
+        节点（连同它的子树）挂到新的父节点下面以后调用，新增节点也一样。
+        nodes 中的 parent_id 和 sub_nodes 需要已经更新好。
+        """
+        if not self.built:
+            return
+        parent_id = nodes[node_id]['parent_id']
+        sizes = self._subtree_sizes(nodes, node_id)
+        size = sizes[node_id]
+        free = self.exit[parent_id] - self.cursor[parent_id] - 1
+        width = free // 2
+        if width >= self.MIN_WIDTH * size:
+            start = self.cursor[parent_id] + 1
+            self.cursor[parent_id] = start + width - 1
+            self._layout(nodes, node_id, start, width, sizes)
+        else:
+            self._make_room(nodes, parent_id)
+
+    def discard(self, node_id):
+        self.enter.pop(node_id, None)
+        self.exit.pop(node_id, None)
+        self.cursor.pop(node_id, None)
+
+    def _subtree_sizes(self, nodes, node_id):
+        """子树中每个节点的子树大小（包括自己），不使用递归。
+        """
+        order = [node_id]
+        for current in order:
+            order.extend(nodes[current]['sub_nodes'])
+        sizes = {}
+        for current in reversed(order):
+            sizes[current] = 1 + sum(
+                sizes[sub_node] for sub_node in nodes[current]['sub_nodes']
+            )
+        return sizes
+
+    def _layout(self, nodes, node_id, start, width, sizes):
+        """
+        在 [start, start + width) 范围内编排 node_id 的整个子树。
+        每个节点按子树大小分到 unit * size 个编号，多出来的留作空闲。
+        """
+        unit = width // sizes[node_id]
+        stack = [(node_id, start, width)]
+        while stack:
+            current, start, width = stack.pop()
+            self.enter[current] = start
+            self.exit[current] = start + width - 1
+            position = start
+            for sub_node in nodes[current]['sub_nodes']:
+                sub_width = unit * sizes[sub_node]
+                stack.append((sub_node, position + 1, sub_width))
+                position += sub_width
+            self.cursor[current] = position
+
+    def _make_room(self, nodes, node_id):
+        """从 node_id 开始往上找空间足够的祖先，重新编排它的子树。
+        """
+        while True:
+            sizes = self._subtree_sizes(nodes, node_id)
+            width = self.exit[node_id] - self.enter[node_id] + 1
+            if width // sizes[node_id] >= self.MIN_WIDTH:
+                self._layout(
+                    nodes, node_id, self.enter[node_id], width, sizes)
+                return
+            parent_id = nodes[node_id]['parent_id']
+            if parent_id is None:
+                # 根节点没有上限，直接扩大
+                width = max(width * 4, sizes[node_id] * self.MIN_WIDTH * 4)
+                self._layout(nodes, node_id, self.enter[node_id], width, sizes)
+                return
+            node_id = parent_id
+
+
+class NodeCounts:
+
+    """
+    每个节点直接挂载的项数(direct)和包括所有子节点在内的项数(total)。
+
+    项的增删和移动只需要沿着祖先链更新 total，代价是 O(深度)。批量操作
+    先把每个祖先上的变化量累加起来，最后每个祖先只更新一次。
+    """
+
+    def __init__(self):
+        self.built = False
+        self.direct = {}
+        self.total = {}
+
+    def build(self, nodes):
+        self.direct = {
+            node_id: len(node['items']) for node_id, node in nodes.items()
+        }
+        self.total = dict(self.direct)
+        self.built = True
+        order = ['root']
+        for node_id in order:
+            order.extend(nodes[node_id]['sub_nodes'])
+        for node_id in reversed(order):
+            parent_id = nodes[node_id]['parent_id']
+            if parent_id is not None:
+                self.total[parent_id] += self.total[node_id]
+
+    def get(self, node_id):
+        return self.direct.get(node_id, 0), self.total.get(node_id, 0)
+
+    def add_node(self, node_id):
+        if not self.built:
+            return
+        self.direct[node_id] = 0
+        self.total[node_id] = 0
+
+    def discard(self, node_id):
+        self.direct.pop(node_id, None)
+        self.total.pop(node_id, None)
+
+    def _collect(self, nodes, node_id, delta, changes):
+        while node_id is not None:
+            changes[node_id] = changes.get(node_id, 0) + delta
+            node_id = nodes[node_id]['parent_id']
+
+    def _apply(self, changes):
+        for node_id, delta in changes.items():
+            if delta:
+                self.total[node_id] += delta
+
+    def items_changed(self, nodes, deltas):
+        """
+        deltas: {node_id: 直接挂载的项数变化}，比如 {old: -2, new: 2}。
+        """
+        if not self.built:
+            return []
+        changes = {}
+        for node_id, delta in deltas.items():
+            if not delta:
+                continue
+            self.direct[node_id] += delta
+            self._collect(nodes, node_id, delta, changes)
+        self._apply(changes)
+
+    def subtree_moved(self, nodes, node_id, old_parent_id):
+        """节点已经挂到新的父节点下面以后调用。
+        """
+        if not self.built:
+            return
+        changes = {}
+        total = self.total[node_id]
+        self._collect(nodes, old_parent_id, -total, changes)
+        self._collect(nodes, nodes[node_id]['parent_id'], total, changes)
+        self._apply(changes)
+
+    def subtree_removed(self, nodes, node_id):
+        """节点从父节点上摘下来之前调用。
+        """
+        if not self.built:
+            return
+        changes = {}
+        self._collect(
+            nodes, nodes[node_id]['parent_id'], -self.total[node_id], changes)
+        self._apply(changes)
+
+
+class BreadcrumbCache:
+
+    """
+    节点路径的缓存，比如“常规 / 程序 / 工具”。每个节点只在第一次用到时
+    沿着 parent_id 往上计算一次，遇到已经缓存过的祖先就停下来。
+    节点改名或者移动时，只需要清掉它这棵子树的缓存。
+    """
+
+    SEPARATOR = ' / '
+
+    def __init__(self):
+        self.paths = {}
+
+    def get(self, nodes, node_id):
+        path = self.paths.get(node_id)
+        if path is not None:
+            return path
+        chain = []
+        current = node_id
+        while current not in self.paths:
+            if nodes[current]['parent_id'] is None:
+                # root 节点不显示名称
+                self.paths[current] = ''
+                break
+            chain.append(current)
+            current = nodes[current]['parent_id']
+        prefix = self.paths[current]
+        for current in reversed(chain):
+            name = nodes[current]['name'] or ''
+            prefix = prefix + self.SEPARATOR + name if prefix else name
+            self.paths[current] = prefix
+        return self.paths[node_id]
+
+    def invalidate(self, node_ids):
+        for node_id in node_ids:
+            self.paths.pop(node_id, None)
@@ -0,0 +1,170 @@
+"""
+界面卡住时记录主线程在做什么。
+
+在配置文件中设置 stall_watchdog(毫秒)打开，默认关闭。主线程中有一个
+心跳定时器，另一个线程检查心跳：超过这个时间没有心跳，说明事件循环
+卡在某个槽函数里面，这时每 10 ms 用 sys._current_frames 取一次主线程
+的 Python 调用栈，恢复以后把采样结果按调用栈汇总，连同触发卡顿的槽
+函数写入 stalls.log。
+
+没有卡顿时的开销只有定时器每隔 1/4 阈值的一次心跳，以及检查线程同样
+间隔的一次唤醒。
+"""
+import os
+import sys
+import time
+import threading
+from collections import Counter
+
+from PySide6.QtCore import QObject, QTimer
+
+
+def frame_label(frame, line=None):
+    """line 默认是帧正在执行的行。
+    """
+    code = frame.f_code
+    name = getattr(code, 'co_qualname', code.co_name)
+    line = frame.f_lineno if line is None else line
+    return f'{name} ({os.path.basename(code.co_filename)}:{line})'
+
+
+class StallReport:
+
+    """
+    一次卡顿：started 为最后一次心跳的时间(time.time)，duration 为秒数，
+    slot 为触发卡顿的槽函数，samples 为 {调用栈: 次数}，调用栈从外到内，
+    主线程在 Qt 内部(比如槽函数已经返回，还没有轮到心跳)时为空。
+    """
+
+    def __init__(self, started, slot):
+        self.started = started
+        self.slot = slot
+        self.duration = 0.0
+        self.samples = Counter()
+
+    def format(self, limit=5):
+        count = sum(self.samples.values())
+        when = time.strftime('%Y-%m-%d %H:%M:%S',
+                             time.localtime(self.started))
+        lines = [
+            f'{when} 界面卡住 {self.duration * 1000:.0f} ms，'
+            f'槽函数：{self.slot or "未知"}，采样 {count} 次'
+        ]
+        for stack, times in self.samples.most_common(limit):
+            lines.append(f'  {times} 次 ({times / count:.0%})：')
+            lines.extend(f'    {label}' for label in stack or ['(Qt 内部)'])
+        return '\n'.join(lines)
+
+
+class StallWatchdog(QObject):
+
+    """
+    threshold：多少秒没有心跳算作卡顿。
+    log_path：卡顿记录追加到这个文件，None 时只保存在 reports 中。
+    start() 需要在主线程中调用。
+    """
+
+    SAMPLE_INTERVAL = 0.01
+    MAX_REPORTS = 20
+
+    def __init__(self, threshold, log_path=None, parent=None):
+        super().__init__(parent)
+        self.threshold = threshold
+        self.log_path = log_path
+        # 最近的卡顿，最多 MAX_REPORTS 个
+        self.reports = []
+        self.timer = QTimer(self)
+        self.timer.setInterval(max(1, int(threshold * 1000 / 4)))
+        self.timer.timeout.connect(self.beat)
+        self.last_beat = time.monotonic()
+        # 心跳所在的事件循环在调用栈的第几层(从 0 开始)，卡顿时下一层就是
+        # 正在执行的槽函数。记录层数而不是帧，processEvents 每次调用都是
+        # 新的帧，而且不需要一直引用着帧。事件循环开始运行以前为 None，
+        # 这时不检查，启动时间由 startup_profile 负责
+        self.loop_depth = None
+        self.thread_id = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.thread_id = threading.get_ident()
+        self.loop_depth = None
+        self.timer.start()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._watch, daemon=True, name='PathManagerPlus-watchdog')
+        self._thread.start()
+
+    def stop(self):
+        self.timer.stop()
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(1)
+            self._thread = None
+
+    def beat(self):
+        # 定时器直接从事件循环调用 beat，上一层就是进入事件循环的函数
+        depth = -1
+        frame = sys._getframe().f_back
+        while frame is not None:
+            depth += 1
+            frame = frame.f_back
+        self.loop_depth = depth
+        self.last_beat = time.monotonic()
+
+    def _watch(self):
+        idle = self.timer.interval() / 1000
+        while not self._stop.wait(idle):
+            last_beat = self.last_beat
+            if self.loop_depth is None \
+                    or time.monotonic() - last_beat < self.threshold:
+                continue
+            report = None
+            # 卡顿期间一直采样，直到有新的心跳
+            while self.last_beat == last_beat and not self._stop.is_set():
+                frame = sys._current_frames().get(self.thread_id)
+                if frame is not None:
+                    stack, slot = self._stack(frame)
+                    if report is None:
+                        report = StallReport(
+                            time.time() - (time.monotonic() - last_beat),
+                            slot)
+                    elif report.slot is None:
+                        report.slot = slot
+                    report.samples[stack] += 1
+                del frame
+                self._stop.wait(self.SAMPLE_INTERVAL)
+            if report is not None:
+                report.duration = self.last_beat - last_beat
+                self._add(report)
+
+    def _stack(self, frame):
+        """
+        返回 (从外到内的调用栈, 槽函数)，只包括事件循环以内的部分。槽函数
+        记录定义所在的行。
+        """
+        frames = []
+        while frame is not None:
+            frames.append(frame)
+            frame = frame.f_back
+        frames.reverse()
+        frames = frames[self.loop_depth + 1:]
+        if not frames:
+            # 卡在 Qt 内部，没有 Python 代码在运行
+            return (), None
+        slot = frames[0]
+        return (tuple(frame_label(frame) for frame in frames),
+                frame_label(slot, slot.f_code.co_firstlineno))
+
+    def _add(self, report):
+        self.reports.append(report)
+        del self.reports[:-self.MAX_REPORTS]
+        if self.log_path is None:
+            return
+        try:
+            with open(self.log_path, 'a', encoding='utf-8') as fl:
+                fl.write(report.format() + '\n\n')
+        except OSError:
+            pass
@@ -0,0 +1,309 @@
+"""
+界面响应时间的基准测试，不需要显示器，可以在没有图形界面的 CI 上运行：
+
+    python benchmarks/gui_latency.py 10000 50000 --repeat 20
+    python benchmarks/gui_latency.py 50000 --json result.json --max-p90 200
+
+用 make_fixture 生成数据，在临时目录中打开 MainWindow(默认使用
+QT_QPA_PLATFORM=offscreen，界面照常绘制，只是不显示出来)，然后直接调用
+界面的槽函数，模拟点击节点、搜索、拖入文件、删除项、拖动节点和保存。
+不会碰到程序自己的数据文件和配置文件。
+
+每次操作记录三个时间：
+- 调用：槽函数本身的执行时间；
+- 完成：从调用开始，到操作产生的事件(包括重绘，以及分批添加之类的
+  后续处理)都处理完为止；
+- 卡顿：这期间事件循环最长有多久没有响应，用一个 1 ms 的心跳定时器
+  测量，也就是用户操作时感觉到的最长停顿。
+输出每种操作的中位数、p90、p99 和最大值。给出 --max-p90 时，有操作的
+完成时间 p90 超过这个毫秒数就以返回值 1 退出。
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import importlib
+import argparse
+import tempfile
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from make_fixture import WORDS, make_data
+
+QUERIES = ('报告', 'ext:pdf', 'name:report ext:xlsx', 'py:bg', 'docs -ext:md',
+           'path:/home/user/project', 'comment:notes')
+
+
+def percentile(values, fraction):
+    """最近秩法，values 已经排好序。
+    """
+    index = max(0, min(len(values) - 1, int(fraction * len(values) + 0.5) - 1))
+    return values[index]
+
+
+def print_message(mode, context, message):
+    # offscreen 不支持窗口大小的提示，每次显示窗口都会输出警告
+    if 'propagateSizeHints' not in message:
+        print(message, file=sys.stderr)
+
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        'p50': percentile(values, 0.5),
+        'p90': percentile(values, 0.9),
+        'p99': percentile(values, 0.99),
+        'max': values[-1],
+    }
+
+
+class Harness:
+
+    """在临时目录中打开主窗口，记录每次操作的时间。
+    """
+
+    def __init__(self, item_count, base, seed=0):
+        # 先改掉数据文件和配置文件的位置，main 导入时会读取
+        from PathManagerPlus import settings
+        settings.DATABASE = os.path.join(base, 'data.json')
+        settings.CONFIG_FILE = os.path.join(base, 'config.json')
+        settings.PROBE_CACHE = os.path.join(base, 'probe_cache.json')
+        from PySide6.QtCore import (
+            QEventLoop,
+            QTimer,
+            QUrl,
+            qInstallMessageHandler
+        )
+        from PySide6.QtWidgets import QApplication
+        from PathManagerPlus.file_sync import DataFile
+        # PathManagerPlus.main 这个名字被包里面的 main 函数占用了
+        main = importlib.import_module('PathManagerPlus.main')
+        self.QEventLoop = QEventLoop
+        self.QTimer = QTimer
+        self.QUrl = QUrl
+        self.main = main
+        # 测试多种数据量时 main 已经导入过了
+        main.DATABASE = settings.DATABASE
+        main.CONFIG_FILE = settings.CONFIG_FILE
+        self.base = base
+        self.rng = random.Random(seed)
+        self.results = {}
+        qInstallMessageHandler(print_message)
+        self.app = QApplication.instance() or QApplication(sys.argv)
+        DataFile(settings.DATABASE).write_data(make_data(item_count, seed))
+
+        self.heartbeat = QTimer()
+        self.heartbeat.setInterval(1)
+        self.heartbeat.timeout.connect(self._beat)
+        self.last_beat = time.perf_counter()
+        self.longest_gap = 0.0
+        self.heartbeat.start()
+
+        start = time.perf_counter()
+        self.window = main.MainWindow()
+        self.window.resize(1200, 800)
+        self.window.show()
+        called = time.perf_counter()
+        self.wait_until(lambda: not self.window.loading, timeout=120)
+        self.record('载入', start, called)
+
+    def _beat(self):
+        now = time.perf_counter()
+        self.longest_gap = max(self.longest_gap, now - self.last_beat)
+        self.last_beat = now
+
+    def wait_until(self, condition, timeout=30):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                raise TimeoutError('操作没有在规定时间内完成')
+            self.app.processEvents(self.QEventLoop.AllEvents, 5)
+
+    def settle(self):
+        """
+        处理完已经产生的事件：0 ms 定时器在已经发出的事件(包括重绘请求)
+        处理完以后才会触发。
+        """
+        fired = []
+        self.QTimer.singleShot(0, lambda: fired.append(True))
+        self.wait_until(lambda: fired)
+
+    def measure(self, name, func, done=None):
+        """调用 func，等待 done() 为真(没有给出时只等事件处理完)。
+        """
+        self.settle()
+        self.last_beat = start = time.perf_counter()
+        self.longest_gap = 0.0
+        func()
+        called = time.perf_counter()
+        if done is not None:
+            self.wait_until(done)
+        self.settle()
+        self.record(name, start, called)
+
+    def record(self, name, start, called):
+        end = time.perf_counter()
+        self._beat()
+        samples = self.results.setdefault(
+            name, {'调用': [], '完成': [], '卡顿': []})
+        samples['调用'].append(called - start)
+        samples['完成'].append(end - start)
+        samples['卡顿'].append(self.longest_gap)
+
+    # ---------------------------- 操作 ----------------------------
+
+    def node_items(self):
+        return [
+            item for node_id, item in self.window.tree_items.items()
+            if self.window.data['nodes'][node_id]['items']
+        ]
+
+    def click_node(self, item=None):
+        window = self.window
+        item = item or self.rng.choice(self.node_items())
+        window.ui.treeWidget.setCurrentItem(item)
+        window.tree_item_click(item)
+
+    def tree_item_click(self):
+        item = self.rng.choice(self.node_items())
+        self.measure('点击节点', lambda: self.click_node(item))
+
+    def handle_search(self):
+        window = self.window
+        window.search_box.setText(self.rng.choice(QUERIES))
+        self.measure('搜索', window.handle_search)
+        window.handle_esc_signal()
+
+    def external_items_drop(self, count):
+        self.click_node()
+        folder = tempfile.mkdtemp(dir=self.base)
+        urls = []
+        for i in range(count):
+            path = os.path.join(folder, f'{self.rng.choice(WORDS)}_{i}.txt')
+            open(path, 'w').close()
+            urls.append(self.QUrl.fromLocalFile(path))
+        window = self.window
+        self.measure(
+            f'拖入 {count} 个文件', lambda: window.external_items_drop(urls),
+            lambda: getattr(window, 'drop_pipeline', None) is None)
+
+    def delete_items(self, count):
+        window = self.window
+        self.click_node()
+        list_widget = window.ui.listWidget
+        for row in range(min(count, list_widget.count())):
+            list_widget.item(row).setSelected(True)
+        self.measure('删除项', window.delete_items)
+
+    def internal_tree_item_drop(self):
+        """把一个节点移到另一个节点下面，先在界面上移动，和拖放一样。
+        """
+        window = self.window
+        data = window.data
+        tree_items = window.tree_items
+        node_id = self.rng.choice(
+            [_id for _id in tree_items if data['nodes'][_id]['sub_nodes']
+             or data['nodes'][_id]['parent_id'] != 'root'])
+        targets = [
+            _id for _id in tree_items if not data.is_node_under(_id, node_id)
+        ]
+        new_parent_id = self.rng.choice(targets)
+        item = tree_items[node_id]
+        new_parent = tree_items[new_parent_id]
+        tree = window.ui.treeWidget
+        old_parent = item.parent()
+        if old_parent is None:
+            old_index = tree.indexOfTopLevelItem(item)
+            tree.takeTopLevelItem(old_index)
+        else:
+            old_index = old_parent.indexOfChild(item)
+            old_parent.takeChild(old_index)
+        new_parent.insertChild(0, item)
+        payload = {
+            'item': item,
+            'old_index': old_index,
+            'new_index': 0,
+            'old_parent': old_parent,
+            'new_parent': new_parent
+        }
+        self.measure(
+            '拖动节点', lambda: window.internal_tree_item_drop(payload))
+
+    def save(self):
+        window = self.window
+        window.set_has_edited(True)
+        self.measure('保存', window.save)
+
+    def run(self, repeat, drop_count, delete_count):
+        for _ in range(repeat):
+            self.tree_item_click()
+            self.handle_search()
+            self.external_items_drop(drop_count)
+            self.delete_items(delete_count)
+            self.internal_tree_item_drop()
+            self.save()
+        self.window.has_edited = False
+        self.window.close()
+        self.heartbeat.stop()
+        return {
+            name: {kind: summarize(values) for kind, values in samples.items()}
+            for name, samples in self.results.items()
+        }
+
+
+def print_report(item_count, report):
+    print(f'{item_count} 项 (毫秒，调用/完成/卡顿)')
+    print(f'  {"操作":<14}{"p50":>22}{"p90":>22}{"p99":>22}{"最大":>22}')
+    for name, kinds in report.items():
+        cells = []
+        for key in ('p50', 'p90', 'p99', 'max'):
+            cells.append('/'.join(
+                f'{kinds[kind][key] * 1000:.1f}'
+                for kind in ('调用', '完成', '卡顿')))
+        width = 14 - sum(1 for char in name if ord(char) > 127)
+        print(f'  {name:<{width}}' + ''.join(f'{cell:>22}' for cell in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='界面响应时间的基准测试')
+    parser.add_argument('sizes', type=int, nargs='*', default=[10000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--drop', type=int, default=50,
+                        help='每次拖入的文件数')
+    parser.add_argument('--delete', type=int, default=5,
+                        help='每次删除的项数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='把结果(秒)写入这个文件')
+    parser.add_argument('--max-p90', type=float,
+                        help='完成时间 p90 的上限(毫秒)，超过时返回 1')
+    args = parser.parse_args()
+    reports = {}
+    slow = []
+    for size in args.sizes:
+        base = tempfile.mkdtemp()
+        try:
+            harness = Harness(size, base, args.seed)
+            report = harness.run(args.repeat, args.drop, args.delete)
+        finally:
+            shutil.rmtree(base, ignore_errors=True)
+        reports[size] = report
+        print_report(size, report)
+        if args.max_p90 is not None:
+            slow += [
+                f'{size} 项 {name}' for name, kinds in report.items()
+                if name != '载入'
+                and kinds['完成']['p90'] * 1000 > args.max_p90
+            ]
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as fl:
+            json.dump(reports, fl, ensure_ascii=False, indent=2)
+    if slow:
+        print(f'p90 超过 {args.max_p90} ms：{", ".join(slow)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
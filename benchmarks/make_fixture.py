@@ -0,0 +1,80 @@
+"""
+生成用于性能测试的数据文件，结构和实际使用时差不多：几层节点，项
+大多是本地文件(同一个节点下的文件通常在同一个文件夹中，名称就是文件名)，
+少数是网址，一部分有备注。随机数种子固定，每次生成的数据相同。
+
+    python benchmarks/make_fixture.py 50000 -o /tmp/fixture.json
+"""
+import os
+import sys
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PathManagerPlus.handle_data import DataStorage, path_to_item
+
+WORDS = (
+    '报告 项目 会议 资料 照片 合同 发票 笔记 代码 工具 文档 设计 测试 '
+    'report project notes src docs build data archive backup config '
+    'invoice photos music video draft final review'
+).split()
+EXTENSIONS = ('.pdf', '.docx', '.xlsx', '.txt', '.py', '.md', '.png', '.jpg',
+              '.zip', '.pptx')
+SITES = ('https://github.com', 'https://docs.python.org/3',
+         'https://www.zhihu.com/question', 'https://example.com/wiki')
+
+
+def make_data(item_count, seed=0):
+    rng = random.Random(seed)
+    data = DataStorage()
+    # 大约每个节点 50 项，最多三层
+    node_count = max(1, item_count // 50)
+    nodes = []
+    for i in range(node_count):
+        parent = 'root'
+        if nodes and rng.random() < 0.7:
+            parent = rng.choice(nodes[-20:])
+        nodes.append(data.add_node(f'{rng.choice(WORDS)}{i}', parent))
+    home = '/home/user'
+    for node_id in nodes:
+        count = item_count // node_count
+        folder = os.path.join(
+            home, *(rng.choice(WORDS) for _ in range(rng.randint(1, 4))))
+        items = []
+        for j in range(count):
+            if rng.random() < 0.1:
+                path = f'{rng.choice(SITES)}/{rng.choice(WORDS)}/{j}'
+                item = path_to_item(path, f'{rng.choice(WORDS)} {j}')
+            else:
+                if rng.random() < 0.2:
+                    # 偶尔换到子文件夹
+                    folder = os.path.join(folder, rng.choice(WORDS))
+                path = os.path.join(
+                    folder, f'{rng.choice(WORDS)}_{j}{rng.choice(EXTENSIONS)}')
+                item = path_to_item(path)
+            if rng.random() < 0.15:
+                item['comment'] = f'{rng.choice(WORDS)} {rng.choice(WORDS)}'
+            items.append(item)
+        data.add_items(items, node_id)
+    # 凑够数量
+    rest = item_count - data.item_count()
+    if rest > 0:
+        data.add_items(
+            [path_to_item(f'{home}/rest/{i}.txt') for i in range(rest)],
+            nodes[0])
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成性能测试用的数据文件')
+    parser.add_argument('items', type=int, nargs='?', default=50000)
+    parser.add_argument('-o', '--output', default='fixture.json')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    make_data(args.items, args.seed).to_json(args.output)
+    print(f'{args.items} 项 -> {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+比较数据文件各种格式的大小、保存和读取时间：
+
+    python benchmarks/storage_format.py 10000 50000 200000
+
+读取时间包括 DataFile.read 读文件、解压和解码，保存时间包括编码、压缩和
+写文件，都取多次中最快的一次。
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PathManagerPlus.file_sync import DataFile
+from PathManagerPlus.storage_format import FORMATS
+from make_fixture import make_data
+
+
+def best_of(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比较数据文件的格式')
+    parser.add_argument('sizes', type=int, nargs='*', default=[50000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    base = tempfile.mkdtemp()
+    try:
+        for size in args.sizes:
+            data = make_data(size)
+            print(f'{size} 项')
+            print(f'  {"格式":<12}{"大小":>12}{"保存":>12}{"读取":>12}')
+            json_size = None
+            for fmt in FORMATS:
+                path = os.path.join(base, f'{size}-{fmt}')
+                data_file = DataFile(path, fmt)
+                write_time, _ = best_of(
+                    lambda: data_file.write_data(data, check=False),
+                    args.repeat)
+                read_time, loaded = best_of(
+                    lambda: DataFile(path).read(), args.repeat)
+                assert loaded == data, fmt
+                file_size = os.path.getsize(path)
+                json_size = json_size or file_size
+                print(f'  {fmt:<12}{file_size / 1e6:>9.2f} MB'
+                      f'{write_time * 1000:>9.0f} ms'
+                      f'{read_time * 1000:>9.0f} ms'
+                      f'  ({file_size / json_size:.0%})')
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
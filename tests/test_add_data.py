@@ -13,3 +13,8 @@ node_b = d.add_node('B', node_a)
 d.add_item('b1', node_b)
 d.add_item('b2', node_b)
 d.pretty_print()
+
+# 没有 path 的项也可以只修改备注
+item_id = d.add_item({'name': 'no path'}, node_b)
+d.update_item(item_id, {'comment': '备注'})
+assert d['items'][item_id]['comment'] == '备注'
@@ -0,0 +1,122 @@
+import sys
+import os
+import json
+import shutil
+import tempfile
+import threading
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+from PySide6.QtCore import QCoreApplication, QTimer
+
+from PathManagerPlus.handle_data import DataStorage
+from PathManagerPlus.autosave import AutosavePolicy, AutoSaver, JsonWriter
+from PathManagerPlus.file_sync import DataFile
+
+
+# 空闲一段时间后保存
+policy = AutosavePolicy(idle=2, max_delay=60, budget=1000)
+assert policy.save_time() is None
+policy.mark_dirty(100)
+assert policy.save_time() == 102
+policy.mark_dirty(101)
+assert policy.save_time() == 103
+
+# 连续快速修改时空闲时间放宽，但不超过最长等待时间
+policy = AutosavePolicy(idle=2, max_delay=30, budget=1000)
+now = 0
+for _ in range(100):
+    policy.mark_dirty(now)
+    now += 1.5
+assert abs(policy.idle_window() - 3) < 0.01
+assert policy.save_time() <= 30
+policy.started()
+assert policy.save_time() is None
+
+# 带宽限制：写了 5000 字节，5 秒内不再写入
+policy.finished(200, 5000)
+policy.mark_dirty(201)
+assert policy.save_time() == 205
+# 最长等待时间优先于带宽限制
+policy.finished(200, 10 ** 9)
+assert policy.save_time() == 201 + 30
+
+# 保存失败后恢复未保存的状态
+dirty_since = policy.started()
+policy.failed(210, dirty_since)
+assert policy.dirty_since == 201
+
+base = tempfile.mkdtemp()
+try:
+    # 旧的数据不会覆盖新的数据
+    data_path = os.path.join(base, 'data.json')
+    writer = JsonWriter(DataFile(data_path))
+    assert writer.write({'a': 2}, 2) > 0
+    assert writer.write({'a': 1}, 1) == 0
+    assert json.load(open(data_path)) == {'a': 2}
+    assert sorted(os.listdir(base)) == ['data.json', 'data.json.lock']
+
+    # 手动保存(先拿数据文件的锁再写入)和自动保存同时进行，不会死锁
+    busy_path = os.path.join(base, 'busy.json')
+    busy_writer = JsonWriter(DataFile(busy_path))
+
+    def manual_save():
+        for generation in range(3, 200, 2):
+            with busy_writer.data_file.lock():
+                busy_writer.write({'a': generation}, generation)
+
+    def autosave():
+        for generation in range(4, 200, 2):
+            busy_writer.write({'a': generation}, generation)
+
+    threads = [threading.Thread(target=manual_save, daemon=True),
+               threading.Thread(target=autosave, daemon=True)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert not any(thread.is_alive() for thread in threads)
+    assert json.load(open(busy_path)) == {'a': busy_writer.written_generation}
+    assert busy_writer.written_generation == 199
+
+    # 编码在拿到数据文件的锁之前进行
+    class Recorder:
+        depths = []
+
+        def to_dict(self):
+            self.depths.append(busy_writer.data_file._depth)
+            return {'a': 'encoded'}
+
+    assert busy_writer.write(Recorder(), 200) > 0
+    assert Recorder.depths == [0]
+    assert json.load(open(busy_path)) == {'a': 'encoded'}
+
+    # 副本不受之后的修改影响
+    d = DataStorage()
+    node_id = d.add_node('A')
+    item_id = d.add_item({'name': 'x', 'path': '/x'}, node_id)
+    snapshot = d.snapshot()
+    d.update_item(item_id, {'name': 'y'})
+    d.add_item('z', node_id)
+    assert snapshot['items'][item_id]['name'] == 'x'
+    assert snapshot['nodes'][node_id]['items'] == [item_id]
+
+    # 多次修改合并成一次后台写入
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+    saver = AutoSaver(
+        d, writer, AutosavePolicy(idle=0.05, max_delay=1, budget=10 ** 9))
+    saved = []
+    saver.saved.connect(saved.append)
+    saver.saved.connect(lambda generation: app.quit())
+    for i in range(20):
+        d.add_item(f'item {i}', node_id)
+        saver.mark_dirty()
+    QTimer.singleShot(3000, app.quit)
+    app.exec()
+    assert saved == [d.generation]
+    assert len(json.load(open(data_path))['items']) == len(d['items'])
+    assert sorted(os.listdir(base)) == [
+        'busy.json', 'busy.json.lock', 'data.json', 'data.json.lock']
+finally:
+    shutil.rmtree(base, ignore_errors=True)
@@ -0,0 +1,34 @@
+import sys
+import os
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+from PathManagerPlus.handle_data import DataStorage
+
+
+d = DataStorage()
+node_a = d.add_node('常规')
+node_b = d.add_node('程序', node_a)
+node_c = d.add_node('工具', node_b)
+node_d = d.add_node('链接')
+item = d.add_item('hello', node_c)
+
+print(d.get_item_node_path(item))
+assert d.get_node_path(node_c) == '常规 / 程序 / 工具'
+assert d.get_node_path('root') == ''
+
+# 缓存中已经有整条链
+assert set(d.breadcrumbs.paths) >= {node_a, node_b, node_c}
+
+d.change_node_name(node_b, '软件')
+assert node_a in d.breadcrumbs.paths      # 不在被改名的子树中，缓存保留
+assert node_c not in d.breadcrumbs.paths
+assert d.get_node_path(node_c) == '常规 / 软件 / 工具'
+
+d.change_node_parent(node_b, node_d, 0)
+assert d.get_item_node_path(item) == '链接 / 软件 / 工具'
+assert d.get_node_path(node_a) == '常规'
+
+d.remove_node(node_b)
+assert node_c not in d.breadcrumbs.paths
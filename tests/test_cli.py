@@ -0,0 +1,139 @@
+import sys
+import os
+import io
+import json
+import shutil
+import tempfile
+import subprocess
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+import PathManagerPlus
+from PathManagerPlus.cli import main, build_parser, find_node, CliError
+from PathManagerPlus.handle_data import DataStorage, gen_base_data
+
+# 命令行工具不导入界面
+assert subprocess.run([
+    sys.executable, '-c',
+    'import sys, PathManagerPlus.cli; sys.exit("PySide6" in sys.modules)'
+], cwd=os.path.dirname(os.path.dirname(PathManagerPlus.__file__))
+).returncode == 0
+
+
+
+def run_module(*argv):
+    return subprocess.run(
+        [sys.executable, '-m', 'PathManagerPlus'] + list(argv),
+        cwd=os.path.dirname(os.path.dirname(PathManagerPlus.__file__)),
+        capture_output=True, text=True
+    )
+
+
+# python -m PathManagerPlus 后面是子命令时交给命令行工具，不会打开窗口
+assert {'import', 'convert'} <= set(build_parser().commands)
+for command in build_parser().commands:
+    result = run_module(command, '-h')
+    assert result.returncode == 0
+    assert f'usage: python -m PathManagerPlus {command}' in result.stdout
+
+
+def run(*argv):
+    out = io.StringIO()
+    status = main(list(argv) + ['--data', data_path], out)
+    return status, out.getvalue().splitlines()
+
+
+base = tempfile.mkdtemp()
+cwd = os.getcwd()
+try:
+    data_path = os.path.join(base, 'data.json')
+    d = gen_base_data()
+    general = d['nodes']['root']['sub_nodes'][0]
+    program, link, other = d['nodes'][general]['sub_nodes']
+    local = os.path.join(base, 'report.pdf')
+    open(local, 'w').close()
+    d.add_item({'name': '季度报告', 'path': local}, program)
+    d.add_item({'name': '官网', 'path': 'https://www.python.org'}, link)
+    d.add_item({'name': '旧报告', 'path': '/no/such/报告.doc'}, other)
+    d.to_json(data_path)
+
+    assert find_node(d, '常规/程序') == program
+    assert find_node(d, program) == program
+    assert find_node(d, '') == 'root'
+    try:
+        find_node(d, '常规/没有')
+    except CliError:
+        pass
+    else:
+        raise AssertionError('没有报告找不到节点')
+
+    # 和界面使用同一个搜索
+    status, lines = run('search', '报告')
+    assert status == 0
+    assert lines == [
+        f'{d["items"][_id]["name"]}\t{d["items"][_id]["path"]}'
+        for _id in d.search('报告')
+    ]
+    status, lines = run('search', '报告', '--node', '常规/程序',
+                        '--format', 'paths')
+    assert lines == [local]
+    status, lines = run('search', 'ext:doc', '--format', 'json')
+    record = json.loads(lines[0])
+    assert record['name'] == '旧报告' and record['node'] == '常规 / 其他'
+    assert run('search', '没有这个')[0] == 1
+
+    # 添加以后其他实例可以读到
+    os.chdir(base)
+    status, lines = run('add', 'new.txt', 'http://a.com', '--node', '常规/其他')
+    assert status == 0 and len(lines) == 2
+    saved = DataStorage.from_json(data_path)
+    assert saved.check_data_integrity()
+    assert saved['items'][lines[0]]['path'] == os.path.join(base, 'new.txt')
+    assert saved['items'][lines[1]]['name'] == 'a.com'
+    assert run('add', 'x', '--node', '')[0] == 2
+
+    status, lines = run('ls', '常规')
+    assert lines == ['程序/', '链接/', '其他/']
+    status, lines = run('ls', '常规', '-r')
+    assert '    季度报告\t' + local in lines
+
+    # 导出为 tsv：节点路径、名称、路径、备注
+    status, lines = run('export', '常规/程序')
+    assert lines == ['常规 / 程序\t季度报告\t' + local + '\t']
+    export_path = os.path.join(base, 'out.json')
+    run('export', '常规', '--format', 'json', '-o', export_path)
+    exported = json.load(open(export_path, encoding='utf-8'))
+    assert len(exported['nodes']) == 4 and len(exported['items']) == 5
+    # 只导出搜索结果
+    status, lines = run('export', '--query', 'ext:doc')
+    assert lines == ['常规 / 其他\t旧报告\t/no/such/报告.doc\t']
+
+    # 按扩展名选择格式，导入到另一个数据文件中重建节点
+    csv_path = os.path.join(base, 'out.csv')
+    run('export', '常规', '-o', csv_path)
+    assert open(csv_path, encoding='utf-8').readline().strip() \
+        == 'node,name,path,comment'
+    copy_path = os.path.join(base, 'copy.json')
+    gen_base_data().to_json(copy_path)
+    out = io.StringIO()
+    assert main(['import', csv_path, '--data', copy_path], out) == 0
+    assert out.getvalue().strip() == '导入 5 项，新建 0 个节点'
+    copied = DataStorage.from_json(copy_path)
+    assert copied.check_data_integrity() and copied.item_count() == 5
+    program_copy = copied.find_node('常规/程序')
+    assert [copied['items'][_id]['name']
+            for _id in copied['nodes'][program_copy]['items']] == ['季度报告']
+    assert main(['import', export_path, '--data', copy_path], out) == 2
+
+    # 本地路径不存在的项
+    status, lines = run('check')
+    assert status == 1
+    assert lines[-1].endswith('2 项的目标不存在')
+
+    # 找到多项时不打开
+    assert run('open', '报告')[0] == 2
+    assert run('open', '没有这个')[0] == 2
+finally:
+    os.chdir(cwd)
+    shutil.rmtree(base, ignore_errors=True)
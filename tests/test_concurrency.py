@@ -0,0 +1,186 @@
+import sys
+import os
+import time
+import random
+import threading
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+from PathManagerPlus.concurrency import RWLock
+from PathManagerPlus.handle_data import DataStorage
+
+
+def run(target, *args):
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+# 多个线程可以同时持有读锁
+lock = RWLock()
+inside = threading.Barrier(3, timeout=5)
+
+
+def reader():
+    with lock.read():
+        inside.wait()
+
+
+threads = [run(reader) for _ in range(2)]
+inside.wait()
+for thread in threads:
+    thread.join(5)
+
+# 重入：读锁里再拿读锁，写锁里再拿写锁和读锁
+with lock.read():
+    with lock.read():
+        pass
+    try:
+        lock.acquire_write()
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError('读锁不能升级为写锁')
+with lock.write():
+    with lock.write():
+        with lock.read():
+            assert lock.write_locked()
+    assert lock.write_locked()
+assert not lock.write_locked()
+try:
+    lock.release_read()
+except RuntimeError:
+    pass
+else:
+    raise AssertionError('没有持有读锁')
+
+# 写锁是独占的，等不到锁时超时返回 False
+events = []
+with lock.write():
+    thread = run(lambda: lock.acquire_read() and events.append('read'))
+    time.sleep(0.05)
+    assert not events
+thread.join(5)
+assert events == ['read']
+# 读锁还被那个线程拿着
+assert not lock.acquire_write(timeout=0.05)
+assert lock.acquire_read(timeout=0.05)
+lock.release_read()
+
+# 写优先：有线程在等写锁时，新的读请求要等写完成
+lock = RWLock()
+events = []
+lock.acquire_read()
+writer = run(lambda: (lock.acquire_write(), events.append('write'),
+                      lock.release_write()))
+while not lock._waiting_writers:
+    time.sleep(0.001)
+late = run(lambda: (lock.acquire_read(), events.append('read'),
+                    lock.release_read()))
+time.sleep(0.05)
+assert not events
+# 已经持有读锁的线程重入时不等待，否则和写线程互相等待
+assert lock.acquire_read(timeout=0.05)
+lock.release_read()
+lock.release_read()
+writer.join(5)
+late.join(5)
+assert events == ['write', 'read']
+
+# 读线程搜索、统计、遍历的同时，另一个线程不断修改数据
+d = DataStorage()
+nodes = [d.add_node(f'节点{i}') for i in range(4)]
+nodes += [d.add_node(f'子节点{i}', nodes[i]) for i in range(4)]
+for node_id in nodes:
+    d.add_items([{'name': f'文件{i}.txt', 'path': f'/home/{node_id}/{i}.txt',
+                  'comment': None} for i in range(50)], node_id)
+stop = threading.Event()
+errors = []
+reads = [0]
+
+
+def read():
+    rng = random.Random()
+    try:
+        while not stop.is_set():
+            # 查询方法自己拿读锁
+            d.search('文件1')
+            d.filter_nodes('jd')
+            with d.lock.read():
+                # 一次读锁之内看到的数据是一致的
+                items = d['items']
+                total = d.get_item_counts('root')[1]
+                if total != len(items):
+                    errors.append(('count', total, len(items)))
+                for item_id in rng.sample(list(items), min(20, len(items))):
+                    record = d.describe_item(item_id)
+                    parent_id = items[item_id]['parent_id']
+                    if item_id not in d['nodes'][parent_id]['items']:
+                        errors.append(('parent', item_id))
+                    if not record['node']:
+                        errors.append(('node', item_id))
+                result = d.search('txt', scope=nodes[0])
+                if not set(result) <= set(items):
+                    errors.append('search')
+                for item_id in result:
+                    if not d.is_item_under(item_id, nodes[0]):
+                        errors.append(('scope', item_id))
+                if not d.check_data_integrity():
+                    errors.append('integrity')
+            # 多个读线程同时拍快照，快照中的数据也是一致的
+            with d.snapshot() as snapshot:
+                items = snapshot['items']
+                for item_id in rng.sample(list(items), min(20, len(items))):
+                    parent_id = items[item_id]['parent_id']
+                    if item_id not in snapshot['nodes'][parent_id]['items']:
+                        errors.append(('snapshot', item_id))
+            # 遍历子树不受之后的修改影响
+            for node_id in d.iter_subtree('root'):
+                time.sleep(0)
+            reads[0] += 1
+    except Exception as e:
+        errors.append(repr(e))
+
+
+readers = [run(read) for _ in range(4)]
+rng = random.Random(0)
+try:
+    for round_ in range(300):
+        item_ids = list(d['items'])
+        if item_ids:
+            item_id = rng.choice(item_ids)
+            d.move_item_to_node(item_id, rng.choice(nodes))
+            d.move_item_to_last(rng.choice(item_ids))
+            d.update_item(rng.choice(item_ids), {'name': f'文件{round_}.txt'})
+            d.remove_items(rng.sample(item_ids, 3))
+        d.add_items([{'name': f'文件{round_}-{i}.txt',
+                      'path': f'/tmp/{round_}/{i}.txt', 'comment': None}
+                     for i in range(3)], rng.choice(nodes))
+        if round_ % 30 == 0:
+            node_id = d.add_node(f'临时{round_}', rng.choice(nodes))
+            d.add_items([f'/tmp/临时/{i}' for i in range(5)], node_id)
+            d.change_node_parent(node_id, rng.choice(nodes[:4]), 0)
+            d.change_node_name(node_id, f'改名{round_}')
+            d.remove_node(node_id)
+        if round_ % 50 == 0:
+            d.sort_items_within_node(rng.choice(nodes), reverse=True)
+finally:
+    stop.set()
+    for thread in readers:
+        thread.join(30)
+assert not errors, errors[:5]
+assert reads[0] > 0
+assert d.check_data_integrity()
+assert d.get_item_counts('root')[1] == len(d['items'])
+
+# 所有修改数据的方法都要等读锁释放
+node_id = nodes[0]
+item_id = d['nodes'][node_id]['items'][0]
+d.lock.acquire_read()
+moved = run(d.move_item_to_last, item_id)
+moved.join(0.1)
+assert moved.is_alive()
+d.lock.release_read()
+moved.join(5)
+assert d['nodes'][node_id]['items'][-1] == item_id
@@ -0,0 +1,150 @@
+import sys
+import os
+import shutil
+import asyncio
+import tempfile
+import threading
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+from PathManagerPlus.handle_data import gen_base_data
+from PathManagerPlus.file_sync import DataFile, encode_data
+from PathManagerPlus.daemon import (
+    QueryService,
+    DaemonClient,
+    DaemonError,
+    serve,
+    daemon_address
+)
+
+base = tempfile.mkdtemp()
+try:
+    data_path = os.path.join(base, 'data.json')
+    d = gen_base_data()
+    general = d['nodes']['root']['sub_nodes'][0]
+    program, link, other = d['nodes'][general]['sub_nodes']
+    for i in range(200):
+        d.add_item({'name': f'报告{i}', 'path': f'/tmp/r{i}.pdf'}, program)
+    d.add_item({'name': '官网', 'path': 'https://www.python.org'}, link)
+    d.to_json(data_path)
+
+    # 请求处理本身和网络无关
+    service = QueryService(data_path)
+    response = service.handle({'op': 'search', 'query': '报告1', 'limit': 5})
+    assert response['ok'] and response['total'] == 111
+    assert [r['name'] for r in response['items']] == [
+        d['items'][_id]['name'] for _id in d.search('报告1')[:5]]
+    assert response['items'][0]['node'] == '常规 / 程序'
+    response = service.handle(
+        {'op': 'search', 'query': '官网', 'node': '常规/程序'})
+    assert response['total'] == 0
+    response = service.handle(
+        {'op': 'lookup', 'path': 'https://www.python.org'})
+    assert response['items'][0]['name'] == '官网'
+    for request in ({'op': 'nothing'}, {'op': 'lookup', 'id': 'x'},
+                    {'op': 'search', 'query': 'a', 'node': '没有'}):
+        try:
+            service.handle(request)
+        except DaemonError:
+            pass
+        else:
+            raise AssertionError(request)
+
+    # 数据文件被其他程序修改后，下一次请求时重新读取
+    other_file = DataFile(data_path)
+    other_data = gen_base_data()
+    other_data.add_item('新的数据', other_data.find_node('常规/其他'))
+    other_file.write(encode_data(other_data))
+    response = service.handle({'op': 'search', 'query': '报告'})
+    assert response['total'] == 0
+    assert service.handle({'op': 'search', 'query': '新的'})['total'] == 1
+    d.to_json(data_path)
+
+    # 通过 Unix 套接字服务
+    address = os.path.join(base, 'daemon.sock')
+    assert daemon_address(data_path) != daemon_address('/other/data.json')
+    assert DaemonClient.connect(address) is None
+    service = QueryService(data_path)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    tasks = []
+
+    def run():
+        asyncio.set_event_loop(loop)
+        tasks.append(loop.create_task(serve(service, address, ready)))
+        try:
+            loop.run_until_complete(tasks[0])
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert ready.wait(5)
+    # 套接字只有当前用户可以访问
+    assert os.stat(address).st_mode & 0o777 == 0o600
+
+    # 多个客户端同时查询
+    errors = []
+
+    def query(n):
+        try:
+            with DaemonClient.connect(address) as client:
+                for i in range(50):
+                    response = client.request(
+                        'search', query=f'报告{n}', limit=1, id=i)
+                    assert response['id'] == i
+                    assert response['items'][0]['name'] == f'报告{n}'
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=query, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors, errors
+
+    with DaemonClient.connect(address) as client:
+        assert client.request('ping')['ok']
+        ids = client.request(
+            'add', paths=['/tmp/new.txt'], node='常规/其他')['ids']
+        assert client.request('lookup', id=ids[0])['items'][0]['name'] \
+            == 'new.txt'
+        try:
+            client.request('add', paths=['/tmp/x'], node='')
+        except DaemonError:
+            pass
+        else:
+            raise AssertionError('不能添加到根节点')
+        stats = client.request('stats')
+        assert stats['items'] == 202
+        # 格式不对的请求不影响连接
+        client.sock.sendall(b'not json\n')
+        assert client.reader.readline().startswith(b'{"ok": false')
+        assert client.request('ping')['ok']
+        # 处理请求时的其他异常也只返回错误，不断开连接
+        try:
+            client.request('search', query='报告', limit='x')
+        except DaemonError as e:
+            assert 'TypeError' in str(e)
+        else:
+            raise AssertionError('参数不对的请求没有返回错误')
+        assert client.request('ping')['ok']
+    # 添加的项写入了数据文件
+    saved = DataFile(data_path).read()
+    assert saved['items'][ids[0]]['path'] == '/tmp/new.txt'
+
+    # 已经在运行时不能再启动
+    try:
+        asyncio.run(serve(service, address))
+    except DaemonError:
+        pass
+    else:
+        raise AssertionError('没有发现服务已经在运行')
+
+    loop.call_soon_threadsafe(tasks[0].cancel)
+    thread.join(5)
+    assert not os.path.exists(address)
+finally:
+    shutil.rmtree(base, ignore_errors=True)
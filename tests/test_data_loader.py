@@ -0,0 +1,119 @@
+import sys
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+from PySide6.QtCore import QCoreApplication, QEventLoop
+
+from PathManagerPlus.handle_data import gen_base_data
+from PathManagerPlus.file_sync import DataFile
+from PathManagerPlus.autosave import JsonWriter
+from PathManagerPlus.qt_scheduler import QtScheduler
+from PathManagerPlus.data_loader import (
+    DataLoader,
+    load_data,
+    top_level_nodes
+)
+
+base = tempfile.mkdtemp()
+try:
+    data_path = os.path.join(base, 'data.json')
+    data_file = DataFile(data_path)
+    writer = JsonWriter(data_file)
+
+    # 数据文件不存在时生成初始数据并保存
+    data = load_data(data_file, writer)
+    assert os.path.exists(data_path)
+    assert not data.is_dirty()
+    general = data['nodes']['root']['sub_nodes'][0]
+    assert data['nodes'][general]['name'] == '常规'
+
+    # 第一层节点在检查数据之前就可以拿到，数据有问题的部分跳过
+    assert top_level_nodes({'nodes': {'root': {'sub_nodes': ['a', 'b']},
+                                      'a': {'name': 'A'}}}) == [('a', 'A')]
+    assert top_level_nodes({}) == [] and top_level_nodes([]) == []
+
+    d = gen_base_data()
+    general = d['nodes']['root']['sub_nodes'][0]
+    d.add_node('工作')
+    for i in range(100):
+        d.add_item({'name': f'报告{i}', 'path': f'/tmp/r{i}.pdf'}, general)
+    d.to_json(data_path)
+    top = []
+    data = load_data(DataFile(data_path), writer, top.append)
+    assert top == [[(general, '常规'), (d['nodes']['root']['sub_nodes'][1],
+                                      '工作')]]
+    # 索引已经建立好了
+    assert data.search_index.built and data.counts.built
+    assert data.intervals.built and data.node_pinyin.built
+    assert len(data.search('报告1')) == 11
+    assert data.get_item_counts(general) == (100, 100)
+
+    # 数据有错误时修复并写回数据文件
+    raw = json.load(open(data_path, encoding='utf-8'))
+    # 父节点不存在的节点
+    raw['nodes']['孤立'] = dict(raw['nodes'][general], parent_id='不存在',
+                              sub_nodes=[], items=[])
+    json.dump(raw, open(data_path, 'w', encoding='utf-8'))
+    data_file = DataFile(data_path)
+    data = load_data(data_file, JsonWriter(data_file))
+    assert data.check_data_integrity() and not data.is_dirty()
+    saved = json.load(open(data_path, encoding='utf-8'))
+    assert '孤立' not in saved['nodes']
+
+    # 在后台线程中载入，通过信号交给界面
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+    data_file = DataFile(data_path)
+    loader = DataLoader(data_file, JsonWriter(data_file))
+    events = []
+    loader.topLevelReady.connect(lambda nodes: events.append(('top', nodes)))
+    loader.loaded.connect(lambda data: events.append(('loaded', data)))
+    loader.failed.connect(lambda error: events.append(('failed', error)))
+    loader.start()
+    loader.start()
+    deadline = time.monotonic() + 5
+    while len(events) < 2 and time.monotonic() < deadline:
+        app.processEvents(QEventLoop.AllEvents, 20)
+    assert [kind for kind, _ in events] == ['top', 'loaded'], events
+    assert len(events[0][1]) == 2
+    assert events[1][1].item_count() == 100
+
+    # 读取失败时报告错误
+    with open(data_path, 'w')as fl:
+        fl.write('{')
+    data_file = DataFile(data_path)
+    loader = DataLoader(data_file, JsonWriter(data_file))
+    events = []
+    loader.loaded.connect(lambda data: events.append(('loaded', data)))
+    loader.failed.connect(lambda error: events.append(('failed', error)))
+    loader.start()
+    deadline = time.monotonic() + 5
+    while not events and time.monotonic() < deadline:
+        app.processEvents(QEventLoop.AllEvents, 20)
+    assert [kind for kind, _ in events] == ['failed']
+
+    # 被调度器取消时发出 cancelled，不发出 loaded 和 failed
+    scheduler = QtScheduler(1)
+    gate = threading.Event()
+    scheduler.submit(lambda task: gate.wait(5), name='占住线程')
+    loader = DataLoader(data_file, JsonWriter(data_file), scheduler=scheduler)
+    events = []
+    loader.loaded.connect(lambda data: events.append(('loaded', data)))
+    loader.failed.connect(lambda error: events.append(('failed', error)))
+    loader.cancelled.connect(lambda: events.append(('cancelled', None)))
+    loader.start()
+    loader.task.cancel()
+    gate.set()
+    deadline = time.monotonic() + 5
+    while not events and time.monotonic() < deadline:
+        app.processEvents(QEventLoop.AllEvents, 20)
+    assert [kind for kind, _ in events] == ['cancelled']
+    scheduler.shutdown()
+finally:
+    shutil.rmtree(base, ignore_errors=True)
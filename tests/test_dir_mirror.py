@@ -0,0 +1,111 @@
+import sys
+import os
+import json
+import shutil
+import tempfile
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+from PathManagerPlus.handle_data import DataStorage
+from PathManagerPlus.scheduler import CANCELLED, Cancelled, Scheduler
+from PathManagerPlus.dir_mirror import (
+    scan_directory,
+    mirror_state,
+    create_mirror_node,
+    apply_scan,
+    describe_stats
+)
+
+
+def touch(*parts):
+    path = os.path.join(base, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'w').close()
+
+
+def rescan(data, node_id):
+    mirror_path = data['nodes'][node_id]['mirror']['path']
+    scan = scan_directory(mirror_path, mirror_state(data, node_id))
+    return apply_scan(data, node_id, scan)
+
+
+def names(data, node_id):
+    node = data['nodes'][node_id]
+    return (
+        [data['nodes'][_id]['name'] for _id in node['sub_nodes']],
+        [data['items'][_id]['name'] for _id in node['items']]
+    )
+
+
+base = tempfile.mkdtemp()
+try:
+    touch('project', 'readme.md')
+    touch('project', 'src', 'main.py')
+    touch('project', 'src', 'util.py')
+    touch('project', 'docs', 'guide.md')
+    root = os.path.join(base, 'project')
+
+    d = DataStorage()
+    node_id = create_mirror_node(d, root)
+    stats = rescan(d, node_id)
+    print(describe_stats(stats))
+    assert names(d, node_id) == (['docs', 'src'], ['readme.md'])
+    assert stats['nodes_added'] == 2 and stats['items_added'] == 4
+    assert d.get_item_counts(node_id) == (1, 4)
+    src = d['nodes'][node_id]['sub_nodes'][1]
+    main_py = d['nodes'][src]['items'][0]
+    assert d['items'][main_py]['path'] == os.path.join(root, 'src', 'main.py')
+
+    # 手动添加的项不受扫描影响
+    manual = d.add_item({'name': 'site', 'path': 'https://example.com'}, src)
+
+    # 没有变化时不需要列出任何文件夹
+    stats = rescan(d, node_id)
+    assert stats['dirs_unchanged'] == 3 and stats['items_added'] == 0
+
+    # 只有变化的文件夹被重新列出
+    os.remove(os.path.join(root, 'src', 'util.py'))
+    touch('project', 'src', 'new.py')
+    shutil.rmtree(os.path.join(root, 'docs'))
+    touch('project', 'tests', 'test_main.py')
+    os.utime(os.path.join(root, 'src'), ns=(1, 1))
+    stats = rescan(d, node_id)
+    print(describe_stats(stats))
+    assert stats['nodes_added'] == 1 and stats['nodes_removed'] == 1
+    assert stats['items_added'] == 2 and stats['items_removed'] == 1
+    assert names(d, node_id) == (['src', 'tests'], ['readme.md'])
+    assert names(d, src) == ([], ['main.py', 'site', 'new.py'])
+    assert d['items'][manual]['parent_id'] == src
+    assert d.get_item_counts(node_id) == (1, 5)
+    # 数据保存再读取以后仍然可以继续增量扫描
+    d = DataStorage(json.loads(json.dumps(d)))
+    assert rescan(d, node_id)['dirs_unchanged'] == 3
+    assert d.search('ext:py') != []
+
+    # 作为后台任务扫描，报告进度，可以取消
+    many = os.path.join(base, 'many')
+    for i in range(250):
+        os.makedirs(os.path.join(many, f'{i:03}'))
+    scheduler = Scheduler(1)
+    progress = []
+    task = scheduler.submit(
+        lambda task: scan_directory(many, None, 4, task),
+        on_progress=lambda task: progress.append(task.done))
+    assert len(task.wait(10)) == 251
+    assert progress and progress == sorted(progress)
+    task = scheduler.submit(
+        lambda task: scan_directory(many, None, 1, task),
+        on_progress=lambda task: task.cancel())
+    try:
+        task.wait(10)
+    except Cancelled:
+        pass
+    assert task.state == CANCELLED
+    scheduler.shutdown()
+
+    # 文件夹不存在
+    shutil.rmtree(root)
+    assert rescan(d, node_id)['missing']
+finally:
+    shutil.rmtree(base, ignore_errors=True)
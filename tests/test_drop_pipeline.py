@@ -0,0 +1,73 @@
+import sys
+import os
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+from PySide6.QtCore import QCoreApplication, QUrl
+
+from PathManagerPlus.handle_data import DataStorage
+from PathManagerPlus.drop_pipeline import DropPipeline, path_to_item
+
+
+app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+
+assert path_to_item('/tmp/a/report.txt')['name'] == 'report.txt'
+assert path_to_item('/tmp/a/folder/')['name'] == 'folder'
+
+d = DataStorage()
+node = d.add_node('A')
+urls = [QUrl.fromLocalFile(f'/tmp/files/file{i}.txt') for i in range(1200)]
+
+# 少量直接处理
+pipeline = DropPipeline(d, urls[:10], node)
+results = []
+pipeline.finished.connect(lambda ids, cancelled: results.append(cancelled))
+pipeline.run()
+assert results == [False]
+assert d.get_item_counts(node) == (10, 10)
+
+# 大量分批处理，批与批之间会回到事件循环
+pipeline = DropPipeline(d, urls, node)
+chunks = []
+pipeline.chunkAdded.connect(lambda ids: chunks.append(len(ids)))
+pipeline.finished.connect(lambda ids, cancelled: app.quit())
+pipeline.start()
+app.exec()
+assert chunks == [500, 500, 200]
+assert len(pipeline.item_ids) == 1200
+assert d.get_item_counts(node) == (1210, 1210)
+assert d.search('file1199') == [pipeline.item_ids[-1]]
+
+# 中途取消，已经添加的项会被删除
+pipeline = DropPipeline(d, urls, node)
+pipeline.chunkAdded.connect(lambda ids: pipeline.cancel())
+pipeline.finished.connect(lambda ids, cancelled: app.quit())
+pipeline.start()
+app.exec()
+assert pipeline.cancelled
+assert d.get_item_counts(node) == (1210, 1210)
+assert len(d['items']) == 1210
+
+# 添加期间节点被删除：当作取消结束，不会留下不属于任何节点的项
+other = d.add_node('B')
+pipeline = DropPipeline(d, urls, other)
+results = []
+pipeline.chunkAdded.connect(lambda ids: d.remove_node(other))
+pipeline.finished.connect(lambda ids, cancelled: results.append(cancelled))
+pipeline.finished.connect(lambda ids, cancelled: app.quit())
+pipeline.start()
+app.exec()
+assert results == [True]
+assert len(pipeline.item_ids) == 500
+assert len(d['items']) == 1210
+assert d.check_data_integrity()
+
+# 节点不存在时什么都不添加
+try:
+    d.add_items(['x', 'y'], other)
+except KeyError:
+    pass
+else:
+    raise AssertionError('没有发现节点不存在')
+assert len(d['items']) == 1210
@@ -0,0 +1,143 @@
+import sys
+import os
+import io
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+from PathManagerPlus.handle_data import DataStorage, gen_base_data
+from PathManagerPlus.exchange import (
+    ExchangeError,
+    export,
+    guess_format,
+    import_file,
+    import_records,
+    iter_records,
+    md_escape,
+    md_unescape
+)
+
+
+def tree(data, node_id='root'):
+    """节点名称和项组成的嵌套结构，用于比较两份数据。
+    """
+    node = data['nodes'][node_id]
+    return (
+        [(data['items'][_id]['name'], data['items'][_id]['path'],
+          data['items'][_id]['comment']) for _id in node['items']],
+        [(data['nodes'][_id]['name'], tree(data, _id))
+         for _id in node['sub_nodes']]
+    )
+
+
+d = gen_base_data()
+general = d['nodes']['root']['sub_nodes'][0]
+program, link, other = d['nodes'][general]['sub_nodes']
+work = d.add_node('工作')
+# 没有项，只有子节点的节点排在有项的节点前面
+empty = d.add_node('空的', work)
+deep = d.add_node('深', empty)
+d.add_item({'name': '编辑器', 'path': '/usr/bin/vim', 'comment': None},
+           program)
+d.add_item({'name': 'a|b\\c', 'path': 'https://a.com/?x=1,2',
+            'comment': '第一行\n"第二行"'}, link)
+d.add_item({'name': '报告', 'path': '/tmp/报告.pdf', 'comment': '季度'},
+           deep)
+d.add_item('只有名称', other)
+d.add_item({'name': '周报', 'path': '/tmp/w.doc', 'comment': None}, work)
+d.add_node('最后', work)
+
+records = list(iter_records(d))
+assert records[0] == {'node': ['常规']}
+assert {'node': ['工作', '空的']} in records
+assert records.index({'node': ['工作', '空的']}) < records.index(
+    {'node': ['工作', '最后']})
+assert {'node': ['常规', '程序'], 'name': '编辑器', 'path': '/usr/bin/vim',
+        'comment': None} in records
+
+# 每种格式导出再导入，树和项都一样
+for fmt in ('csv', 'jsonl', 'md'):
+    fl = io.StringIO(newline='')
+    count = export(d, fl, fmt)
+    assert count == len(records)
+    fl.seek(0)
+    new = DataStorage()
+    added, created = import_file(new, fl, fmt, batch_size=2)
+    assert added == d.item_count(), fmt
+    assert created == d.node_count() - 1, fmt
+    assert tree(new) == tree(d), fmt
+    assert new.check_data_integrity()
+    # 再导入一次，同名节点直接使用
+    fl.seek(0)
+    added, created = import_file(new, fl, fmt)
+    assert created == 0 and new.item_count() == 2 * d.item_count()
+
+# 子树和搜索结果
+records = list(iter_records(d, work))
+assert records[0] == {'node': ['工作'], 'name': '周报', 'path': '/tmp/w.doc',
+                      'comment': None}
+assert len(records) == 4
+records = list(iter_records(d, item_ids=d.search('报告')))
+assert [r['name'] for r in records] == ['报告']
+assert records[0]['node'] == ['工作', '空的', '深']
+
+# 导入到其他节点下面
+new = gen_base_data()
+target = new['nodes']['root']['sub_nodes'][0]
+import_records(new, iter_records(d, item_ids=d.search('报告')), target)
+node_id = new.find_node('常规/工作/空的/深')
+assert [new['items'][_id]['name'] for _id in new['nodes'][node_id]['items']] \
+    == ['报告']
+
+# 没有名称时取路径最后一部分，项的其他字段保留
+new = DataStorage()
+fl = io.StringIO(
+    '{"node": ["a", "b"], "path": "/x/y.txt", "tag": 1}\n'
+    '\n'
+    '{"node": "a / c", "name": "z"}\n'
+)
+assert import_file(new, fl, 'jsonl') == (2, 3)
+item = new['items'][new['nodes'][new.find_node('a/b')]['items'][0]]
+assert item['name'] == 'y.txt' and item['tag'] == 1
+
+# 没有表头的 csv，列的顺序不同的 csv
+new = DataStorage()
+import_file(new, io.StringIO('a,n1,/p1,\r\n'), 'csv')
+import_file(new, io.StringIO('path,node\r\n/p2.txt,a / b\r\n'), 'csv')
+assert new['items'][new['nodes'][new.find_node('a/b')]['items'][0]]['name'] \
+    == 'p2.txt'
+
+# 格式错误时报告行号
+for fmt, text in (('jsonl', '{"node": ["a"], "name": "x"}\n{\n'),
+                  ('jsonl', '[1]\n'),
+                  ('csv', 'node,name\r\n,x\r\n')):
+    try:
+        import_file(DataStorage(), io.StringIO(text), fmt)
+    except ExchangeError as e:
+        assert '第 ' in str(e)
+    else:
+        raise AssertionError(f'没有报告格式错误：{text}')
+
+# Markdown 中的转义
+for text in ('a|b', 'a\\|b', 'x\ny', '\\', 'a\\nb'):
+    assert md_unescape(md_escape(text)) == text
+
+assert guess_format('a/b.CSV') == 'csv'
+assert guess_format('b.ndjson') == 'jsonl'
+assert guess_format('b.markdown') == 'md'
+assert guess_format('b.txt') is None
+
+# 导入时一边读一边分批添加，不会先把所有记录读出来
+new = DataStorage()
+seen = []
+
+
+def stream():
+    for i in range(5):
+        # 前面的批次已经添加到数据中
+        seen.append(new.item_count())
+        yield {'node': ['大'], 'name': f'{i}', 'path': f'/{i}'}
+
+
+assert import_records(new, stream(), batch_size=2) == (5, 1)
+assert seen == [0, 0, 0, 2, 2]
@@ -0,0 +1,169 @@
+import sys
+import os
+import json
+import shutil
+import tempfile
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+from PathManagerPlus.handle_data import DataStorage
+from PathManagerPlus.file_sync import (
+    DataFile,
+    FileChangedError,
+    encode_data,
+    merge_data
+)
+
+
+def open_instance(data_path):
+    data_file = DataFile(data_path)
+    data = DataStorage(data_file.read())
+    return data_file, data
+
+
+def save(data_file, data, check=True):
+    data_file.write(encode_data(data), check)
+    data.clear_dirty(data.generation)
+
+
+def sync_and_save(data_file, data):
+    # 和 MainWindow.save 一样：发现冲突时先合并再保存
+    with data_file.lock():
+        try:
+            save(data_file, data)
+        except FileChangedError:
+            disk = data_file.read()
+            data.replace_data(merge_data(data, disk), keep_dirty=True)
+            save(data_file, data, check=False)
+
+
+def node_names(data, node_id):
+    return [data['nodes'][_id]['name']
+            for _id in data['nodes'][node_id]['sub_nodes']]
+
+
+def item_names(data, node_id):
+    return [data['items'][_id]['name']
+            for _id in data['nodes'][node_id]['items']]
+
+
+base = tempfile.mkdtemp()
+try:
+    data_path = os.path.join(base, 'data.json')
+    d = DataStorage()
+    a = d.add_node('A')
+    b = d.add_node('B')
+    c = d.add_node('C', b)
+    x = d.add_item('x', a)
+    DataFile(data_path).write(encode_data(d))
+
+    # 两个程序打开同一个文件，各自修改
+    file1, d1 = open_instance(data_path)
+    file2, d2 = open_instance(data_path)
+    assert not file1.changed()
+    d1.add_item('from 1', a)
+    d1.update_item(x, {'name': 'x1'})
+    d2.add_item('from 2', a)
+    d2.add_node('D')
+    save(file2, d2)
+    assert file1.changed()
+    try:
+        save(file1, d1)
+    except FileChangedError:
+        pass
+    else:
+        raise AssertionError('没有发现文件被修改过')
+
+    # 合并以后两边新加的内容都在
+    sync_and_save(file1, d1)
+    assert d1.check_data_integrity()
+    assert item_names(d1, a) == ['x1', 'from 1', 'from 2']
+    assert node_names(d1, 'root') == ['A', 'B', 'D']
+    assert not d1.is_dirty()
+    saved = json.load(open(data_path, encoding='utf-8'))
+    assert saved == json.loads(encode_data(d1).decode('utf-8'))
+
+    # 本程序删除的节点，其他程序在下面新加的项也一起删除
+    file2, d2 = open_instance(data_path)
+    d1.remove_node(b)
+    d2.add_item('under C', c)
+    save(file2, d2)
+    sync_and_save(file1, d1)
+    assert d1.check_data_integrity()
+    assert b not in d1['nodes'] and c not in d1['nodes']
+    assert 'under C' not in [item['name'] for item in d1['items'].values()]
+
+    # 其他程序删除了节点，本程序在下面新加了项：节点被恢复
+    e = d1.add_node('E')
+    f = d1.add_node('F', e)
+    save(file1, d1)
+    file2, d2 = open_instance(data_path)
+    d2.remove_node(e)
+    d1.add_item('keep', f)
+    save(file2, d2)
+    sync_and_save(file1, d1)
+    assert d1.check_data_integrity()
+    assert node_names(d1, 'root')[-1] == 'E'
+    assert node_names(d1, e) == ['F']
+    assert item_names(d1, f) == ['keep']
+
+    # 两边移动节点形成环：本程序把 G 移到 P 下面的 H，其他程序把 P 移到
+    # G 下面，这时本程序移动的节点放到第一层
+    g = d1.add_node('G')
+    p = d1.add_node('P')
+    h = d1.add_node('H', p)
+    save(file1, d1)
+    file2, d2 = open_instance(data_path)
+    d1.change_node_parent(g, h, 0)
+    d2.change_node_parent(p, g, 0)
+    save(file2, d2)
+    sync_and_save(file1, d1)
+    assert d1.check_data_integrity()
+    assert d1['nodes'][g]['parent_id'] == 'root'
+    assert d1['nodes'][p]['parent_id'] == g
+    assert d1['nodes'][h]['parent_id'] == p
+
+    # 本程序删除了 Q，其他程序把已有的节点 M 和项 y 移到 Q 下面：它们
+    # 留在本程序中原来的位置，不会挂在不存在的节点下面
+    q = d1.add_node('Q')
+    m = d1.add_node('M', a)
+    y = d1.add_item('y', a)
+    save(file1, d1)
+    file2, d2 = open_instance(data_path)
+    d1.remove_node(q)
+    d2.change_node_parent(m, q, 0)
+    d2.move_item_to_node(y, q)
+    save(file2, d2)
+    sync_and_save(file1, d1)
+    assert d1.check_data_integrity()
+    assert q not in d1['nodes']
+    assert all(node['parent_id'] in d1['nodes']
+               for _id, node in d1['nodes'].items() if _id != 'root')
+    assert all(item['parent_id'] in d1['nodes']
+               for item in d1['items'].values())
+    assert d1['nodes'][m]['parent_id'] == a
+    assert m in d1['nodes'][a]['sub_nodes']
+    assert d1['items'][y]['parent_id'] == a and y in d1['nodes'][a]['items']
+
+    # 移到其他程序在被删除的节点下面新建的节点中，也一样放回原来的位置
+    r = d1.add_node('R')
+    save(file1, d1)
+    file2, d2 = open_instance(data_path)
+    d1.remove_node(r)
+    n = d2.add_node('N', r)
+    d2.move_item_to_node(y, n)
+    save(file2, d2)
+    sync_and_save(file1, d1)
+    assert d1.check_data_integrity()
+    assert r not in d1['nodes'] and n not in d1['nodes']
+    assert d1['items'][y]['parent_id'] == a and y in d1['nodes'][a]['items']
+
+    # 只是修改时间变了，内容相同时不算修改
+    file1, d1 = open_instance(data_path)
+    stat = os.stat(data_path)
+    os.utime(data_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert not file1.changed()
+    save(file1, d1)
+finally:
+    shutil.rmtree(base, ignore_errors=True)
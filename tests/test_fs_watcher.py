@@ -0,0 +1,143 @@
+import sys
+import os
+import time
+import shutil
+import tempfile
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+from PySide6.QtCore import QCoreApplication, QEventLoop
+
+from PathManagerPlus.handle_data import DataStorage
+from PathManagerPlus.fs_watcher import FileWatcher, plan_directories
+
+
+class FakeBackend:
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.directories = set()
+
+    def add(self, paths):
+        self.directories.update(paths)
+
+    def remove(self, paths):
+        self.directories.difference_update(paths)
+
+    def watched(self):
+        return set(self.directories)
+
+
+app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+
+
+def wait_tasks(watcher):
+    """安排和检查都是后台任务，等它们完成并在主线程中应用结果。
+    """
+    deadline = time.monotonic() + 5
+    while watcher.refresh_task or watcher.check_task:
+        assert time.monotonic() < deadline
+        app.processEvents(QEventLoop.AllEvents, 20)
+
+
+base = tempfile.mkdtemp()
+try:
+    d = DataStorage()
+    nodes = []
+    for i in range(5):
+        node_id = d.add_node(f'node {i}')
+        nodes.append(node_id)
+        folder = os.path.join(base, f'dir{i}')
+        os.makedirs(folder)
+        for j in range(3):
+            path = os.path.join(folder, f'file{j}.txt')
+            open(path, 'w').close()
+            d.add_item({'name': f'file{j}', 'path': path}, node_id)
+    d.add_item({'name': 'web', 'path': 'https://example.com'}, nodes[0])
+
+    # 每个文件夹只注册一次，网址不监视；达到上限后最近打开的节点优先
+    plan = plan_directories(d, [], 10)
+    assert list(plan) == [os.path.join(base, f'dir{i}') for i in range(5)]
+    assert len(plan[os.path.join(base, 'dir0')]) == 3
+    plan = plan_directories(d, [nodes[4], nodes[3]], 2)
+    assert list(plan) == [os.path.join(base, 'dir4'), os.path.join(base, 'dir3')]
+
+    watcher = FileWatcher(d, limit=2, backend_class=FakeBackend)
+    changes = []
+    watcher.statusChanged.connect(changes.append)
+    watcher.touch_node(nodes[1])
+    watcher.refresh()
+    wait_tasks(watcher)
+    assert watcher.backend.directories == {
+        os.path.join(base, 'dir1'), os.path.join(base, 'dir0')}
+    assert changes == []
+
+    # 一连串的变化合并成一次检查
+    dir1 = os.path.join(base, 'dir1')
+    os.remove(os.path.join(dir1, 'file0.txt'))
+    os.rename(os.path.join(dir1, 'file1.txt'), os.path.join(dir1, 'x.txt'))
+    watcher.directory_changed(dir1)
+    watcher.directory_changed(dir1)
+    assert watcher.flush_timer.isActive()
+    watcher.flush()
+    wait_tasks(watcher)
+    missing = d['nodes'][nodes[1]]['items'][:2]
+    assert changes == [missing]
+    assert d.is_item_missing(missing[0]) and d.is_item_missing(missing[1])
+
+    # 改回来以后状态恢复
+    os.rename(os.path.join(dir1, 'x.txt'), os.path.join(dir1, 'file1.txt'))
+    watcher.directory_changed(dir1)
+    watcher.flush()
+    wait_tasks(watcher)
+    assert changes[-1] == [missing[1]]
+    assert not d.is_item_missing(missing[1])
+
+    # 修改路径以后重新检查
+    d.update_item(missing[0], {'path': os.path.join(dir1, 'file2.txt')})
+    assert not d.is_item_missing(missing[0])
+    watcher.refresh()
+    wait_tasks(watcher)
+    assert not d.is_item_missing(missing[0])
+
+    # 新的检查取代还没有完成的检查，之前的文件夹一起检查
+    dir0 = os.path.join(base, 'dir0')
+    os.remove(os.path.join(dir0, 'file0.txt'))
+    os.remove(os.path.join(dir1, 'file1.txt'))
+    watcher.directory_changed(dir0)
+    watcher.flush()
+    watcher.directory_changed(dir1)
+    watcher.flush()
+    wait_tasks(watcher)
+    assert d.is_item_missing(d['nodes'][nodes[0]]['items'][0])
+    assert d.is_item_missing(missing[1])
+    assert watcher.unchecked == set()
+    open(os.path.join(dir0, 'file0.txt'), 'w').close()
+    open(os.path.join(dir1, 'file1.txt'), 'w').close()
+    watcher.directory_changed(dir0)
+    watcher.directory_changed(dir1)
+    watcher.flush()
+    wait_tasks(watcher)
+    assert len(d.missing_items) == 0
+
+    # 打开其他节点后监视的文件夹跟着调整
+    watcher.touch_node(nodes[4])
+    watcher.refresh()
+    wait_tasks(watcher)
+    assert os.path.join(base, 'dir4') in watcher.backend.directories
+    assert len(watcher.backend.directories) == 2
+
+    # 删除整个文件夹
+    shutil.rmtree(os.path.join(base, 'dir4'))
+    watcher.directory_changed(os.path.join(base, 'dir4'))
+    watcher.flush()
+    wait_tasks(watcher)
+    assert all(d.is_item_missing(x) for x in d['nodes'][nodes[4]]['items'])
+    d.remove_node(nodes[4])
+    assert len(d.missing_items) == 0
+
+    watcher.stop()
+    assert watcher.backend.directories == set()
+finally:
+    shutil.rmtree(base, ignore_errors=True)
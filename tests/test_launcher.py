@@ -0,0 +1,122 @@
+import sys
+import os
+import time
+import subprocess
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+from PySide6.QtCore import QCoreApplication, QEventLoop
+
+from PathManagerPlus.launcher import (
+    TokenBucket,
+    LaunchQueue,
+    Launcher,
+    LaunchError
+)
+
+
+def spawn(code):
+    return subprocess.Popen([sys.executable, '-c', code])
+
+
+# 令牌桶
+bucket = TokenBucket(rate=2, burst=3)
+assert [bucket.take(0) for i in range(4)] == [True, True, True, False]
+assert bucket.wait_time(0) == 0.5
+assert bucket.take(0.5) and not bucket.take(0.6)
+# 最多存 burst 个
+assert [bucket.take(100) for i in range(4)] == [True, True, True, False]
+
+# 启动的速度和同时启动的数量都有限制，不再有 5 项的上限
+started = []
+queue = LaunchQueue(max_starting=3, rate=10, burst=5, settle=1)
+for i in range(50):
+    queue.submit(f'项{i}', started.append, i)
+assert queue.pump(0) == [] and started == [0, 1, 2, 3, 4]
+assert queue.next_delay(0) == 0.1
+queue.pump(0.05)
+assert len(started) == 5
+now = 0.0
+while not queue.idle():
+    now += queue.next_delay(now)
+    queue.pump(now)
+assert started == list(range(50))
+assert queue.done == queue.total == 50
+# 50 项大约用 (50 - 5) / 10 秒
+assert 4.4 < now < 4.6, now
+assert queue.next_delay(now) is None
+
+
+def missing(path):
+    raise LaunchError(f'找不到目标路径：{path}')
+
+
+def no_program():
+    raise FileNotFoundError(2, 'No such file or directory', 'xdg-open')
+
+
+# 失败的请求报告出来，不影响后面的请求
+queue = LaunchQueue(rate=1000, burst=1000)
+queue.submit('a', missing, '/no/a')
+queue.submit('b', no_program)
+queue.submit('c', lambda: False)
+queue.submit('d', lambda: True)
+failures = queue.pump(0)
+assert failures == [
+    ('a', '找不到目标路径：/no/a'),
+    ('b', 'No such file or directory：xdg-open'),
+    ('c', '无法打开')
+]
+assert queue.idle() and queue.done == 4
+# 提交前就失败的请求和其他请求算作同一批
+queue.fail('e', '找不到')
+queue.submit('f', lambda: True)
+assert not queue.idle() and queue.total == 2
+assert queue.pump(1) == [('e', '找不到')]
+assert queue.idle() and queue.done == 2
+
+# 子进程：刚启动就以非 0 状态退出的算失败，长时间运行的不占用名额
+queue = LaunchQueue(max_starting=2, rate=1000, burst=1000, settle=0.5)
+queue.submit('ok', spawn, 'pass')
+queue.submit('bad', spawn, 'import sys; sys.exit(3)')
+queue.submit('long', spawn, 'import time; time.sleep(1.5)')
+start = time.monotonic()
+assert queue.pump(start) == []
+assert len(queue.starting) == 2 and len(queue.pending) == 1
+failures = []
+while queue.busy():
+    time.sleep(queue.next_delay(time.monotonic()))
+    failures += queue.pump(time.monotonic())
+    if len(queue.detached) == 1:
+        # 运行超过 settle 的进程已经完成了启动
+        assert queue.idle() and queue.done == 3
+assert failures == [('bad', '程序退出，状态是 3')]
+# 所有子进程都被回收了
+assert not queue.starting and not queue.detached
+
+# 界面版本由定时器驱动
+app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+launcher = Launcher(LaunchQueue(max_starting=4, rate=200, burst=10))
+failed = []
+progress = []
+launcher.failed.connect(lambda label, message: failed.append(label))
+launcher.progress.connect(lambda done, total: progress.append((done, total)))
+opened = []
+for i in range(30):
+    if i == 0:
+        launcher.fail(f'项{i}', '找不到')
+    elif i % 10 == 9:
+        launcher.submit(f'项{i}', missing, i)
+    else:
+        launcher.submit(f'项{i}', opened.append, i)
+# 不用 app.exec，其他测试留下的 app.quit 不会影响这里
+deadline = time.monotonic() + 3
+while launcher.queue.busy() and time.monotonic() < deadline:
+    app.processEvents(QEventLoop.AllEvents, 20)
+assert len(opened) == 26
+assert failed == ['项0', '项9', '项19', '项29']
+assert progress[-1] == (30, 30)
+assert [done for done, total in progress] == sorted(
+    done for done, total in progress)
+launcher.stop()
@@ -0,0 +1,71 @@
+import sys
+import os
+import random
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+from PathManagerPlus.handle_data import DataStorage
+
+
+def brute_counts(d, node_id):
+    direct = len(d['nodes'][node_id]['items'])
+    total = sum(
+        len(d['nodes'][sub_id]['items']) for sub_id in d.iter_subtree(node_id)
+    )
+    return direct, total
+
+
+def check(d):
+    for node_id in d['nodes']:
+        assert d.get_item_counts(node_id) == brute_counts(d, node_id), node_id
+
+
+def is_under(d, node_id, ancestor_id):
+    while node_id is not None:
+        if node_id == ancestor_id:
+            return True
+        node_id = d['nodes'][node_id]['parent_id']
+    return False
+
+
+random.seed(2)
+d = DataStorage()
+node_ids = []
+for i in range(30):
+    parent_id = random.choice(node_ids) if node_ids else 'root'
+    node_ids.append(d.add_node(f'n{i}', parent_id))
+# 先建立计数，后面的操作都是增量更新
+check(d)
+for step in range(300):
+    items = list(d['items'])
+    action = random.choice(
+        ['add', 'add_many', 'remove', 'remove_many', 'move', 'move_many',
+         'move_node'])
+    if action == 'add':
+        d.add_item(f'i{step}', random.choice(node_ids))
+    elif action == 'add_many':
+        d.add_items(
+            [f'i{step}-{i}' for i in range(5)], random.choice(node_ids))
+    elif action == 'remove' and items:
+        d.remove_item(random.choice(items))
+    elif action == 'remove_many' and items:
+        d.remove_items(random.sample(items, min(4, len(items))))
+    elif action == 'move' and items:
+        d.move_item_to_node(random.choice(items), random.choice(node_ids))
+    elif action == 'move_many' and items:
+        d.move_items_to_node(
+            random.sample(items, min(6, len(items))), random.choice(node_ids))
+    elif action == 'move_node':
+        node_id = random.choice(node_ids)
+        new_parent_id = random.choice(node_ids + ['root'])
+        if not is_under(d, new_parent_id, node_id) \
+                and d['nodes'][node_id]['parent_id'] != new_parent_id:
+            d.change_node_parent(node_id, new_parent_id, 0)
+check(d)
+node_id = random.choice(d['nodes']['root']['sub_nodes'])
+d.remove_node(node_id)
+check(d)
+print(d.get_item_counts('root'), d.item_count())
+assert d.get_item_counts('root')[1] == d.item_count()
+assert d.check_data_integrity()
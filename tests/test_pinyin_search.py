@@ -0,0 +1,39 @@
+import sys
+import os
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+from PathManagerPlus.handle_data import DataStorage
+from PathManagerPlus.pinyin import to_pinyin
+
+
+print(to_pinyin('常规'), to_pinyin('Python 工具'))
+assert to_pinyin('常规') == ('changgui', 'cg')
+
+d = DataStorage()
+node_a = d.add_node('常规')
+node_b = d.add_node('程序', node_a)
+item1 = d.add_item('常规文档', node_b)
+item2 = d.add_item('工具箱', node_b)
+item3 = d.add_item('cgi-bin', node_b)
+
+for use_index in (False, True):
+    assert d.search('cg', use_index) == [item1, item3]
+    assert d.search('py:cg', use_index) == [item1]
+    assert d.search('gongju', use_index) == [item2]
+    assert d.search('-py:gjx', use_index) == [item1, item3]
+print(d.explain_query('cg'))
+
+# 改名以后拼音索引需要同步更新
+d.update_item(item2, {'name': '常用工具'})
+assert d.search('cy') == [item2]
+assert d.search('gjx') == []
+d.remove_item(item1)
+assert d.search('py:cg') == []
+
+assert d.match_node_name(node_a, 'cg')
+assert d.match_node_name(node_b, 'CX')
+assert not d.match_node_name(node_b, 'cg')
+d.change_node_name(node_b, '常规程序')
+assert d.match_node_name(node_b, 'cgcx')
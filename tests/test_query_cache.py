@@ -0,0 +1,66 @@
+import sys
+import os
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+from PathManagerPlus.handle_data import DataStorage
+from PathManagerPlus.search import QueryCache
+
+
+d = DataStorage()
+node_a = d.add_node('A')
+node_b = d.add_node('B')
+report = d.add_item({'name': 'Report', 'path': '/a/report.xlsx'}, node_a)
+draft = d.add_item({'name': 'Draft', 'path': '/a/draft.docx'}, node_b)
+
+# 相同的查询第二次直接命中缓存，写法不同但含义相同的查询也一样
+assert d.search('report') == [report]
+assert d.search('REPORT') == [report]
+assert d.query_cache.hits == 1
+
+plan = d.plan_query('ext:xlsx')
+d.execute_plan(plan)
+plan = d.plan_query('ext:.XLSX')
+assert d.execute_plan(plan) == [report]
+assert plan.cached
+print(plan.explain())
+print(d.query_cache.describe())
+
+# 修改项以后缓存过期
+d.update_item(draft, {'name': 'Report Draft'})
+assert d.search('report') == [report, draft]
+assert d.query_cache.stale == 1
+
+# 调整顺序、移动项不影响不限定范围的查询
+hits = d.query_cache.hits
+d.move_item_to_node(draft, node_a)
+d.move_item_to_first(draft)
+assert d.search('report') == [report, draft]
+assert d.query_cache.hits == hits + 1
+
+# 限定范围的查询在树结构变化后过期
+assert d.search('report', scope=node_b) == []
+d.move_item_to_node(draft, node_b)
+assert d.search('report', scope=node_b) == [draft]
+d.change_node_parent(node_b, node_a, 0)
+assert d.search('report', scope=node_a) == [report, draft]
+d.remove_node(node_b)
+assert d.search('report', scope=node_a) == [report]
+assert d.search('report') == [report]
+
+# 缓存结果是副本，调用方修改不会影响缓存
+result = d.search('report')
+result.append('x')
+assert d.search('report') == [report]
+
+# LRU 淘汰最久没用过的结果
+cache = QueryCache(maxsize=2)
+cache.put('a', 0, [1])
+cache.put('b', 0, [2])
+assert cache.get('a', lambda generation: True) == (1,)
+cache.put('c', 0, [3])
+assert cache.get('b', lambda generation: True) is None
+assert cache.get('a', lambda generation: True) == (1,)
+assert cache.info()['evictions'] == 1
+print(cache.info())
@@ -0,0 +1,189 @@
+import sys
+import os
+import time
+import asyncio
+import threading
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+from PySide6.QtCore import QCoreApplication, QEventLoop
+
+from PathManagerPlus.qt_scheduler import QtScheduler
+from PathManagerPlus.scheduler import (
+    CANCELLED,
+    DONE,
+    FAILED,
+    INTERACTIVE,
+    MAINTENANCE,
+    NORMAL,
+    Cancelled,
+    Scheduler
+)
+
+scheduler = Scheduler(workers=1)
+
+# 普通函数在工作线程中运行，第一个参数是 Task
+task = scheduler.submit(lambda task, a, b: a + b, 1, 2, name='加法')
+assert task.wait(5) == 3 and task.state == DONE
+assert task.run_time >= 0 and task.queue_time >= 0
+assert scheduler.timings['加法'][0] == 1
+
+# 唯一的工作线程被占着时，排队的任务按优先级运行
+gate = threading.Event()
+order = []
+blocker = scheduler.submit(lambda task: gate.wait(5))
+for name, priority in [('维护', MAINTENANCE), ('普通', NORMAL),
+                       ('搜索', INTERACTIVE), ('普通2', NORMAL)]:
+    scheduler.submit(lambda task, name=name: order.append(name),
+                     name=name, priority=priority)
+last = scheduler.submit(lambda task: None, priority=MAINTENANCE)
+# 排队时间也计算在内
+time.sleep(0.05)
+gate.set()
+last.wait(5)
+assert order == ['搜索', '普通', '普通2', '维护']
+assert last.queue_time >= 0.05
+
+# 取消还在排队的任务，函数不会被调用
+gate.clear()
+blocker = scheduler.submit(lambda task: gate.wait(5))
+finished = []
+queued = scheduler.submit(lambda task: order.append('不应该运行'),
+                          on_done=finished.append)
+queued.cancel()
+assert queued.state == CANCELLED and finished == [queued]
+gate.set()
+blocker.wait(5)
+try:
+    queued.wait(5)
+except Cancelled:
+    pass
+else:
+    raise AssertionError('没有抛出 Cancelled')
+assert '不应该运行' not in order
+
+# 正在运行的任务检查取消，报告进度
+progress = []
+started = threading.Event()
+
+
+def count(task):
+    for i in range(1000):
+        task.progress(i, 1000)
+        started.set()
+        task.check()
+        time.sleep(0.001)
+    return 'finished'
+
+
+running = scheduler.submit(count, on_progress=lambda task: progress.append(
+    (task.done, task.total)))
+started.wait(5)
+running.cancel()
+try:
+    running.wait(5)
+except Cancelled:
+    pass
+assert running.state == CANCELLED
+assert progress and progress[0] == (0, 1000) and len(progress) < 1000
+
+# 已经结束的任务不受取消影响
+task = scheduler.submit(lambda task: 1)
+task.wait(5)
+task.cancel()
+assert task.state == DONE and not task.cancelled
+
+# 异常记录在 task.error 中，wait 时重新抛出
+task = scheduler.submit(lambda task: 1 / 0)
+try:
+    task.wait(5)
+except ZeroDivisionError:
+    pass
+assert task.state == FAILED and isinstance(task.error, ZeroDivisionError)
+
+
+# async 函数在事件循环中运行，取消时被 asyncio 取消
+async def sleep_then(task, value):
+    await asyncio.sleep(0.01)
+    return value
+
+
+assert scheduler.submit(sleep_then, 'ok').wait(5) == 'ok'
+cleanup = []
+
+
+async def forever(task):
+    try:
+        await asyncio.sleep(60)
+    finally:
+        cleanup.append(True)
+
+
+task = scheduler.submit(forever)
+time.sleep(0.05)
+task.cancel()
+try:
+    task.wait(5)
+except Cancelled:
+    pass
+assert task.state == CANCELLED and cleanup == [True]
+
+# 相同 key 的新任务取消之前的任务，比如连续输入的搜索
+gate.clear()
+blocker = scheduler.submit(lambda task: gate.wait(5))
+first = scheduler.submit(lambda task: '第一次', key='搜索')
+second = scheduler.submit(lambda task: '第二次', key='搜索')
+gate.set()
+assert second.wait(5) == '第二次' and first.state == CANCELLED
+
+# 关闭时取消还没有完成的任务
+gate.clear()
+blocker = scheduler.submit(lambda task: gate.wait(5))
+queued = scheduler.submit(lambda task: None)
+events = []
+scheduler.listeners.append(lambda event, task: events.append(event))
+threading.Timer(0.05, gate.set).start()
+scheduler.shutdown(wait=True, timeout=5)
+assert queued.state == CANCELLED and blocker.state == CANCELLED
+assert 'finished' in events
+try:
+    scheduler.submit(lambda task: None)
+except RuntimeError:
+    pass
+else:
+    raise AssertionError('关闭以后不能再提交任务')
+assert '加法' in scheduler.format_timings()
+
+# 多个工作线程同时运行
+scheduler = Scheduler(workers=3)
+barrier = threading.Barrier(3, timeout=5)
+tasks = [scheduler.submit(lambda task: barrier.wait()) for _ in range(3)]
+for task in tasks:
+    task.wait(5)
+scheduler.shutdown()
+
+# 界面中使用时，回调和通知都在主线程中
+app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+qt_scheduler = QtScheduler(2)
+main_thread = threading.current_thread()
+threads = []
+signals = []
+qt_scheduler.taskStarted.connect(lambda task: signals.append('started'))
+qt_scheduler.taskProgress.connect(lambda task: signals.append('progress'))
+qt_scheduler.taskFinished.connect(lambda task: signals.append('finished'))
+
+
+def work(task):
+    task.progress(1, 1)
+    return threading.current_thread()
+
+
+task = qt_scheduler.submit(
+    work, on_done=lambda task: threads.append(threading.current_thread()))
+deadline = time.monotonic() + 5
+while not threads and time.monotonic() < deadline:
+    app.processEvents(QEventLoop.AllEvents, 20)
+assert threads == [main_thread] and task.result is not main_thread
+assert signals == ['started', 'progress', 'finished']
+qt_scheduler.shutdown()
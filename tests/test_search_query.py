@@ -0,0 +1,90 @@
+import sys
+import os
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+from PathManagerPlus.handle_data import DataStorage
+from PathManagerPlus.search import parse_query, Vocabulary
+
+
+print(parse_query('name:report ext:.XLSX path:"/mnt/my share" -comment:old'))
+print(parse_query(r'C:\Users http://example.com -'))
+
+d = DataStorage()
+node_a = d.add_node('A')
+report = d.add_item({
+    'name': 'Monthly Report',
+    'path': '/mnt/share/finance/report-2024.xlsx',
+    'comment': 'new'
+}, node_a)
+old_report = d.add_item({
+    'name': 'Old Report',
+    'path': '/mnt/share/finance/report-2019.xlsx',
+    'comment': 'old version'
+}, node_a)
+doc = d.add_item({
+    'name': 'Report Draft',
+    'path': '/home/me/report.docx',
+    'comment': None
+}, node_a)
+url = d.add_item({
+    'name': 'Python',
+    'path': 'https://www.python.org',
+    'comment': ''
+}, node_a)
+unc = d.add_item({
+    'name': 'Team',
+    'path': r'\\server\team',
+    'comment': ''
+}, node_a)
+
+queries = {
+    'name:report ext:xlsx path:/mnt/share -comment:old': [report],
+    'report': [report, old_report, doc],
+    'ext:docx': [doc],
+    'scheme:https': [url],
+    'scheme:unc': [unc],
+    'scheme:local -ext:xlsx': [doc],
+    'port': [report, old_report, doc],
+    'are/fin': [report, old_report],
+    '"monthly report"': [report],
+}
+# 索引查询和全表扫描的结果必须完全一致
+for query, expected in queries.items():
+    assert d.search(query, use_index=False) == expected, query
+    assert d.search(query) == expected, query
+print(d.explain_query('name:report ext:xlsx path:/mnt/share -comment:old'))
+
+# 索引需要跟着增删改一起更新
+d.update_item(doc, {'path': '/home/me/report.xlsx'})
+assert d.search('ext:docx') == []
+assert d.search('ext:xlsx') == [report, old_report, doc]
+d.remove_item(old_report)
+assert d.search('report') == [report, doc]
+new_item = d.add_item({
+    'name': 'Report Final',
+    'path': '/mnt/share/final.xlsx',
+    'comment': ''
+}, node_a)
+assert d.search('ext:xlsx name:report') == [report, doc, new_item]
+d.remove_node(node_a)
+assert d.search('report') == []
+
+# 词表：前缀、后缀、包含关系，每个词只返回一次
+postings = {'report': 1, 'preport': 2, 'port': 3, 'xlsx': 4}
+vocabulary = Vocabulary()
+assert vocabulary.find(postings, 'port') == ['report', 'preport', 'port']
+assert vocabulary.find(postings, 'rep', prefix=True) == ['report']
+assert vocabulary.find(postings, 'ort', suffix=True) == [
+    'report', 'preport', 'port']
+assert vocabulary.find(postings, 'p', prefix=True) == ['preport', 'port']
+assert vocabulary.find(postings, 'x') == ['xlsx']
+assert vocabulary.find(postings, 'zz') == []
+
+# 新增的词在包含查找中也能找到
+summary = d.add_item({'name': 'Quarterly Summary', 'path': ''}, 'root')
+assert d.search('arterl') == [summary]
+d.update_item(summary, {'name': 'Yearly'})
+assert d.search('arterl') == []
+assert d.search('earl') == [summary]
@@ -0,0 +1,120 @@
+import sys
+import os
+import time
+import tempfile
+import threading
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+from PathManagerPlus.single_instance import (
+    UnsafeSocketError,
+    check_socket,
+    runtime_dir,
+    server_name,
+    parse_args,
+    encode_request,
+    decode_request,
+    send_request
+)
+
+
+# 不同的数据文件对应不同的名称
+assert server_name('/a/data.json') != server_name('/b/data.json')
+assert server_name('/a/data.json') == server_name('/a/../a/data.json')
+
+# 套接字放在只有当前用户可以访问的文件夹中
+if os.name != 'nt':
+    folder = runtime_dir()
+    stat = os.stat(folder)
+    assert stat.st_uid == os.getuid() and not stat.st_mode & 0o077
+    assert os.path.dirname(server_name('/a/data.json')) == folder
+    saved = os.environ.get('XDG_RUNTIME_DIR'), tempfile.tempdir
+    try:
+        # XDG_RUNTIME_DIR 其他用户可以访问时不使用
+        tempfile.tempdir = tempfile.mkdtemp()
+        os.environ['XDG_RUNTIME_DIR'] = tempfile.tempdir
+        os.chmod(tempfile.tempdir, 0o755)
+        folder = runtime_dir()
+        assert os.path.dirname(folder) == tempfile.tempdir
+        assert os.stat(folder).st_mode & 0o777 == 0o700
+        # 已经存在的文件夹权限不对时不使用
+        os.chmod(folder, 0o755)
+        try:
+            runtime_dir()
+        except UnsafeSocketError:
+            pass
+        else:
+            raise AssertionError('没有发现文件夹不安全')
+        # 不是套接字的文件不连接
+        fake = os.path.join(tempfile.tempdir, 'fake.sock')
+        open(fake, 'w').close()
+        try:
+            check_socket(fake)
+        except UnsafeSocketError:
+            pass
+        else:
+            raise AssertionError('没有发现不是套接字')
+    finally:
+        if saved[0] is None:
+            os.environ.pop('XDG_RUNTIME_DIR', None)
+        else:
+            os.environ['XDG_RUNTIME_DIR'] = saved[0]
+        tempfile.tempdir = saved[1]
+
+request = parse_args(['a.txt', '/tmp/b', '--search', 'ext:py'])
+assert request['paths'] == ['a.txt', '/tmp/b']
+assert request['search'] == 'ext:py'
+assert not request['new_instance']
+# 分析启动时间时总是打开新的窗口
+profiling = parse_args(['--profile-startup'])
+assert profiling['profile_startup'] and profiling['new_instance']
+assert parse_args([])['paths'] == []
+
+# 相对路径以发出请求的程序的当前文件夹为准
+request['cwd'] = '/home/user'
+decoded = decode_request(encode_request(request).strip())
+assert decoded['paths'] == [
+    os.path.abspath('/home/user/a.txt'), os.path.abspath('/tmp/b')]
+assert decoded['search'] == 'ext:py'
+assert decode_request(b'not json') is None
+assert decode_request(b'[1, 2]') is None
+
+# 没有窗口在运行
+name = os.path.join(tempfile.mkdtemp(), 'test.sock') \
+    if os.name != 'nt' else f'PathManagerPlus-test-{os.getpid()}'
+assert not send_request(request, name, timeout=0.5)
+
+from PySide6.QtCore import QCoreApplication, QEventLoop
+
+from PathManagerPlus.instance_server import InstanceServer
+
+app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+server = InstanceServer(name)
+assert server.listen()
+# 已经有程序在监听时不能再监听
+other = InstanceServer(name)
+assert not other.listen()
+
+received = []
+server.requestReceived.connect(received.append)
+results = []
+thread = threading.Thread(
+    target=lambda: results.append(send_request(request, name)))
+thread.start()
+# 不用 app.exec，其他测试留下的 app.quit 不会影响这里
+deadline = time.monotonic() + 3
+while not received and time.monotonic() < deadline:
+    app.processEvents(QEventLoop.AllEvents, 20)
+thread.join()
+assert results == [True]
+assert received[-1]['paths'] == decoded['paths']
+assert received[-1]['search'] == 'ext:py'
+server.close()
+
+# 异常退出留下的套接字不影响下次监听
+if os.name != 'nt':
+    open(name, 'w').close()
+    server = InstanceServer(name)
+    assert server.listen()
+    server.close()
@@ -0,0 +1,144 @@
+import sys
+import os
+import json
+import time
+import threading
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+from PathManagerPlus.handle_data import DataStorage, gen_base_data
+from PathManagerPlus.storage_format import decode, iter_encode
+from PathManagerPlus.exchange import iter_records
+
+
+def plain(data):
+    """当时数据的完整副本，用于比较。
+    """
+    return json.loads(json.dumps(
+        data.to_dict() if hasattr(data, 'to_dict') else data))
+
+
+d = gen_base_data()
+general = d['nodes']['root']['sub_nodes'][0]
+program, link, other = d['nodes'][general]['sub_nodes']
+ids = d.add_items([{'name': f'{i}', 'path': f'/tmp/{i}', 'comment': None}
+                   for i in range(100)], program)
+expected = plain(d)
+snapshot = d.snapshot()
+items = d['items']
+untouched = d['items'][ids[50]]
+
+# 各种修改都不影响快照
+d.update_item(ids[0], {'name': '改名'})
+d.move_item_to_node(ids[1], link)
+d.move_items_to_node(ids[2:5], other)
+d.move_item_within_node(ids[10], 0)
+d.remove_item(ids[5])
+d.remove_items(ids[6:8])
+new_id = d.add_item('新的', link)
+d.sort_items_within_node(program, reverse=True)
+work = d.add_node('工作')
+d.change_node_name(link, '网址')
+d.change_node_parent(other, work, 0)
+d.change_node_index(program, 0)
+d.update_node(work, {'mirror': {'path': '/tmp', 'mtime': None}})
+d.remove_node(work)
+assert plain(snapshot) == expected
+assert new_id not in snapshot['items'] and ids[5] in snapshot['items']
+assert len(snapshot['items']) == 100 and snapshot.item_count() == 100
+assert sorted(snapshot['items']) == sorted(ids)
+assert list(snapshot.iter_subtree(general)) == [general, program, link, other]
+assert d.check_data_integrity()
+
+# 只复制被修改的记录，表本身和没有修改的记录都是共用的
+assert d['items'] is items
+assert d['items'][ids[50]] is untouched is snapshot['items'][ids[50]]
+assert d['items'][ids[0]] is not snapshot['items'][ids[0]]
+
+# 快照可以编码保存、导出
+for fmt in ('json', 'compact'):
+    content = b''.join(iter_encode(snapshot, fmt))
+    assert decode(content)[0] == expected
+assert len(list(iter_records(snapshot, item_ids=ids[:3]))) == 3
+
+# 多个快照各自保持拍快照时的数据
+second_expected = plain(d)
+second = d.snapshot()
+d.update_item(ids[0], {'name': '再改名'})
+d.remove_item(ids[9])
+assert plain(snapshot) == expected
+assert plain(second) == second_expected
+
+# 快照都不用了以后，修改时不再复制
+snapshot.release()
+second.release()
+record = d['items'][ids[20]]
+d.update_item(ids[20], {'name': 'x'})
+assert d['items'][ids[20]] is record
+with d.snapshot() as third:
+    d.update_item(ids[20], {'name': 'y'})
+    assert third['items'][ids[20]]['name'] == 'x'
+assert d['items'][ids[20]] is not record
+
+# 修复数据时只复制有问题的节点
+broken = DataStorage(json.loads(json.dumps(d)))
+broken['nodes'][general]['sub_nodes'].append(work)
+broken['nodes'][work] = dict(broken['nodes'][general], name='坏的',
+                             parent_id='不存在', sub_nodes=[], items=[])
+assert not broken.check_data_integrity()
+broken.fix_data()
+assert broken.check_data_integrity() and work not in broken['nodes']
+
+# 拍快照不复制数据，和数据量无关
+big = DataStorage()
+node_id = big.add_node('大')
+big.add_items([{'name': f'{i}', 'path': f'/{i}'} for i in range(100000)],
+              node_id)
+start = time.perf_counter()
+for _ in range(100):
+    big.snapshot().release()
+assert (time.perf_counter() - start) / 100 < 0.005
+
+# 其他线程读快照时，不会看到移动了一半的项
+d = DataStorage()
+nodes = [d.add_node(f'{i}') for i in range(4)]
+for node_id in nodes:
+    d.add_items([f'{node_id}-{i}' for i in range(50)], node_id)
+snapshot = d.snapshot()
+expected = plain(snapshot)
+errors = []
+stop = threading.Event()
+
+
+def read():
+    while not stop.is_set():
+        # 读取期间拿着快照，快照就一直有效
+        current = snapshot
+        items = current['items']
+        for item_id in list(items):
+            parent_id = items[item_id]['parent_id']
+            if item_id not in current['nodes'][parent_id]['items']:
+                errors.append(item_id)
+        if sum(len(current['nodes'][n]['items']) for n in nodes) != 200:
+            errors.append('count')
+
+
+reader = threading.Thread(target=read)
+reader.start()
+try:
+    for round_ in range(200):
+        for item_id in list(d['items']):
+            parent_id = d['items'][item_id]['parent_id']
+            target = nodes[(nodes.index(parent_id) + 1) % len(nodes)]
+            d.move_item_to_node(item_id, target)
+        # 隔一段时间换一个快照
+        if round_ % 50 == 49:
+            snapshot = d.snapshot()
+            expected = plain(snapshot)
+finally:
+    stop.set()
+    reader.join()
+assert not errors, errors[:5]
+assert plain(snapshot) == expected
+assert d.check_data_integrity()
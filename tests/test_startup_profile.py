@@ -0,0 +1,85 @@
+import sys
+import os
+import io
+import json
+import shutil
+import tempfile
+import subprocess
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+import PathManagerPlus
+from PathManagerPlus.startup_profile import StartupProfile, display_width
+from PathManagerPlus.actions.probe_cache import cached_probe
+
+# 每个阶段的时间是和上一次 mark 之间的时间
+ticks = iter([0.0, 0.010, 0.250, 0.260, 0.300])
+profile = StartupProfile(enabled=True, clock=lambda: next(ticks))
+profile.mark('解析参数')
+profile.mark('导入界面模块')
+profile.mark('读取数据')
+out = io.StringIO()
+profile.finish(out=out)
+assert [name for name, _ in profile.phases] == [
+    '解析参数', '导入界面模块', '读取数据', '第一次绘制']
+assert abs(profile.total() - 0.3) < 1e-9
+lines = out.getvalue().splitlines()
+assert lines[2].split()[1:] == ['240.0', 'ms', '250.0', 'ms']
+assert lines[-1].split()[1:] == ['300.0', 'ms']
+# 中文占两格，数字是对齐的
+assert len({display_width(line[:line.index('ms')]) for line in lines[1:-1]}) \
+    == 1
+# 只输出一次，之后的 mark 不再记录
+profile.finish(out=out)
+profile.mark('之后')
+assert len(profile.phases) == 4 and len(out.getvalue().splitlines()) == 6
+
+# 没有打开时不输出
+profile = StartupProfile()
+out = io.StringIO()
+profile.finish(out=out)
+assert out.getvalue() == ''
+
+# 检测结果缓存在磁盘上，PATH 改变后重新检测
+base = tempfile.mkdtemp()
+old_path = os.environ.get('PATH', '')
+try:
+    cache_file = os.path.join(base, 'probe_cache.json')
+    calls = []
+
+    def probe():
+        calls.append(1)
+        return ['xterm', '/usr/bin/xterm']
+
+    assert cached_probe('terminal', probe, cache_file=cache_file) \
+        == ['xterm', '/usr/bin/xterm']
+    assert cached_probe('terminal', probe, cache_file=cache_file) \
+        == ['xterm', '/usr/bin/xterm']
+    assert len(calls) == 1
+    # 缓存的结果无效时(比如程序被卸载了)重新检测
+    cached_probe('terminal', probe, lambda value: False, cache_file)
+    assert len(calls) == 2
+    os.environ['PATH'] = old_path + os.pathsep + base
+    cached_probe('terminal', probe, cache_file=cache_file)
+    assert len(calls) == 3
+    cached_probe('terminal', probe, cache_file=cache_file)
+    assert len(calls) == 3
+    # 缓存文件损坏或者无法写入时照样检测
+    with open(cache_file, 'w')as fl:
+        fl.write('{')
+    assert cached_probe('terminal', probe, cache_file=cache_file)
+    assert len(calls) == 4
+    assert json.load(open(cache_file))['terminal']['value'][0] == 'xterm'
+    assert cached_probe(
+        'terminal', probe, cache_file=os.path.join(base, 'no', 'x.json'))
+finally:
+    os.environ['PATH'] = old_path
+    shutil.rmtree(base, ignore_errors=True)
+
+# 命令行和后台服务的客户端不导入 asyncio
+assert subprocess.run([
+    sys.executable, '-c',
+    'import sys, PathManagerPlus.cli; sys.exit("asyncio" in sys.modules)'
+], cwd=os.path.dirname(os.path.dirname(PathManagerPlus.__file__))
+).returncode == 0
@@ -0,0 +1,118 @@
+import sys
+import os
+import io
+import json
+import shutil
+import tempfile
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+from PathManagerPlus.cli import main
+from PathManagerPlus.file_sync import DataFile, encode_data
+from PathManagerPlus.handle_data import DataStorage, gen_base_data
+from PathManagerPlus.storage_format import (
+    BLOCK,
+    FORMATS,
+    decode,
+    iter_encode,
+    shared_prefix,
+    tree_order
+)
+
+assert shared_prefix('/a/b/c', '/a/b/d') == 5
+assert shared_prefix('', '/a') == 0 and shared_prefix('abc', 'abc') == 3
+
+d = gen_base_data()
+general = d['nodes']['root']['sub_nodes'][0]
+program, link, other = d['nodes'][general]['sub_nodes']
+d.update_node(other, {'mirror': {'path': '/home/user', 'depth': 2}})
+d.add_items([
+    {'name': f'文件{i}.txt', 'path': f'/home/user/文档/文件{i}.txt',
+     'comment': None} for i in range(BLOCK + 10)
+], program)
+d.add_item({'name': '官网', 'path': 'https://www.python.org',
+            'comment': '第一行\n第二行'}, link)
+d.add_item('只有名称', link)
+d.add_item({'name': '短', 'path': '/x', 'comment': None, 'status': 1}, link)
+d.add_item({'name': 'x', 'path': '/x', 'comment': None}, link)
+d.add_node('空的', other)
+d['version'] = 2
+raw = json.loads(encode_data(d))
+
+# 每种格式都能原样读回来，节点和项的列表顺序不变
+sizes = {}
+for fmt in FORMATS:
+    content = b''.join(iter_encode(raw, fmt))
+    sizes[fmt] = len(content)
+    data, detected = decode(content)
+    assert detected == fmt
+    assert data == raw, fmt
+assert sizes['compact'] < sizes['json'] / 3
+assert sizes['compact-gz'] < sizes['compact']
+assert sizes['compact-xz'] < sizes['compact']
+
+# 手动修改过的数据文件中，路径不是字符串时原样保存
+odd = gen_base_data()
+odd.add_item({'name': None, 'path': ['不是', '字符串'], 'comment': None},
+             odd['nodes']['root']['sub_nodes'][0])
+odd = json.loads(encode_data(odd))
+assert decode(b''.join(iter_encode(odd, 'compact'))) == (odd, 'compact')
+
+# 结构不一致的数据只能保存为 JSON
+broken = json.loads(encode_data(d))
+broken['nodes'][program]['items'].append(broken['nodes'][link]['items'][0])
+assert tree_order(broken) is None
+content = b''.join(iter_encode(broken, 'compact-gz'))
+assert decode(content) == (broken, 'json')
+orphan = json.loads(encode_data(d))
+orphan['items']['孤立'] = dict(raw['items'][raw['nodes'][link]['items'][0]])
+assert tree_order(orphan) is None
+
+# 文件不完整时报错，不会读出一部分数据
+content = b''.join(iter_encode(raw, 'compact'))
+try:
+    decode(content[:content.rindex(b'["items"')])
+except ValueError:
+    pass
+else:
+    raise AssertionError('没有发现文件不完整')
+
+base = tempfile.mkdtemp()
+try:
+    data_path = os.path.join(base, 'data.json')
+    # 一边编码一边写，返回写入的字节数
+    data_file = DataFile(data_path, 'compact-gz')
+    size = data_file.write_data(raw)
+    assert size == os.path.getsize(data_path)
+    assert not data_file.changed()
+    # 读取时按内容判断格式，保存时保持这个格式
+    data_file = DataFile(data_path)
+    assert DataStorage(data_file.read()) == raw
+    assert data_file.format == 'compact-gz'
+    data = DataStorage(data_file.read())
+    data.add_item('新的', program)
+    data_file.write_data(data)
+    assert open(data_path, 'rb').read(2) == b'\x1f\x8b'
+    assert DataFile(data_path).read() == data
+
+    # 命令行转换格式
+    out = io.StringIO()
+    assert main(['convert', 'json', '--data', data_path], out) == 0
+    assert out.getvalue().startswith('compact-gz ')
+    assert DataFile(data_path).read() == data
+    assert open(data_path, 'rb').read(1) == b'{'
+    assert main(['convert', 'compact', '--data', data_path], out) == 0
+    data_file = DataFile(data_path)
+    assert data_file.read() == data and data_file.format == 'compact'
+    # 其他命令照常使用紧凑格式的数据文件
+    out = io.StringIO()
+    assert main(['search', '文件1.txt', '--no-daemon', '--data', data_path],
+                out) == 0
+    assert out.getvalue().startswith('文件1.txt\t')
+    assert main(['add', '/tmp/a.txt', '--node', '常规/其他', '--no-daemon',
+                 '--data', data_path], out) == 0
+    data_file = DataFile(data_path)
+    assert data_file.read()['items'] and data_file.format == 'compact'
+finally:
+    shutil.rmtree(base, ignore_errors=True)
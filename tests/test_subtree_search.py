@@ -0,0 +1,67 @@
+import sys
+import os
+import random
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+from PathManagerPlus.handle_data import DataStorage
+
+
+def walk_is_under(d, node_id, ancestor_id):
+    while node_id is not None:
+        if node_id == ancestor_id:
+            return True
+        node_id = d['nodes'][node_id]['parent_id']
+    return False
+
+
+def check(d):
+    nodes = list(d['nodes'])
+    for node_id in nodes:
+        for ancestor_id in nodes:
+            assert d.is_node_under(node_id, ancestor_id) == \
+                walk_is_under(d, node_id, ancestor_id)
+
+
+random.seed(1)
+d = DataStorage()
+# 故意把根节点的编号空间设小，让重新编排的逻辑被执行到
+d.intervals.ROOT_SPAN = 1 << 10
+node_ids = []
+for i in range(60):
+    parent_id = random.choice(node_ids) if node_ids else 'root'
+    node_ids.append(d.add_node(f'n{i}', parent_id))
+check(d)
+for _ in range(80):
+    node_id = random.choice(node_ids)
+    new_parent_id = random.choice(node_ids + ['root'])
+    if walk_is_under(d, new_parent_id, node_id):
+        continue
+    if d['nodes'][node_id]['parent_id'] == new_parent_id:
+        continue
+    d.change_node_parent(node_id, new_parent_id, 0)
+check(d)
+for _ in range(5):
+    node_id = random.choice(node_ids)
+    if node_id in d['nodes']:
+        d.remove_node(node_id)
+node_ids = [node_id for node_id in node_ids if node_id in d['nodes']]
+check(d)
+print('enter/exit 检查通过，剩余节点', len(node_ids))
+
+d = DataStorage()
+node_a = d.add_node('A')
+node_b = d.add_node('B', node_a)
+node_c = d.add_node('C')
+item1 = d.add_item({'name': 'report a', 'path': None, 'comment': None}, node_a)
+item2 = d.add_item({'name': 'report b', 'path': None, 'comment': None}, node_b)
+item3 = d.add_item({'name': 'report c', 'path': None, 'comment': None}, node_c)
+for use_index in (False, True):
+    assert d.search('report', use_index, scope=node_a) == [item1, item2]
+    assert d.search('report', use_index, scope=node_b) == [item2]
+d.change_node_parent(node_b, node_c, 0)
+assert d.search('report', scope=node_c) == [item2, item3]
+assert d.is_item_under(item2, node_c)
+assert not d.is_item_under(item2, node_a)
+print(d.explain_query('report', scope=node_c))
@@ -0,0 +1,39 @@
+import sys
+import os
+import time
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+from PathManagerPlus.handle_data import DataStorage
+
+
+d = DataStorage()
+general = d.add_node('常规')
+tools = d.add_node('Tools', general)
+python = d.add_node('Python', tools)
+docs = d.add_node('文档', general)
+work = d.add_node('Work')
+reports = d.add_node('Reports', work)
+
+# 匹配的节点和它们的祖先可见，不匹配的分支隐藏
+assert d.filter_nodes('python') == {'root', general, tools, python}
+assert d.filter_nodes('RE') == {'root', work, reports}
+# 拼音全拼和首字母
+assert d.filter_nodes('wd') == {'root', general, docs}
+assert d.filter_nodes('changgui') == {'root', general}
+assert d.filter_nodes('nothing') == {'root'}
+
+d.change_node_parent(python, work, 0)
+assert d.filter_nodes('python') == {'root', work, python}
+
+# 大量节点时只遍历一次
+d = DataStorage()
+parents = ['root']
+for i in range(30000):
+    parents.append(d.add_node(f'node {i}', parents[i // 10]))
+start = time.perf_counter()
+visible = d.filter_nodes('node 29999')
+print(f'filter 30000 nodes: {(time.perf_counter() - start) * 1000:.1f} ms')
+assert parents[29999 + 1] in visible
+assert len(visible) == 6
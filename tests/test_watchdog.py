@@ -0,0 +1,68 @@
+import sys
+import os
+import time
+import tempfile
+
+path = os.path.dirname(os.path.abspath('.'))
+sys.path.insert(0, path)
+
+from PySide6.QtCore import QCoreApplication, QEventLoop, QTimer
+
+from PathManagerPlus.watchdog import StallWatchdog
+
+app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+log_path = os.path.join(tempfile.mkdtemp(), 'stalls.log')
+watchdog = StallWatchdog(0.1, log_path)
+watchdog.start()
+
+
+def run_events(seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        app.processEvents(QEventLoop.AllEvents, 20)
+
+
+# 没有卡顿时什么都不记录
+run_events(0.5)
+assert watchdog.reports == [] and not os.path.exists(log_path)
+
+
+def compute():
+    deadline = time.monotonic() + 0.4
+    while time.monotonic() < deadline:
+        pass
+
+
+def slow_slot():
+    # 一部分时间在 sleep，一部分时间在计算
+    time.sleep(0.2)
+    compute()
+
+
+QTimer.singleShot(0, slow_slot)
+run_events(0.1)
+# 卡顿结束以后的第一次心跳才写入记录
+run_events(0.3)
+assert len(watchdog.reports) == 1
+report = watchdog.reports[0]
+# 槽函数是事件循环直接调用的 slow_slot，而不是更里面的 compute
+line = slow_slot.__code__.co_firstlineno
+assert report.slot == f'slow_slot (test_watchdog.py:{line})'
+assert 0.5 < report.duration < 1.5
+# 槽函数返回以后、下一次心跳之前的采样没有 Python 调用栈
+stacks = [' > '.join(stack) for stack in report.samples if stack]
+assert any('compute' in stack for stack in stacks)
+assert any('compute' not in stack for stack in stacks)
+# 调用栈从槽函数开始
+assert all(stack.startswith('slow_slot') for stack in stacks)
+
+with open(log_path, encoding='utf-8') as fl:
+    text = fl.read()
+assert '界面卡住' in text and '槽函数：slow_slot' in text
+assert 'compute (test_watchdog.py:' in text
+
+# 停止以后不再检查
+watchdog.stop()
+QTimer.singleShot(0, slow_slot)
+run_events(0.3)
+assert len(watchdog.reports) == 1